@@ -0,0 +1,61 @@
+"""
+Benchmark the concurrent multi-feed fetcher against a serial fetch.
+
+A local HTTP server stands in for the news sites; each feed gets its own
+artificial latency so the expected result is wall-clock time close to the
+slowest feed for the concurrent path and the sum of all feeds for the serial one.
+
+Usage:
+    python bench_feed_fetch.py [--feeds 6] [--items 50] [--repeat 5]
+"""
+import argparse
+import json
+
+from harness import StaticRoutes, load_lambda, make_rss, measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--feeds", type=int, default=6)
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    fetch_rss = load_lambda("fetch_rss")
+
+    routes = {}
+    for i in range(args.feeds):
+        delay = 0.1 + 0.05 * i
+        # Feeds overlap by half their items to exercise cross-feed dedup.
+        routes[f"/feed{i}.xml"] = (
+            make_rss(args.items, prefix="Show", start=i * args.items // 2),
+            delay,
+            {"Content-Type": "application/rss+xml"},
+        )
+
+    with StaticRoutes(routes) as server:
+        feeds = [
+            {"name": f"feed{i}", "url": f"{server.base_url}/feed{i}.xml", "timeout": 5}
+            for i in range(args.feeds)
+        ]
+
+        def serial():
+            return [fetch_rss.fetch_feed(f, {}) for f in feeds]
+
+        def concurrent():
+            return fetch_rss.fetch_feeds(feeds, {})
+
+        merged = fetch_rss.merge_feed_entries(concurrent())
+        report = {
+            "feeds": args.feeds,
+            "items_per_feed": args.items,
+            "merged_entries": len(merged.entries),
+            "slowest_feed_ms": round(max(r[1] for r in routes.values()) * 1000, 2),
+            "serial": measure(serial, args.repeat),
+            "concurrent": measure(concurrent, args.repeat),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
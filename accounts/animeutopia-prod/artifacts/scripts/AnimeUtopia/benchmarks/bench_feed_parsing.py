@@ -0,0 +1,68 @@
+"""
+Compare peak memory and latency of the feedparser and streaming RSS paths.
+
+Each measurement runs in a fresh process so ru_maxrss reflects that parse
+alone. The synthetic feed is written to a temporary file first and read from
+disk by both paths. "stream_budget" shows the early-stop behaviour with the
+default FEED_ENTRY_BUDGET.
+
+Usage:
+    python bench_feed_parsing.py [--sizes 100 10000 100000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from harness import load_lambda, make_rss, run_isolated
+
+
+def import_parsers():
+    load_lambda("fetch_rss")
+    import feedparser  # noqa: F401
+    import rss_stream  # noqa: F401
+
+
+def parse_once(path, mode):
+    fetch_rss = load_lambda("fetch_rss")
+    import feedparser
+    from rss_stream import parse_feed_stream
+
+    start = time.perf_counter()
+    if mode == "feedparser":
+        with open(path, "rb") as f:
+            parsed = feedparser.parse(f.read())
+        kept = [e for e in parsed.entries if fetch_rss.is_anime_entry(e)]
+    else:
+        budget = fetch_rss.FEED_ENTRY_BUDGET if mode == "stream_budget" else None
+        with open(path, "rb") as f:
+            kept = parse_feed_stream(
+                f, max_entries=budget, anime_filter=fetch_rss.is_anime_entry
+            )["entries"]
+    elapsed = time.perf_counter() - start
+    return {"latency_ms": round(elapsed * 1000, 2), "kept_entries": len(kept)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 100000])
+    args = parser.parse_args()
+
+    report = []
+    for size in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix=".xml", delete=False) as tmp:
+            tmp.write(make_rss(size))
+            path = tmp.name
+        try:
+            row = {"entries": size, "file_mb": round(os.path.getsize(path) / 2**20, 2)}
+            for mode in ("feedparser", "stream", "stream_budget"):
+                row[mode] = run_isolated(parse_once, path, mode, setup=import_parsers)
+            report.append(row)
+        finally:
+            os.remove(path)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Microbenchmarks of the hot functions of individual handlers.
+
+  get_first_post_if_anime            fetch_rss, on a parsed feed
+  extract_core_title_and_description process_content, headline vs. AniList titles
+  download_image                     process_content, cold (empty asset store)
+                                     and warm (variant already stored), covers
+                                     served by a local AniListServer
+  store_data serialization           the former pretty-printed JSON against the
+                                     post store's compact and gzip encodings
+
+Each is reported as p50/p95 per call in microseconds (milliseconds for
+download_image). With --output the report is saved as JSON, stamped with the
+commit; with --baseline the p50/p95 changes against an earlier report are
+added.
+
+Usage:
+    python bench_handlers.py [--repeat 50] [--iterations 200]
+        [--output results/handlers.json] [--baseline results/old.json]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from harness import AniListServer, compare_results, load_lambda, make_rss, percentiles, save_results
+
+HEADLINES = [
+    "Frieren: Beyond Journey's End Anime Gets 2nd Season",
+    "Sword Art Online Progressive Film Reveals New Trailer",
+    "Dungeon Meshi TV Anime Announces Cast for Season 2",
+    "Spy x Family Code: White Film Premieres in July",
+    "Blue Lock Episode Nagi Film English Dub Confirmed",
+]
+
+
+def per_call(func, repeat, iterations, scale=1e6):
+    """
+    Time `iterations` calls `repeat` times; return p50/p95 per call.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        samples.append((time.perf_counter() - start) / iterations * scale)
+    return percentiles(samples)
+
+
+def bench_first_post(repeat, iterations):
+    import feedparser
+
+    fetch_rss = load_lambda("fetch_rss")
+    feed = feedparser.parse(make_rss(50))
+    return per_call(lambda: fetch_rss.get_first_post_if_anime(feed), repeat, iterations)
+
+
+def bench_core_title(repeat, iterations):
+    process_content = load_lambda("process_content")
+    rng = random.Random(3)
+    cases = [(h, [h.split(" Anime ")[0].split(" Film ")[0], "Unrelated Title"]) for h in HEADLINES]
+    return per_call(
+        lambda: process_content.extract_core_title_and_description(*rng.choice(cases)),
+        repeat, iterations
+    )
+
+
+def bench_download_image(repeat):
+    process_content = load_lambda("process_content")
+    import asset_store
+
+    report = {}
+    with AniListServer(covers=1) as anilist:
+        url = anilist.media("Frieren")["coverImage"]["extraLarge"]
+        for mode in ("cold", "warm"):
+            samples = []
+            for _ in range(repeat):
+                if mode == "cold":
+                    shutil.rmtree(asset_store.ASSET_DIR, ignore_errors=True)
+                    asset_store._store = None
+                start = time.perf_counter()
+                process_content.download_image(url)
+                samples.append((time.perf_counter() - start) * 1000)
+            report[mode] = percentiles(samples)
+    return report
+
+
+def bench_serialization(repeat, iterations):
+    load_lambda("store_data")
+    from post_store import encode_post
+
+    post = {
+        "title": HEADLINES[0].split(" Anime ")[0],
+        "link": "https://news.example.com/anime/frieren-season-2",
+        "description": "Anime Gets 2nd Season " * 8,
+        "pubDate": "Sat, 17 Oct 2026 09:00:00 -0000",
+        "category": "Anime,News",
+        "source": "example",
+        "image_key": "assets/" + "ab" * 32 + "/bg-v1-1080x1080-pillow-sc.jpg",
+        "background": {"width": 1080, "height": 1080, "prefit": True, "gradient_applied": True},
+        "template_check": {"errors": [], "warnings": []},
+    }
+    encoders = {
+        "pretty_json": lambda: json.dumps(post, indent=4).encode("utf-8"),
+        "compact": lambda: encode_post(post, compress="")[0],
+        "gzip": lambda: encode_post(post, compress="gzip")[0],
+    }
+    return {
+        name: dict(per_call(encode, repeat, iterations), bytes=len(encode()))
+        for name, encode in encoders.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-handlers-")
+    os.environ["ASSET_DIR"] = os.path.join(tmp, "assets")
+    os.environ["ANILIST_CACHE_FILE"] = os.path.join(tmp, "anilist_cache.json")
+    for name in ("ASSET_BUCKET", "ANILIST_CACHE_BUCKET", "TEMPLATE_INDEX_BUCKET"):
+        os.environ.pop(name, None)
+    try:
+        report = {
+            "benchmark": "handlers",
+            "get_first_post_if_anime_us": bench_first_post(args.repeat, args.iterations),
+            "extract_core_title_and_description_us": bench_core_title(args.repeat, args.iterations),
+            "download_image_ms": bench_download_image(max(3, args.repeat // 5)),
+            "store_data_serialization_us": bench_serialization(args.repeat, args.iterations),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["changes"] = compare_results(json.load(f), report)
+    if args.output:
+        report = save_results(report, args.output)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
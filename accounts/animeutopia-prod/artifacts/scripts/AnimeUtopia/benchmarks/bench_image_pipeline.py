@@ -0,0 +1,52 @@
+"""
+Benchmark the in-process Pillow image stage against the ImageMagick backend.
+
+Converts a synthetic cover-sized JPEG to the comp resolution with each
+available backend and reports per-step timings. The ImageMagick backend is
+skipped when IMAGE_MAGICK_EXE (or "magick" on PATH) is not installed.
+
+Usage:
+    python bench_image_pipeline.py [--repeat 10] [--width 1500 --height 2250]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+
+from harness import load_lambda, make_cover_image, measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--width", type=int, default=1500)
+    parser.add_argument("--height", type=int, default=2250)
+    args = parser.parse_args()
+
+    load_lambda("process_content")
+    import image_pipeline
+
+    if not os.path.exists(image_pipeline.IMAGE_MAGICK_EXE) and shutil.which("magick"):
+        image_pipeline.IMAGE_MAGICK_EXE = shutil.which("magick")
+
+    data = make_cover_image(args.width, args.height)
+    report = {"source_bytes": len(data), "source_size": [args.width, args.height]}
+    for backend in ("pillow", "magick"):
+        if backend == "magick" and not os.path.exists(image_pipeline.IMAGE_MAGICK_EXE):
+            report[backend] = "not installed"
+            continue
+        steps = []
+
+        def run():
+            jpeg, timings = image_pipeline.process_image(data, backend=backend)
+            steps.append(timings)
+
+        report[backend] = measure(run, args.repeat)
+        for step in [k for k in steps[0] if k.endswith("_ms")]:
+            report[backend][f"median_{step}"] = statistics.median(t[step] for t in steps)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
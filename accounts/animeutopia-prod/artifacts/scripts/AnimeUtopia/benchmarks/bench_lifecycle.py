@@ -0,0 +1,102 @@
+"""
+Replay a post arrival timeline against render instance lifecycle policies.
+
+Sweeps the idle TTL, hibernation and the predictive warm-up window, and
+reports for each policy the wait between a post's arrival and the start of
+its render against the instance's running hours and cost. The first weeks of
+the timeline train the arrival profile; the last week is replayed.
+
+The timeline is either a JSON list of arrival times (epoch seconds), such as
+the "arrivals" recorded in state/render_lifecycle.json, or a synthetic one:
+posts cluster around a few release hours each day, with some noise.
+
+Usage:
+    python bench_lifecycle.py [--timeline arrivals.json] [--weeks 5]
+        [--idle-ttls 0,300,900,1800] [--warmup-leads 0,1800]
+        [--hourly-cost 1.2] [--boot-s 240] [--resume-s 60] [--render-s 180]
+"""
+import argparse
+import json
+import random
+import sys
+
+from harness import COMMON_DIR
+
+sys.path.insert(0, COMMON_DIR)
+from lifecycle import Policy, WEEK_SECONDS, simulate  # noqa: E402
+
+RELEASE_HOURS = (2, 9, 15)
+DAY_SECONDS = 24 * 3600
+# Monday 2024-01-01 00:00 UTC
+EPOCH_MONDAY = 1704067200
+
+
+def synthetic_timeline(weeks, seed=7):
+    """
+    Return arrival times clustered around RELEASE_HOURS on every day.
+    """
+    rng = random.Random(seed)
+    arrivals = []
+    for day in range(weeks * 7):
+        for hour in RELEASE_HOURS:
+            for _ in range(rng.randint(0, 3)):
+                offset = rng.gauss(hour * 3600 + 1800, 900)
+                arrivals.append(EPOCH_MONDAY + day * DAY_SECONDS + offset)
+        if rng.random() < 0.3:
+            arrivals.append(EPOCH_MONDAY + day * DAY_SECONDS + rng.uniform(0, DAY_SECONDS))
+    return sorted(arrivals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--timeline")
+    parser.add_argument("--weeks", type=int, default=5)
+    parser.add_argument("--idle-ttls", default="0,300,900,1800")
+    parser.add_argument("--warmup-leads", default="0,1800")
+    parser.add_argument("--hourly-cost", type=float, default=1.2)
+    parser.add_argument("--boot-s", type=int, default=240)
+    parser.add_argument("--resume-s", type=int, default=60)
+    parser.add_argument("--render-s", type=int, default=180)
+    args = parser.parse_args()
+
+    if args.timeline:
+        with open(args.timeline, "r", encoding="utf-8") as f:
+            arrivals = sorted(json.load(f))
+    else:
+        arrivals = synthetic_timeline(args.weeks)
+    split = arrivals[-1] - WEEK_SECONDS
+    history = [t for t in arrivals if t < split]
+    replay = [t for t in arrivals if t >= split]
+
+    cases = []
+    for idle_ttl in (int(v) for v in args.idle_ttls.split(",")):
+        for hibernate in (False, True):
+            for lead in (int(v) for v in args.warmup_leads.split(",")):
+                policy = Policy(idle_ttl, hibernate, lead, 0.5, args.hourly_cost)
+                result = simulate(
+                    replay, policy, history=history, boot_seconds=args.boot_s,
+                    resume_seconds=args.resume_s, render_seconds=args.render_s
+                )
+                cases.append(dict(idle_ttl=idle_ttl, hibernate=hibernate, warmup_lead=lead, **result))
+
+    # The previous behaviour: start for every post, stop right after it.
+    baseline = next(c for c in cases if c["idle_ttl"] == 0 and not c["hibernate"] and c["warmup_lead"] == 0)
+    report = {
+        "history_posts": len(history),
+        "replayed_posts": len(replay),
+        "baseline": baseline,
+        "cases": cases,
+        "pareto": [
+            c for c in cases
+            if not any(
+                o["p95_wait_s"] <= c["p95_wait_s"] and o["cost"] <= c["cost"]
+                and (o["p95_wait_s"], o["cost"]) != (c["p95_wait_s"], c["cost"])
+                for o in cases
+            )
+        ],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
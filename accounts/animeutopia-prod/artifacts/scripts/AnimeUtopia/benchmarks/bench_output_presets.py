@@ -0,0 +1,132 @@
+"""
+Benchmark deriving platform variants from one master against one aerender
+pass per variant.
+
+The render job renders the comp once and transcodes every variant of the
+post's output preset matrix from the master with ffmpeg, concurrently. The
+alternative is an aerender pass per variant, each paying the project open
+and a full render at the variant's resolution (render time is assumed to
+scale with pixel count).
+
+aerender is not available locally, so its time is modelled from --render-s
+(one pass of the master) and --open-s (per pass). The transcodes are measured:
+a synthetic master of --duration seconds is generated with ffmpeg and the
+variants are transcoded from it with the arguments the runner uses. Without
+ffmpeg on PATH they are modelled from --transcode-fps instead.
+
+Usage:
+    python bench_output_presets.py [--outputs reels_9x16,feed_1x1,youtube_16x9]
+        [--duration 15] [--fps 30] [--render-s 180] [--open-s 20]
+        [--transcode-fps 120]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import COMMON_DIR
+
+sys.path.insert(0, COMMON_DIR)
+from output_presets import ffmpeg_args, resolve_outputs  # noqa: E402
+
+MASTER_SIZE = (1080, 1080)
+
+
+def make_master(ffmpeg, path, duration, fps):
+    """
+    Render a synthetic master with moving content and an audio track.
+    """
+    w, h = MASTER_SIZE
+    subprocess.run(
+        [ffmpeg, "-y", "-hide_banner", "-loglevel", "error",
+         "-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate={fps}:duration={duration}",
+         "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+         "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+         "-c:a", "aac", "-shortest", path],
+        check=True
+    )
+
+
+def measure_transcodes(ffmpeg, presets, master, out_dir):
+    """
+    Transcode every variant concurrently, as the runner does.
+
+    Returns:
+        tuple: Wall-clock seconds for all of them and per-variant seconds.
+    """
+    def transcode(preset):
+        start = time.perf_counter()
+        subprocess.run(
+            [ffmpeg] + ffmpeg_args(preset, master, os.path.join(out_dir, preset["file"])),
+            check=True
+        )
+        return preset["name"], round(time.perf_counter() - start, 2)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(presets)) as pool:
+        per_variant = dict(pool.map(transcode, presets))
+    return round(time.perf_counter() - start, 2), per_variant
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--outputs", default="reels_9x16,feed_1x1,youtube_16x9")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--render-s", type=float, default=180)
+    parser.add_argument("--open-s", type=float, default=20)
+    parser.add_argument("--transcode-fps", type=float, default=120)
+    args = parser.parse_args()
+
+    presets = resolve_outputs(args.outputs)
+    master_pixels = MASTER_SIZE[0] * MASTER_SIZE[1]
+    master_pass = args.open_s + args.render_s
+
+    separate = {
+        p["name"]: round(args.open_s + args.render_s * p["width"] * p["height"] / master_pixels, 1)
+        for p in presets
+    }
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        with tempfile.TemporaryDirectory() as tmp:
+            master = os.path.join(tmp, "anime_post.mp4")
+            make_master(ffmpeg, master, args.duration, args.fps)
+            transcode_s, per_variant = measure_transcodes(ffmpeg, presets, master, tmp)
+        transcode = "measured"
+    else:
+        frames = args.duration * args.fps
+        per_variant = {
+            p["name"]: round(frames / args.transcode_fps * p["width"] * p["height"] / master_pixels, 2)
+            for p in presets
+        }
+        # Concurrent transcodes share the host's cores.
+        transcode_s = round(sum(per_variant.values()) / max(1, min(len(presets), os.cpu_count() or 1)), 2)
+        transcode = "modelled (ffmpeg not installed)"
+
+    # The master itself is published too, so the separate-pass approach
+    # renders it as well.
+    separate_total = round(master_pass + sum(separate.values()), 1)
+    matrix_total = round(master_pass + transcode_s, 1)
+    print(json.dumps({
+        "variants": [p["name"] for p in presets],
+        "transcode": transcode,
+        "separate_passes": {"master_s": master_pass, "variants_s": separate, "total_s": separate_total},
+        "one_pass_matrix": {
+            "master_s": master_pass,
+            "transcode_wall_s": transcode_s,
+            "transcode_per_variant_s": per_variant,
+            "total_s": matrix_total,
+        },
+        "render_host_time_saved_s": round(separate_total - matrix_total, 1),
+        "speedup": round(separate_total / matrix_total, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
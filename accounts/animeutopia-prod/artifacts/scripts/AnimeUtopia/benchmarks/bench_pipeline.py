@@ -0,0 +1,249 @@
+"""
+Simulated end-to-end runs of the state machine, with every AWS and HTTP
+dependency replaced by a local stand-in.
+
+Each run calls the handlers in the order the state machine does, passing the
+same event paths (run, rssData, processedContent, ec2StartResult,
+videoResult):
+
+  fetch_rss        --feeds feeds served by StaticRoutes, each syndicating the
+                   same --posts new anime headlines (new ones every run),
+                   delayed by --feed-latency
+  process_content  AniList and its covers from AniListServer (--anilist-latency)
+  store_data       post store and render queue in FakeS3/FakeSQS (--s3-latency)
+  start_instance   FakeEC2; the render instance is stopped between runs
+  render_video     queue mode; FakeSSM runs a stand-in for render_job.ps1
+                   that stages the post, "uploads" the master and every
+                   variant and writes the manifest, finishing after --render-s
+  stop_instance    lifecycle policy with RENDER_IDLE_TTL=0, so it stops
+  notify_post      manifests, HEAD checks and presigned URLs from FakeS3, the
+                   message to a WebhookSink
+
+The lifecycle, feed state, AniList cache and asset store are kept between
+runs as they are between executions in Lambda, so the first run is the cold
+one. p50/p95 per stage and end to end are reported in milliseconds, and per
+span of each stage's trace (see instrumentation.py) under "spans_ms"; with
+--output the report is saved as JSON, stamped with the commit, and with
+--baseline the changes against an earlier report are added.
+
+Usage:
+    python bench_pipeline.py [--runs 20] [--posts 3] [--feeds 2]
+        [--feed-latency 0.05] [--anilist-latency 0.05] [--s3-latency 0.005]
+        [--render-s 0.2] [--output results/pipeline.json]
+        [--baseline results/old.json]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from harness import (
+    AniListServer, FakeAWS, FakeEC2, FakeS3, FakeSQS, FakeSSM, StaticRoutes, WebhookSink,
+    compare_results, load_lambda, make_rss, percentiles, save_results
+)
+
+BUCKET = "bench-bucket"
+INSTANCE_ID = "i-0bench"
+QUEUE_URL = "https://sqs.us-east-2.amazonaws.com/000000000000/bench-render-queue"
+STAGES = (
+    "fetch_rss", "process_content", "store_data", "start_instance",
+    "render_video", "stop_instance", "notify_post",
+)
+MASTER_BYTES = 256 * 1024
+VARIANT_BYTES = 128 * 1024
+
+
+def _ps_value(invocation, name):
+    match = re.search(rf"-{name} '((?:[^']|'')*)'", invocation)
+    return match.group(1).replace("''", "'") if match else None
+
+
+def render_job_stand_in(s3):
+    """
+    Return a FakeSSM runner doing what render_job.ps1 leaves behind: the
+    artifacts and the manifest in the bucket, and the RENDER_JOB_RESULT line.
+    """
+    def run(instance_id, commands):
+        invocation = commands[-1]
+        bucket = _ps_value(invocation, "Bucket")
+        post_key = re.search(r"post_key = '((?:[^']|'')*)'", invocation).group(1)
+        # Staging fails the job if the post is not in the bucket.
+        s3.get_object(Bucket=bucket, Key=post_key)
+        artifacts = re.search(r"-Artifacts @\{ (.*?) \} -VideoName", invocation).group(1)
+        uploads = []
+        for name, key in re.findall(r"'((?:[^']|'')*)' = '((?:[^']|'')*)'", artifacts):
+            if name.endswith(".aep"):
+                continue
+            variant = re.fullmatch(r"anime_post_(\w+)\.mp4", name)
+            size = VARIANT_BYTES if variant else MASTER_BYTES
+            s3.put_object(Bucket=bucket, Key=key, Body=b"\0" * size)
+            upload = {"key": key, "status": "uploaded", "size": size}
+            if variant:
+                upload["variant"] = variant.group(1)
+            uploads.append(upload)
+        manifest_key = _ps_value(invocation, "ManifestKey")
+        manifest = {"bucket": bucket, "status": "succeeded", "artifacts": uploads, "timings": {}}
+        s3.put_object(Bucket=bucket, Key=manifest_key, Body=json.dumps(manifest))
+        result = {"status": "succeeded", "exit_code": 0, "timings": {},
+                  "artifacts": {u["key"]: u for u in uploads}, "manifest_key": manifest_key}
+        return "Success", "RENDER_JOB_RESULT " + json.dumps(result)
+    return run
+
+
+def configure(tmp, feeds, anilist, webhook):
+    """
+    Point the handlers' environment at the stand-ins. Module constants are
+    read at import, so this runs before any handler is loaded.
+    """
+    for name in ("FEED_STATE_BUCKET", "ANILIST_CACHE_BUCKET", "ASSET_BUCKET",
+                 "TEMPLATE_INDEX_BUCKET", "LIFECYCLE_STATE_BUCKET", "DRAIN_LEASE_BUCKET",
+                 "RENDER_INSTANCE_IDS"):
+        os.environ.pop(name, None)
+    os.environ.update({
+        "FEED_REGISTRY_JSON": json.dumps([
+            {"name": name, "url": feeds.base_url + path} for name, path in feeds.names.items()
+        ]),
+        "FEED_STATE_FILE": os.path.join(tmp, "fetch_rss_state.json"),
+        "ANILIST_CACHE_FILE": os.path.join(tmp, "anilist_cache.json"),
+        "ASSET_DIR": os.path.join(tmp, "assets"),
+        "TEMPLATE_INDEX_FILE": os.path.join(tmp, "template_index.json"),
+        "LIFECYCLE_STATE_FILE": os.path.join(tmp, "render_lifecycle.json"),
+        "DRAIN_LEASE_FILE": os.path.join(tmp, "render_drainer.json"),
+        "RENDER_IDLE_TTL": "0",
+        "RENDER_QUEUE_URL": QUEUE_URL,
+        "BUCKET_NAME": BUCKET,
+        "TARGET_BUCKET": BUCKET,
+        "EC2_INSTANCE_ID": INSTANCE_ID,
+        "INSTANCE_ID": INSTANCE_ID,
+        "TEAMS_WEBHOOK_URL": webhook.url,
+    })
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+    # An existing, empty seen index: a first run would only seed it.
+    with open(os.environ["FEED_STATE_FILE"], "w", encoding="utf-8") as f:
+        json.dump({"seen": []}, f)
+
+
+def load_handlers(s3, sqs, ec2, ssm, anilist):
+    handlers = {name: load_lambda(name) for name in STAGES}
+    handlers["process_content"].ANILIST_API_URL = anilist.base_url
+    # Every handler takes its clients from the shared runtime module.
+    import runtime
+
+    runtime.boto3 = FakeAWS(s3=s3, sqs=sqs, ec2=ec2, ssm=ssm)
+    runtime.reset()
+    # The render host's timing comes from FakeSSM; only the Lambda's own
+    # polling cadence is scaled down.
+    handlers["render_video"].POLL_INTERVAL = 0.01
+    handlers["render_video"].RENDER_QUEUE_IDLE = 0.05
+    return handlers
+
+
+def run_pipeline(handlers, run_id):
+    """
+    Run the state machine's steps once.
+
+    Returns:
+        tuple: Milliseconds per stage, per "<stage>.<span>" and the number
+               of posts notified.
+
+    Raises:
+        RuntimeError: If a step failed, since its timing would be meaningless.
+    """
+    event = {"run": {"run_id": run_id, "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}}
+    steps = (
+        ("fetch_rss", "rssData"),
+        ("process_content", "processedContent"),
+        ("store_data", "storeResult"),
+        ("start_instance", "ec2StartResult"),
+        ("render_video", "videoResult"),
+        ("stop_instance", "ec2StopResult"),
+        ("notify_post", "notificationResult"),
+    )
+    timings = {}
+    for name, result_path in steps:
+        start = time.perf_counter()
+        result = handlers[name].lambda_handler(event, None)
+        timings[name] = (time.perf_counter() - start) * 1000
+        if result.get("status") == "error" or result.get("error") or result.get("status") == "no_post":
+            raise RuntimeError(f"{name} failed in {run_id}: {json.dumps(result)[:500]}")
+        event[result_path] = result
+    timings["end_to_end"] = sum(timings.values())
+    spans = {
+        f"{trace['function']}.{name}": s["ms"]
+        for trace in (result.get("trace") for result in event.values() if isinstance(result, dict))
+        if trace for name, s in trace["spans"].items()
+    }
+    return timings, spans, len(event["notificationResult"].get("posts", []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--posts", type=int, default=3)
+    parser.add_argument("--feeds", type=int, default=2)
+    parser.add_argument("--feed-latency", type=float, default=0.05)
+    parser.add_argument("--anilist-latency", type=float, default=0.05)
+    parser.add_argument("--s3-latency", type=float, default=0.005)
+    parser.add_argument("--render-s", type=float, default=0.2)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tmp = tempfile.mkdtemp(prefix="bench-pipeline-")
+    s3 = FakeS3(latency=args.s3_latency)
+    sqs = FakeSQS()
+    ec2 = FakeEC2([INSTANCE_ID])
+    ssm = FakeSSM(ec2, render_job_stand_in(s3), command_seconds=args.render_s)
+    feeds = StaticRoutes({})
+    feeds.names = {f"feed{i}": f"/feed{i}.xml" for i in range(args.feeds)}
+    samples = {name: [] for name in STAGES + ("end_to_end",)}
+    span_samples = {}
+    notified = 0
+    try:
+        with feeds, AniListServer(args.anilist_latency, covers=20) as anilist, WebhookSink() as webhook:
+            configure(tmp, feeds, anilist, webhook)
+            handlers = load_handlers(s3, sqs, ec2, ssm, anilist)
+            for run in range(args.runs):
+                # Every feed syndicates this run's headlines, newer than the
+                # previous run's.
+                body = make_rss(args.posts, prefix="Show", anime_every=1, start=(args.runs - run) * args.posts)
+                for path in feeds.names.values():
+                    feeds.routes[path] = (body, args.feed_latency, {"Content-Type": "application/rss+xml"})
+                timings, spans, posts = run_pipeline(handlers, f"bench-{run:04d}")
+                notified += posts
+                for name, value in timings.items():
+                    samples[name].append(value)
+                for name, value in spans.items():
+                    span_samples.setdefault(name, []).append(value)
+            webhooks = len(webhook.payloads)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "benchmark": "pipeline",
+        "runs": args.runs,
+        "posts_per_run": args.posts,
+        "settings": {k: getattr(args, k) for k in
+                     ("feeds", "feed_latency", "anilist_latency", "s3_latency", "render_s")},
+        "posts_notified": notified,
+        "webhook_messages": webhooks,
+        "s3_calls": s3.calls,
+        "cold_run_ms": {name: round(values[0], 1) for name, values in samples.items()},
+        "stages_ms": {name: percentiles(values) for name, values in samples.items()},
+        "spans_ms": {name: percentiles(values) for name, values in sorted(span_samples.items())},
+    }
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["changes"] = compare_results(json.load(f), report)
+    if args.output:
+        report = save_results(report, args.output)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark render job placement on a simulated render cluster.
+
+Replays a heavy news day - bursts of posts arriving within minutes of each
+other - through the RenderScheduler used by render_video, for pools of
+different sizes, per-instance concurrency limits and placement policies.
+Each case is run once on a healthy cluster and once with injected failures
+(a per-job failure rate plus one instance going down mid-burst), where jobs
+are retried on another instance.
+
+The single-instance, one-job-at-a-time case is the previous behaviour.
+
+Usage:
+    python bench_render_scheduler.py [--posts 40] [--bursts 4]
+        [--instances 1,2,3,4] [--capacity 1,2] [--render-s 180]
+        [--contention 0.6] [--failure-rate 0.05]
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+
+from harness import COMMON_DIR
+
+sys.path.insert(0, COMMON_DIR)
+from render_scheduler import PLACEMENTS, simulate_cluster  # noqa: E402
+
+
+def news_day(posts, bursts, seed=11):
+    """
+    Return arrival times of posts grouped into bursts over a day.
+    """
+    rng = random.Random(seed)
+    starts = sorted(rng.uniform(0, 20 * 3600) for _ in range(bursts))
+    return sorted(
+        starts[i % bursts] + rng.expovariate(1 / 120) for i in range(posts)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=40)
+    parser.add_argument("--bursts", type=int, default=4)
+    parser.add_argument("--instances", default="1,2,3,4")
+    parser.add_argument("--capacity", default="1,2")
+    parser.add_argument("--render-s", type=float, default=180)
+    parser.add_argument("--contention", type=float, default=0.6)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    args = parser.parse_args()
+    # Instances taken out of the pool are expected here; keep the report clean.
+    logging.disable(logging.WARNING)
+
+    arrivals = news_day(args.posts, args.bursts)
+    # The first instance goes down shortly after the first burst starts.
+    outage = [(0, arrivals[0] + 60, arrivals[0] + 1800)]
+
+    cases = []
+    for instances in (int(n) for n in args.instances.split(",")):
+        for capacity in (int(c) for c in args.capacity.split(",")):
+            for placement in PLACEMENTS:
+                if instances == 1 and placement != PLACEMENTS[0]:
+                    continue
+                common = dict(
+                    instances=instances, capacity=capacity, placement=placement,
+                    render_seconds=args.render_s, contention=args.contention
+                )
+                healthy = simulate_cluster(arrivals, **common)
+                faulty = simulate_cluster(
+                    arrivals, failure_rate=args.failure_rate,
+                    outages=outage if instances > 1 else (), **common
+                )
+                cases.append({
+                    "instances": instances,
+                    "capacity": capacity,
+                    "placement": placement,
+                    "healthy": healthy,
+                    "with_failures": faulty,
+                })
+
+    baseline = cases[0]["healthy"]
+    for case in cases:
+        case["p95_speedup"] = round(baseline["p95_latency_s"] / case["healthy"]["p95_latency_s"], 2)
+    print(json.dumps({"posts": len(arrivals), "baseline": baseline, "cases": cases}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
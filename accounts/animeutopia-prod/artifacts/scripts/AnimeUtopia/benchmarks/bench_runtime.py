@@ -0,0 +1,123 @@
+"""
+Benchmark the per-invocation cost of AWS clients and HTTP connections, built
+fresh in every invocation against shared through runtime.py.
+
+  clients  building the s3, ec2, ssm and sqs clients a warm invocation needs:
+           boto3.client() each time, as the handlers used to, against
+           runtime.get_client(), which builds them once per environment
+  http     one invocation's requests to a local HTTPS server: an AniList
+           query, --covers cover downloads and a webhook call, made with
+           requests.get() (a new connection and TLS handshake per request)
+           against a runtime.get_session() session reusing its connections
+
+Both report p50/p95 milliseconds per warm invocation. The server is local, so
+the handshakes cost CPU but no network round trips; against AniList, the
+cover CDN or Teams each one also pays two to three round trips, and the
+savings measured here are a lower bound. Without openssl the HTTP part runs
+over plain HTTP.
+
+Usage:
+    python bench_runtime.py [--invocations 50] [--covers 3]
+        [--output results/runtime.json] [--baseline results/old.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import boto3
+import requests
+
+from harness import (
+    COMMON_DIR, StaticRoutes, compare_results, make_cover_image, make_tls_cert, percentiles, save_results
+)
+
+sys.path.insert(0, COMMON_DIR)
+import runtime  # noqa: E402
+
+SERVICES = ("s3", "ec2", "ssm", "sqs")
+REGION = os.environ.get("AWS_REGION", "us-east-2")
+
+
+def time_invocations(invocation, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        invocation()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def bench_clients(count):
+    runtime.reset()
+    return {
+        "per_invocation_ms": time_invocations(
+            lambda: [boto3.client(service, region_name=REGION) for service in SERVICES], count
+        ),
+        "shared_ms": time_invocations(
+            lambda: [runtime.get_client(service, REGION) for service in SERVICES], count
+        ),
+    }
+
+
+def bench_http(count, covers, tls):
+    routes = {
+        "/anilist": (json.dumps({"data": {"Media": None}}).encode("utf-8"), 0, {"Content-Type": "application/json"}),
+        "/cover.jpg": (make_cover_image(1000, 1500, quality=85), 0, {"Content-Type": "image/jpeg"}),
+        "/webhook": (b"1", 0, {"Content-Type": "text/plain"}),
+    }
+    verify = tls[0] if tls else True
+    with StaticRoutes(routes, tls=tls) as server:
+        paths = ["/anilist"] + ["/cover.jpg"] * covers + ["/webhook"]
+        urls = [server.base_url + path for path in paths]
+
+        def fresh():
+            for url in urls:
+                requests.get(url, verify=verify, timeout=10).raise_for_status()
+
+        runtime.reset()
+        session = runtime.get_session("bench")
+
+        def shared():
+            for url in urls:
+                session.get(url, verify=verify).raise_for_status()
+
+        return {
+            "requests_per_invocation": len(urls),
+            "tls": bool(tls),
+            "per_request_connection_ms": time_invocations(fresh, count),
+            "shared_session_ms": time_invocations(shared, count),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invocations", type=int, default=50)
+    parser.add_argument("--covers", type=int, default=3)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = {
+            "benchmark": "runtime",
+            "invocations": args.invocations,
+            "clients": bench_clients(args.invocations),
+            "http": bench_http(args.invocations, args.covers, make_tls_cert(tmp)),
+        }
+    for part in ("clients", "http"):
+        fresh, shared = [v["p50"] for k, v in report[part].items() if k.endswith("_ms")]
+        report[part]["saved_p50_ms"] = round(fresh - shared, 3)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["changes"] = compare_results(json.load(f), report)
+    if args.output:
+        report = save_results(report, args.output)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Compare the memory-mapped title catalog with loading the raw JSON export.
+
+Builds a catalog from a synthetic AniList-style export, then measures in fresh
+processes the cost of making it queryable (open/mmap versus json.load plus a
+lookup dict) and the per-lookup latency of each.
+
+Usage:
+    python bench_title_catalog.py [--media 20000] [--lookups 10000]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from harness import load_lambda
+
+
+def make_export(count, rng):
+    export = []
+    for i in range(count):
+        romaji = f"Sekai no Owari {i} " + "".join(rng.choices("aeiouknst", k=8))
+        export.append({
+            "title": {"romaji": romaji, "english": f"End of the World {i}", "native": None},
+            "synonyms": [f"EotW {i}"],
+            "coverImage": {"extraLarge": f"https://img.example.com/cover/{i}.jpg"},
+        })
+    return export
+
+
+def import_process_content():
+    load_lambda("process_content")
+    import title_catalog  # noqa: F401
+
+
+def open_mmap(catalog_path, queries):
+    from title_catalog import TitleCatalog
+
+    start = time.perf_counter()
+    catalog = TitleCatalog(catalog_path)
+    open_s = time.perf_counter() - start
+    start = time.perf_counter()
+    hits = sum(catalog.lookup(q) is not None for q in queries)
+    lookup_s = time.perf_counter() - start
+    return {"open_ms": round(open_s * 1000, 3),
+            "lookup_us": round(lookup_s / len(queries) * 1e6, 2), "hits": hits}
+
+
+def open_json(export_path, queries):
+    from title_catalog import _media_record
+    from title_matcher import normalize
+
+    start = time.perf_counter()
+    with open(export_path, "r", encoding="utf-8") as f:
+        export = json.load(f)
+    index = {}
+    for item in export:
+        titles, cover = _media_record(item)
+        for title in titles:
+            index.setdefault(normalize(title), (titles, cover))
+    open_s = time.perf_counter() - start
+    start = time.perf_counter()
+    hits = sum(index.get(normalize(q)) is not None for q in queries)
+    lookup_s = time.perf_counter() - start
+    return {"open_ms": round(open_s * 1000, 3),
+            "lookup_us": round(lookup_s / len(queries) * 1e6, 2), "hits": hits}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--media", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    from harness import run_isolated
+    import_process_content()
+    from title_catalog import build_catalog
+
+    rng = random.Random(3)
+    export = make_export(args.media, rng)
+    queries = [f"End of the World {rng.randrange(args.media * 2)}" for _ in range(args.lookups)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export_path = os.path.join(tmp, "export.json")
+        catalog_path = os.path.join(tmp, "anime_catalog.bin")
+        with open(export_path, "w", encoding="utf-8") as f:
+            json.dump(export, f)
+        keys, media = build_catalog(export, catalog_path)
+        report = {
+            "media": media,
+            "keys": keys,
+            "export_mb": round(os.path.getsize(export_path) / 2**20, 2),
+            "catalog_mb": round(os.path.getsize(catalog_path) / 2**20, 2),
+            "mmap_catalog": run_isolated(open_mmap, catalog_path, queries,
+                                         setup=import_process_content),
+            "json_export": run_isolated(open_json, export_path, queries,
+                                        setup=import_process_content),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
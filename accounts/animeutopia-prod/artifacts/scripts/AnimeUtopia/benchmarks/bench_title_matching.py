@@ -0,0 +1,117 @@
+"""
+Benchmark the indexed title matcher against the original per-call matcher.
+
+Matches synthetic headlines against a synthetic catalog of anime titles. The
+original implementation (regex rebuilt per call plus fuzzywuzzy extractOne
+over the full catalog) is far too slow to run on every headline, so it is run
+on a sample and extrapolated.
+
+Usage:
+    python bench_title_matching.py [--headlines 10000] [--catalog 20000]
+                                   [--baseline-sample 20]
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from harness import load_lambda
+
+WORDS = (
+    "sword art online attack titan demon slayer hero academia spy family jujutsu "
+    "kaisen chainsaw man blue lock frieren journey beyond dungeon meshi solo "
+    "leveling oshi ko kaguya sama love war vinland saga mob psycho tokyo ghoul "
+    "revengers fire force black clover dr stone re zero konosuba overlord slime "
+    "reincarnated shield rising violet evergarden haikyu kuroko basketball"
+).split()
+TAILS = [
+    "Anime Gets 2nd Season", "Reveals New Trailer", "Announces Cast",
+    "Premieres in July", "English Dub Confirmed", "Debuts New Visual",
+]
+
+
+def make_catalog(size, rng):
+    titles = set()
+    while len(titles) < size:
+        words = rng.sample(WORDS, rng.randint(2, 4))
+        titles.add(" ".join(w.capitalize() for w in words) + f" {rng.randint(1, 999)}")
+    return sorted(titles)
+
+
+def make_headlines(catalog, count, rng):
+    headlines = []
+    for _ in range(count):
+        title = rng.choice(catalog)
+        if rng.random() < 0.3:
+            title = title.replace(" ", ": ", 1)
+        headlines.append(f"{title} {rng.choice(TAILS)}")
+    return headlines
+
+
+def original_match(full_title, anime_titles):
+    from fuzzywuzzy import fuzz, process
+
+    separators = [
+        " Anime ", " Gets ", " Announces ", " Reveals ", " Confirmed ",
+        " Premieres ", " Debuts ", " Trailer ", " English Dub "
+    ]
+    separator_pattern = "(" + "|".join(map(re.escape, separators)) + ")"
+    match = re.search(separator_pattern, full_title, flags=re.IGNORECASE)
+    core_title = full_title[:match.start()].strip() if match else full_title.strip()
+    result = process.extractOne(core_title, anime_titles, scorer=fuzz.partial_ratio)
+    if result and result[1] > 80:
+        return result[0]
+    return core_title
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--headlines", type=int, default=10000)
+    parser.add_argument("--catalog", type=int, default=20000)
+    parser.add_argument("--baseline-sample", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    load_lambda("process_content")
+    from title_matcher import TitleIndex, split_title
+
+    rng = random.Random(args.seed)
+    catalog = make_catalog(args.catalog, rng)
+    headlines = make_headlines(catalog, args.headlines, rng)
+
+    start = time.perf_counter()
+    index = TitleIndex(catalog)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cores = [split_title(h)[0] for h in headlines]
+    matches = index.match_many(cores)
+    indexed_s = time.perf_counter() - start
+
+    report = {
+        "headlines": args.headlines,
+        "catalog": args.catalog,
+        "index_build_s": round(build_s, 3),
+        "indexed_total_s": round(indexed_s, 3),
+        "indexed_per_headline_ms": round(indexed_s / args.headlines * 1000, 3),
+        "indexed_match_rate": round(sum(m is not None for m in matches) / len(matches), 3),
+    }
+
+    sample = headlines[:args.baseline_sample]
+    if sample:
+        try:
+            start = time.perf_counter()
+            for headline in sample:
+                original_match(headline, catalog)
+            per_headline = (time.perf_counter() - start) / len(sample)
+            report["original_per_headline_ms"] = round(per_headline * 1000, 3)
+            report["original_extrapolated_total_s"] = round(per_headline * args.headlines, 1)
+            report["speedup"] = round(per_headline * args.headlines / indexed_s, 1)
+        except ImportError:
+            report["original"] = "fuzzywuzzy not installed"
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
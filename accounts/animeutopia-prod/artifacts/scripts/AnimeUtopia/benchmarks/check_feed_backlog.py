@@ -0,0 +1,75 @@
+"""
+Check that posts left over by fetch_rss's per-run cap are emitted by later runs.
+
+A local feed is seeded, then gets one non-anime and seven new anime entries
+on top. With FEED_MAX_POSTS at 5 the first run emits five posts and the
+second the remaining two, once store_data's commit of the first batch has
+marked it seen - with either parser. The streaming parser must not stop at
+the entries the first run marked seen, which sit above the two left over.
+
+Exits non-zero if a run emits other posts than expected.
+
+Usage:
+    python check_feed_backlog.py
+"""
+import json
+import os
+import sys
+import tempfile
+
+from harness import StaticRoutes, load_lambda, make_rss
+
+
+def items(document):
+    """Return the <item> elements of a make_rss document, as bytes."""
+    body = document.split(b"<channel><title>Synthetic</title>", 1)[1]
+    return body.rsplit(b"</channel>", 1)[0]
+
+
+def feed(*documents):
+    return (
+        b'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Synthetic</title>'
+        + b"".join(items(d) for d in documents)
+        + b"</channel></rss>"
+    )
+
+
+def main():
+    tmp = tempfile.TemporaryDirectory()
+    state_file = os.path.join(tmp.name, "fetch_rss_state.json")
+    os.environ.update({"FEED_STATE_FILE": state_file, "FEED_MAX_POSTS": "5"})
+    os.environ.pop("FEED_STATE_BUCKET", None)
+    fetch_rss = load_lambda("fetch_rss")
+    from feed_state import commit_checkpoint, get_state_store
+
+    old = make_rss(10, prefix="Old")
+    new = feed(make_rss(1, prefix="Note", start=1), make_rss(7, prefix="New", anime_every=1), old)
+    routes = {"/feed.xml": (old, 0, {"Content-Type": "application/rss+xml"})}
+    expected = [[f"new-{i}" for i in range(5)], ["new-5", "new-6"]]
+    report = {}
+    failed = False
+    with StaticRoutes(routes) as server:
+        for parser in ("feedparser", "stream"):
+            os.environ["FEED_REGISTRY_JSON"] = json.dumps(
+                [{"name": "feed", "url": f"{server.base_url}/feed.xml", "parser": parser}]
+            )
+            if os.path.exists(state_file):
+                os.remove(state_file)
+            routes["/feed.xml"] = (old, 0, {"Content-Type": "application/rss+xml"})
+            seeded = fetch_rss.lambda_handler({}, None)
+            routes["/feed.xml"] = (new, 0, {"Content-Type": "application/rss+xml"})
+            runs = []
+            for _ in expected:
+                result = fetch_rss.lambda_handler({}, None)
+                runs.append([post["guid"] for post in result.get("posts", [])])
+                if result.get("checkpoint"):
+                    commit_checkpoint(get_state_store(), result["checkpoint"])
+            report[parser] = {"seeded": seeded.get("seeded"), "runs": runs, "ok": runs == expected}
+            failed = failed or runs != expected
+    tmp.cleanup()
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,872 @@
+"""
+Shared helpers for the local benchmarks.
+
+The Lambda handlers all live in a module called lambda_function, so they are
+loaded here under a per-function name to allow several of them to be imported
+side by side.
+
+Besides synthetic feed, cover and TLS certificate generators, it provides
+local stand-ins for everything the handlers talk to: HTTP servers for the
+feeds (StaticRoutes, optionally over TLS), AniList and its CDN
+(AniListServer) and the Teams webhook (WebhookSink), an HTTP S3 for upload
+benchmarks (LocalS3), and in-memory boto3-style clients for S3, EC2, SSM and
+SQS (FakeS3, FakeEC2, FakeSSM, FakeSQS), handed to the handlers through
+FakeAWS.
+"""
+import importlib.util
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Handlers print an embedded-metric line per invocation; keep them out of the
+# benchmarks' JSON output.
+os.environ.setdefault("METRICS_ENABLED", "false")
+# Modules shipped in the shared Lambda layer (mounted at /opt/python in Lambda).
+COMMON_DIR = os.path.join(SCRIPTS_DIR, "common", "python")
+
+
+def load_lambda(name):
+    """
+    Import the lambda_function module of a handler directory, with the shared
+    layer modules importable as they are in Lambda.
+
+    Args:
+        name (str): Handler directory name, e.g. "fetch_rss".
+
+    Returns:
+        module: The imported handler module, registered as "<name>_lambda".
+    """
+    module_name = f"{name}_lambda"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    handler_dir = os.path.join(SCRIPTS_DIR, name)
+    for path in (COMMON_DIR, handler_dir):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(
+        module_name, os.path.join(handler_dir, "lambda_function.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_rss(count, prefix="Show", anime_every=2, start=0):
+    """
+    Build a synthetic RSS 2.0 document.
+
+    Args:
+        count (int): Number of items.
+        prefix (str): Prefix for generated titles and GUIDs.
+        anime_every (int): Every n-th item is categorised as Anime.
+        start (int): Index offset, so several feeds can share items.
+
+    Returns:
+        bytes: The encoded RSS document, newest item first.
+    """
+    now = time.time()
+    items = []
+    for i in range(start, start + count):
+        category = "Anime" if i % anime_every == 0 else "Manga"
+        items.append(
+            "<item>"
+            f"<title>{prefix} {i} Anime Gets Season {i % 7 + 2}</title>"
+            f"<link>https://news.example.com/{prefix.lower()}/{i}</link>"
+            f"<guid>{prefix.lower()}-{i}</guid>"
+            f"<category>{category}</category>"
+            f"<description>Synthetic description for item {i}.</description>"
+            f"<pubDate>{formatdate(now - i * 60)}</pubDate>"
+            "</item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss version="2.0"><channel><title>Synthetic</title>'
+        + "".join(items)
+        + "</channel></rss>"
+    ).encode("utf-8")
+
+
+def make_cover_image(width=1500, height=2250, quality=92):
+    """
+    Build a synthetic JPEG roughly the size of an AniList extraLarge cover.
+
+    Args:
+        width (int): Image width.
+        height (int): Image height.
+        quality (int): JPEG quality.
+
+    Returns:
+        bytes: The encoded JPEG.
+    """
+    import io
+
+    from PIL import Image, ImageDraw
+
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, 40):
+        draw.line([(i, 0), (width - i, height)], fill=(i % 255, 80, 160), width=6)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+def make_tls_cert(directory):
+    """
+    Create a self-signed certificate for 127.0.0.1 with the openssl CLI.
+
+    Returns:
+        tuple: Paths of the certificate and its key, or None without openssl.
+    """
+    import shutil
+    import subprocess
+
+    openssl = shutil.which("openssl")
+    if not openssl:
+        return None
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [openssl, "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", key, "-out", cert, "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+
+class StaticRoutes:
+    """
+    Serve fixed bodies from a local ThreadingHTTPServer with per-route latency.
+
+    Routes map a path to (body_bytes, delay_seconds, headers). Connections are
+    kept alive (HTTP/1.1), and with tls=(cert, key) from make_tls_cert they
+    are served over TLS, so clients that reuse connections skip the
+    handshake. Use as a context manager; base_url is available once the
+    server is running.
+    """
+
+    def __init__(self, routes, tls=None):
+        self.routes = routes
+        self.tls = tls
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"{'https' if self.tls else 'http'}://{host}:{port}"
+
+    def __enter__(self):
+        routes = self.routes
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                route = routes.get(self.path)
+                if route is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body, delay, headers = route
+                if delay:
+                    time.sleep(delay)
+                self.send_response(200)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        if self.tls:
+            import ssl
+
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*self.tls)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LocalS3:
+    """
+    Minimal in-memory S3 stand-in for upload benchmarks.
+
+    Implements PUT/HEAD/GET object and the multipart upload calls (create,
+    upload part, list parts, complete, abort) with path-style addressing. Each
+    request can be slowed by a fixed latency and each connection capped to a
+    bandwidth, so part size and concurrency trade-offs show up locally. Use as
+    a context manager and point a client at base_url.
+    """
+
+    def __init__(self, latency=0.0, bandwidth_mbps=None):
+        self.latency = latency
+        self.bandwidth_mbps = bandwidth_mbps
+        self.objects = {}
+        self.uploads = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def client(self):
+        """Return a boto3 S3 client configured for this stand-in."""
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            "s3",
+            endpoint_url=self.base_url,
+            region_name="us-east-2",
+            aws_access_key_id="local",
+            aws_secret_access_key="local",
+            config=Config(
+                s3={"addressing_style": "path"},
+                max_pool_connections=64,
+                request_checksum_calculation="when_required",
+                response_checksum_validation="when_required",
+            ),
+        )
+
+    def __enter__(self):
+        import hashlib
+        import uuid
+        from urllib.parse import parse_qs, urlsplit
+
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _target(self):
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+                return parts.path.lstrip("/"), query
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length", 0))
+                data = self.rfile.read(length)
+                delay = store.latency
+                if store.bandwidth_mbps:
+                    delay += len(data) * 8 / (store.bandwidth_mbps * 1e6)
+                if delay:
+                    time.sleep(delay)
+                with store.lock:
+                    store.requests += 1
+                return data
+
+            def _reply(self, status, body=b"", headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _xml(self, body):
+                self._reply(200, body.encode("utf-8"), {"Content-Type": "application/xml"})
+
+            def do_PUT(self):
+                path, query = self._target()
+                data = self._body()
+                etag = '"%s"' % hashlib.md5(data).hexdigest()
+                if "uploadId" in query:
+                    with store.lock:
+                        store.uploads[query["uploadId"]]["parts"][int(query["partNumber"])] = (data, etag)
+                else:
+                    metadata = {k: v for k, v in self.headers.items() if k.lower().startswith("x-amz-meta-")}
+                    with store.lock:
+                        store.objects[path] = (data, metadata)
+                self._reply(200, headers={"ETag": etag})
+
+            def do_POST(self):
+                path, query = self._target()
+                self._body()
+                if "uploads" in query:
+                    upload_id = uuid.uuid4().hex
+                    metadata = {k: v for k, v in self.headers.items() if k.lower().startswith("x-amz-meta-")}
+                    with store.lock:
+                        store.uploads[upload_id] = {"path": path, "parts": {}, "metadata": metadata}
+                    bucket, key = path.split("/", 1)
+                    self._xml(
+                        "<InitiateMultipartUploadResult>"
+                        f"<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+                        "</InitiateMultipartUploadResult>"
+                    )
+                elif "uploadId" in query:
+                    with store.lock:
+                        upload = store.uploads.pop(query["uploadId"])
+                        data = b"".join(upload["parts"][n][0] for n in sorted(upload["parts"]))
+                        store.objects[path] = (data, upload["metadata"])
+                    bucket, key = path.split("/", 1)
+                    self._xml(
+                        "<CompleteMultipartUploadResult>"
+                        f"<Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                        f'<ETag>"{hashlib.md5(data).hexdigest()}-{len(upload["parts"])}"</ETag>'
+                        "</CompleteMultipartUploadResult>"
+                    )
+                else:
+                    self._reply(400)
+
+            def do_GET(self):
+                path, query = self._target()
+                if "uploadId" in query:
+                    with store.lock:
+                        parts = dict(store.uploads.get(query["uploadId"], {}).get("parts", {}))
+                    self._xml(
+                        "<ListPartsResult>"
+                        + "".join(
+                            f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag>"
+                            f"<Size>{len(data)}</Size></Part>"
+                            for n, (data, etag) in sorted(parts.items())
+                        )
+                        + "<IsTruncated>false</IsTruncated></ListPartsResult>"
+                    )
+                    return
+                self.do_HEAD()
+
+            def do_HEAD(self):
+                path, _ = self._target()
+                with store.lock:
+                    entry = store.objects.get(path)
+                if entry is None:
+                    self._reply(404)
+                    return
+                data, metadata = entry
+                self._reply(200, data, metadata)
+
+            def do_DELETE(self):
+                path, query = self._target()
+                with store.lock:
+                    if "uploadId" in query:
+                        store.uploads.pop(query["uploadId"], None)
+                    else:
+                        store.objects.pop(path, None)
+                self._reply(204)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class AniListServer:
+    """
+    Local stand-in for the AniList GraphQL API and its cover image CDN.
+
+    Answers the single and aliased multi-title queries process_content sends:
+    every searched title is found (romaji = the search string) except a
+    miss_rate share, chosen by hash so the answer is stable. Cover URLs point
+    back at the server, which serves one of `covers` synthetic covers. Each
+    GraphQL request is slowed by `latency` seconds. Use as a context manager.
+    """
+
+    def __init__(self, latency=0.0, miss_rate=0.0, covers=20):
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.covers = [make_cover_image(1000 + 2 * i, 1500 + 2 * i, quality=85) for i in range(covers)]
+        self.requests = 0
+        self.server = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def media(self, title):
+        import hashlib
+
+        digest = int(hashlib.sha1(title.encode("utf-8")).hexdigest(), 16)
+        if (digest % 1000) / 1000 < self.miss_rate:
+            return None
+        return {
+            "title": {"romaji": title, "english": None, "native": None},
+            "coverImage": {"extraLarge": f"{self.base_url}/covers/{digest % len(self.covers)}.jpg"},
+        }
+
+    def __enter__(self):
+        import json
+        import re
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, body, content_type):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                variables = request.get("variables") or {}
+                if "search" in variables:
+                    data = {"Media": stub.media(variables["search"])}
+                else:
+                    data = {f"t{name[1:]}": stub.media(value) for name, value in variables.items()}
+                self._reply(json.dumps({"data": data}).encode("utf-8"), "application/json")
+
+            def do_GET(self):
+                match = re.fullmatch(r"/covers/(\d+)\.jpg", self.path)
+                if not match:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self._reply(stub.covers[int(match.group(1))], "image/jpeg")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class WebhookSink:
+    """
+    Local endpoint that accepts and records POSTed webhook payloads (e.g. the
+    Teams message notify_post sends). Use as a context manager.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.payloads = []
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/webhook"
+
+    def __enter__(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                sink.payloads.append(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if sink.latency:
+                    time.sleep(sink.latency)
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _client_error(code, operation):
+    from botocore.exceptions import ClientError
+
+    return ClientError({"Error": {"Code": code}}, operation)
+
+
+class FakeS3:
+    """
+    In-memory S3 client: the object calls the handlers make, with ETags and
+    If-Match/If-None-Match conditional puts. Every call can be slowed by a
+    fixed latency.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _call(self):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put_object(self, Bucket, Key, Body=b"", IfMatch=None, IfNoneMatch=None, Metadata=None, **kwargs):
+        import hashlib
+
+        self._call()
+        body = Body.encode("utf-8") if isinstance(Body, str) else (Body.read() if hasattr(Body, "read") else Body)
+        with self.lock:
+            current = self.objects.get((Bucket, Key))
+            if (IfNoneMatch == "*" and current) or (IfMatch and (not current or current["ETag"] != IfMatch)):
+                raise _client_error("PreconditionFailed", "PutObject")
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            self.objects[(Bucket, Key)] = {"Body": body, "ETag": etag, "Metadata": Metadata or {}}
+        return {"ETag": etag}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        import io
+
+        self._call()
+        with self.lock:
+            current = self.objects.get((Bucket, Key))
+        if current is None:
+            raise _client_error("NoSuchKey", "GetObject")
+        return {"Body": io.BytesIO(current["Body"]), "ETag": current["ETag"],
+                "ContentLength": len(current["Body"]), "Metadata": current["Metadata"]}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._call()
+        with self.lock:
+            current = self.objects.get((Bucket, Key))
+        if current is None:
+            raise _client_error("404", "HeadObject")
+        return {"ETag": current["ETag"], "ContentLength": len(current["Body"]), "Metadata": current["Metadata"]}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+
+class FakeEC2:
+    """
+    In-memory EC2 client for a set of instances that start and stop at once.
+    """
+
+    def __init__(self, instance_ids, state="stopped"):
+        self.states = dict.fromkeys(instance_ids, state)
+
+    def describe_instances(self, InstanceIds, **kwargs):
+        return {"Reservations": [{"Instances": [
+            {"InstanceId": i, "State": {"Name": self.states[i]}} for i in InstanceIds
+        ]}]}
+
+    def _transition(self, instance_ids, state):
+        changes = []
+        for i in instance_ids:
+            previous = self.states[i]
+            self.states[i] = state
+            changes.append({"InstanceId": i, "PreviousState": {"Name": previous},
+                            "CurrentState": {"Name": state}})
+        return changes
+
+    def start_instances(self, InstanceIds, **kwargs):
+        return {"StartingInstances": self._transition(InstanceIds, "running")}
+
+    def stop_instances(self, InstanceIds, Hibernate=False, **kwargs):
+        return {"StoppingInstances": self._transition(InstanceIds, "stopped")}
+
+
+class FakeSSM:
+    """
+    In-memory SSM client. Running instances of the FakeEC2 report "Online";
+    send_command hands the command to `runner(instance_id, commands)`, which
+    returns (status, stdout), and the invocation reaches that status once
+    `command_seconds` have passed.
+    """
+
+    class exceptions:
+        class InvocationDoesNotExist(Exception):
+            pass
+
+    def __init__(self, ec2, runner, command_seconds=0.0):
+        import itertools
+
+        self.ec2 = ec2
+        self.runner = runner
+        self.command_seconds = command_seconds
+        self.commands = {}
+        self._ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def describe_instance_information(self, Filters=(), NextToken=None, **kwargs):
+        wanted = next((f["Values"] for f in Filters if f["Key"] == "InstanceIds"), list(self.ec2.states))
+        return {"InstanceInformationList": [
+            {"InstanceId": i, "PingStatus": "Online"}
+            for i in wanted if self.ec2.states.get(i) == "running"
+        ]}
+
+    def send_command(self, InstanceIds, DocumentName, Parameters, **kwargs):
+        with self.lock:
+            command_id = f"cmd-{next(self._ids)}"
+        for instance_id in InstanceIds:
+            status, stdout = self.runner(instance_id, Parameters["commands"])
+            self.commands[(command_id, instance_id)] = {
+                "status": status, "stdout": stdout, "done_at": time.monotonic() + self.command_seconds
+            }
+        return {"Command": {"CommandId": command_id}}
+
+    def get_command_invocation(self, CommandId, InstanceId, **kwargs):
+        command = self.commands.get((CommandId, InstanceId))
+        if command is None:
+            raise self.exceptions.InvocationDoesNotExist(CommandId)
+        if time.monotonic() < command["done_at"]:
+            return {"Status": "InProgress", "StandardOutputContent": "", "StandardErrorContent": ""}
+        return {"Status": command["status"], "StandardOutputContent": command["stdout"],
+                "StandardErrorContent": ""}
+
+    def cancel_command(self, CommandId, InstanceIds=(), **kwargs):
+        for instance_id in InstanceIds:
+            self.commands.pop((CommandId, instance_id), None)
+
+
+class FakeSQS:
+    """
+    In-memory SQS client for standard queues, with visibility timeouts and
+    receive counts.
+    """
+
+    def __init__(self, visibility_timeout=900):
+        import itertools
+
+        self.visibility_timeout = visibility_timeout
+        self.messages = {}
+        self._ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        with self.lock:
+            for entry in Entries:
+                receipt = f"rh-{next(self._ids)}"
+                self.messages[receipt] = {"queue": QueueUrl, "body": entry["MessageBody"],
+                                          "visible_at": 0.0, "receives": 0,
+                                          "sent_ms": int(time.time() * 1000)}
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, **kwargs):
+        now = time.monotonic()
+        out = []
+        with self.lock:
+            for receipt, message in self.messages.items():
+                if message["queue"] == QueueUrl and message["visible_at"] <= now:
+                    message["visible_at"] = now + self.visibility_timeout
+                    message["receives"] += 1
+                    out.append({"ReceiptHandle": receipt, "Body": message["body"], "Attributes": {
+                        "ApproximateReceiveCount": str(message["receives"]),
+                        "SentTimestamp": str(message["sent_ms"]),
+                    }})
+                    if len(out) >= MaxNumberOfMessages:
+                        break
+        return {"Messages": out} if out else {}
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **kwargs):
+        with self.lock:
+            self.messages.pop(ReceiptHandle, None)
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout, **kwargs):
+        with self.lock:
+            if ReceiptHandle in self.messages:
+                self.messages[ReceiptHandle]["visible_at"] = time.monotonic() + VisibilityTimeout
+
+    def get_queue_attributes(self, QueueUrl, **kwargs):
+        now = time.monotonic()
+        with self.lock:
+            queued = [m for m in self.messages.values() if m["queue"] == QueueUrl]
+        visible = sum(1 for m in queued if m["visible_at"] <= now)
+        return {"Attributes": {"ApproximateNumberOfMessages": str(visible),
+                               "ApproximateNumberOfMessagesNotVisible": str(len(queued) - visible)}}
+
+
+class FakeAWS:
+    """
+    Stand-in for the boto3 module: client(name) returns the fake registered
+    for that service. Assign it to the runtime module's "boto3" attribute
+    and call runtime.reset(), so the handlers' get_client() returns the fakes.
+    """
+
+    def __init__(self, **clients):
+        self.clients = clients
+
+    def client(self, service_name, *args, **kwargs):
+        return self.clients[service_name]
+
+
+def percentiles(samples):
+    """
+    Return p50 and p95 (nearest rank) of a list of numbers.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {"p50": None, "p95": None}
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {"p50": round(statistics.median(ordered), 3), "p95": round(ordered[p95_index], 3)}
+
+
+def git_revision():
+    """
+    Return the short commit hash of the working tree, or None outside git.
+    """
+    import subprocess
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(report, path):
+    """
+    Write a benchmark report as JSON, stamped with the commit and time.
+
+    Returns:
+        dict: The stamped report.
+    """
+    import json
+
+    report = dict(report, commit=git_revision(), recorded_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def compare_results(baseline, current, prefix=""):
+    """
+    Compare the p50/p95 figures of two reports of the same benchmark.
+
+    Every numeric value whose key starts with "p50" or "p95" is paired with
+    the value at the same path in the baseline.
+
+    Returns:
+        dict: path -> {"baseline", "current", "change_pct"}.
+    """
+    changes = {}
+    for key, value in current.items():
+        path = f"{prefix}.{key}" if prefix else key
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            changes.update(compare_results(old or {}, value, path))
+        elif key.startswith(("p50", "p95")) and isinstance(value, (int, float)) \
+                and isinstance(old, (int, float)):
+            changes[path] = {
+                "baseline": old,
+                "current": value,
+                "change_pct": round((value - old) / old * 100, 1) if old else None,
+            }
+    return changes
+
+
+def measure(func, repeat=5):
+    """
+    Run func repeatedly and summarise wall-clock latency.
+
+    Args:
+        func (callable): Zero-argument callable to time.
+        repeat (int): Number of runs.
+
+    Returns:
+        dict: min, p50, p95 and max latency in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95_index = min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))
+    return {
+        "min_ms": round(samples[0], 2),
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[p95_index], 2),
+        "max_ms": round(samples[-1], 2),
+    }
+
+
+def _peak_rss_kb():
+    """
+    Return the peak resident set size of this process in KiB.
+
+    VmHWM from /proc is preferred because, unlike ru_maxrss, it is not
+    inherited from the parent across fork/exec.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _isolated_entry(setup, target, args, queue):
+    if setup is not None:
+        setup()
+    _reset_peak_rss()
+    before = _peak_rss_kb()
+    result = target(*args)
+    after = _peak_rss_kb()
+    result["peak_rss_delta_mb"] = round((after - before) / 1024, 2)
+    queue.put(result)
+
+
+def run_isolated(target, *args, setup=None):
+    """
+    Run target(*args) in a fresh process and report its peak RSS growth.
+
+    The target must be a module-level function returning a dict; the increase
+    of ru_maxrss while it ran is added as "peak_rss_delta_mb". setup, if given,
+    is a module-level function run first and excluded from the measurement,
+    typically to perform imports.
+
+    Returns:
+        dict: The target's result plus peak_rss_delta_mb.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_isolated_entry, args=(setup, target, args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
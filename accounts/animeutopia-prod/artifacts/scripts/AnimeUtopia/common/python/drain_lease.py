@@ -0,0 +1,143 @@
+"""
+Lease that keeps a single render_video draining the render queue.
+
+A drainer's RenderScheduler counts the slots of every render instance in
+memory, so two executions draining at once (renders take up to 840s and the
+workflow starts every 5 minutes) would each fill every instance up to
+RENDER_INSTANCE_CONCURRENCY. render_video therefore takes this lease before
+draining (acquire_lease), renews it while it drains and releases it when
+it stops. An execution that finds the lease held by another drainer does
+not drain: its jobs are on the queue that drainer is working through. A
+drainer that dies leaves the lease to expire after LEASE_TTL seconds.
+
+The lease is a JSON object written conditionally in S3, so racing drainers
+cannot both take it.
+"""
+import json
+import os
+import time
+import logging
+
+from botocore.exceptions import ClientError
+
+from post_store import conditional_update
+from runtime import get_client
+
+logger = logging.getLogger()
+
+LEASE_BUCKET = os.environ.get("DRAIN_LEASE_BUCKET")
+LEASE_KEY = os.environ.get("DRAIN_LEASE_KEY", "state/render_drainer.json")
+LEASE_FILE = os.environ.get("DRAIN_LEASE_FILE", "/tmp/render_drainer.json")
+# Must comfortably exceed the interval the holder renews it at.
+LEASE_TTL = int(os.environ.get("DRAIN_LEASE_TTL", "120"))
+
+
+class LocalFileLeaseStore:
+    """Lease persisted as a JSON file on local disk."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def update(self, mutate):
+        lease = mutate(self.load())
+        if lease is not None:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(lease, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        return lease
+
+
+class S3LeaseStore:
+    """Lease persisted as a single JSON object in S3."""
+
+    def __init__(self, bucket, key, client=None):
+        self.bucket = bucket
+        self.key = key
+        self.client = client or get_client("s3")
+
+    def load(self):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return {}
+            raise
+        return json.loads(response["Body"].read())
+
+    def update(self, mutate):
+        return conditional_update(self.client, self.bucket, self.key, mutate)
+
+
+def get_lease_store():
+    """
+    Return the lease store configured through the environment.
+
+    Returns:
+        S3LeaseStore or LocalFileLeaseStore: S3 when DRAIN_LEASE_BUCKET is
+        set, otherwise a local file.
+    """
+    if LEASE_BUCKET:
+        return S3LeaseStore(LEASE_BUCKET, LEASE_KEY)
+    return LocalFileLeaseStore(LEASE_FILE)
+
+
+def acquire_lease(store, owner, now=None):
+    """
+    Take or renew the lease for owner.
+
+    Args:
+        store: Lease store.
+        owner (str): Drainer identity (the execution's run ID).
+        now (float): Epoch seconds; now by default.
+
+    Returns:
+        bool: True if owner holds the lease until now + LEASE_TTL, False if
+              another drainer holds it.
+    """
+    now = time.time() if now is None else now
+
+    def mutate(lease):
+        lease = lease or {}
+        if lease.get("owner") not in (None, owner) and lease.get("expires_at", 0) > now:
+            return None
+        return {"owner": owner, "expires_at": now + LEASE_TTL}
+
+    taken = store.update(mutate) is not None
+    if not taken:
+        logger.info("Render queue drain lease is held by %s.", store.load().get("owner"))
+    return taken
+
+
+def release_lease(store, owner):
+    """
+    Give up the lease if owner still holds it.
+    """
+    def mutate(lease):
+        if (lease or {}).get("owner") != owner:
+            return None
+        return {"owner": None, "expires_at": 0}
+
+    try:
+        store.update(mutate)
+    except Exception as e:
+        # It expires on its own.
+        logger.warning("Could not release the render queue drain lease: %s", e)
+
+
+def current_holder(store, now=None):
+    """
+    Return the owner of the lease if it has not expired, else None.
+    """
+    now = time.time() if now is None else now
+    lease = store.load()
+    if lease.get("owner") and lease.get("expires_at", 0) > now:
+        return lease["owner"]
+    return None
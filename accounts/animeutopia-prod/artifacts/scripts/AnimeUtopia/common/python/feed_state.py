@@ -0,0 +1,177 @@
+"""
+Persisted state of the feed fetcher: per-feed HTTP validators, the seen-GUID
+index and the entries emitted but not stored yet.
+
+fetch_rss does not mark the anime entries it emits as seen. It records them
+as pending and hands a checkpoint down the pipeline in its result; store_data
+commits the checkpoint (commit_checkpoint) once the posts are stored, moving
+the entries from pending to seen and advancing the validators of the feeds
+they were read from. Until then a 304 cannot hide them: a later run fetches
+those feeds in full and skips an entry only while it is pending, for
+PENDING_TTL seconds, after which it is emitted again (e.g. because
+ProcessContent failed).
+
+Every anime entry read but not stored yet - emitted, pending, or left for a
+later run by the per-run cap - is also kept as "outstanding", with the feed
+it came from, until it is committed or OUTSTANDING_TTL seconds have passed.
+The streaming parser stops at a seen entry only once it has read past every
+outstanding entry of the feed (outstanding_guids); otherwise the seen entries
+above them would hide them from every later run.
+
+The state is updated read-modify-write, conditionally in S3, because fetch_rss
+and store_data of overlapping executions write it concurrently.
+"""
+import json
+import os
+import time
+import logging
+
+from botocore.exceptions import ClientError
+
+from post_store import conditional_update
+from runtime import get_client
+
+logger = logging.getLogger()
+
+STATE_BUCKET = os.environ.get("FEED_STATE_BUCKET")
+STATE_KEY = os.environ.get("FEED_STATE_KEY", "state/fetch_rss.json")
+STATE_FILE = os.environ.get("FEED_STATE_FILE", "/tmp/fetch_rss_state.json")
+SEEN_INDEX_SIZE = int(os.environ.get("SEEN_INDEX_SIZE", "1000"))
+PENDING_TTL = int(os.environ.get("FEED_PENDING_TTL", "1800"))
+OUTSTANDING_TTL = int(os.environ.get("FEED_OUTSTANDING_TTL", "172800"))
+
+
+class LocalFileStateStore:
+    """Feed state persisted as a compact JSON file on local disk."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save(self, state):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def update(self, mutate):
+        state = mutate(self.load())
+        if state is not None:
+            self.save(state)
+        return state
+
+
+class S3StateStore:
+    """Feed state persisted as a single JSON object in S3."""
+
+    def __init__(self, bucket, key, client=None):
+        self.bucket = bucket
+        self.key = key
+        self.client = client or get_client("s3")
+
+    def load(self):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return {}
+            raise
+        return json.loads(response["Body"].read())
+
+    def save(self, state):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=json.dumps(state, separators=(",", ":")),
+            ContentType="application/json"
+        )
+
+    def update(self, mutate):
+        return conditional_update(self.client, self.bucket, self.key, mutate)
+
+
+def get_state_store():
+    """Return the feed state store configured through the environment.
+
+    Returns:
+        S3StateStore or LocalFileStateStore: S3 when FEED_STATE_BUCKET is set,
+                                             otherwise a local file.
+    """
+    if STATE_BUCKET:
+        return S3StateStore(STATE_BUCKET, STATE_KEY)
+    return LocalFileStateStore(STATE_FILE)
+
+
+def is_pending(state, guid, now):
+    """Return True if an entry was emitted less than PENDING_TTL seconds ago."""
+    emitted_at = (state.get("pending") or {}).get(guid)
+    return emitted_at is not None and now - emitted_at < PENDING_TTL
+
+
+def outstanding_guids(state, feed_url):
+    """Return the GUIDs of a feed's entries read but not stored yet."""
+    return {
+        guid for guid, entry in (state.get("outstanding") or {}).items()
+        if entry.get("feed") == feed_url
+    }
+
+
+def apply_fetch(state, now, seen=(), pending=(), feeds=None, outstanding=None):
+    """Return the state with a fetch_rss run's outcome merged in.
+
+    Args:
+        state (dict): Current state (None if there is none yet).
+        now (float): Epoch seconds of the run.
+        seen (list): GUIDs to mark seen right away, oldest first.
+        pending (list): GUIDs emitted by this run.
+        feeds (dict): Feed URL -> validators to store.
+        outstanding (dict): GUID -> feed URL of the anime entries read by
+                            this run and not stored yet.
+    """
+    state = dict(state or {})
+    known = list(state.get("seen") or [])
+    known_set = set(known)
+    state["seen"] = (known + [g for g in seen if g not in known_set])[-SEEN_INDEX_SIZE:]
+    # Entries pending past the TTL were never committed; drop them so the
+    # map does not grow. They stay outstanding, so they are read again.
+    state["pending"] = {
+        guid: at for guid, at in (state.get("pending") or {}).items() if now - at < PENDING_TTL
+    }
+    state["pending"].update((guid, now) for guid in pending)
+    seen_set = set(seen)
+    state["outstanding"] = {
+        guid: entry for guid, entry in (state.get("outstanding") or {}).items()
+        if guid not in seen_set and now - entry["at"] < OUTSTANDING_TTL
+    }
+    for guid, feed_url in (outstanding or {}).items():
+        if guid not in seen_set:
+            state["outstanding"].setdefault(guid, {"feed": feed_url, "at": now})
+    state["feeds"] = dict(state.get("feeds") or {}, **(feeds or {}))
+    return state
+
+
+def commit_checkpoint(store, checkpoint, now=None):
+    """Mark the entries of a checkpoint seen and store its validators.
+
+    Args:
+        store: Feed state store.
+        checkpoint (dict): "guids" emitted by fetch_rss, oldest first, and
+                           "feeds", the validators of the feeds they came from.
+        now (float): Epoch seconds; now by default.
+    """
+    now = time.time() if now is None else now
+    guids = checkpoint.get("guids") or []
+
+    def mutate(state):
+        state = apply_fetch(state, now, seen=guids, feeds=checkpoint.get("feeds"))
+        for guid in guids:
+            state["pending"].pop(guid, None)
+        return state
+
+    return store.update(mutate)
@@ -0,0 +1,217 @@
+"""
+Per-stage timing of the Lambda handlers.
+
+A handler wrapped with @instrumented(name) traces one invocation: code inside
+span(name, kind) blocks (or @timed functions) and durations measured
+elsewhere (record) are summed per span, so a loop of downloads shows up as one
+"image_download" span with its count. When the handler returns:
+
+  - the trace is attached to its result under "trace", with the run ID the
+    state machine put under $.run (the Lambda request ID outside a run), so
+    it travels down the pipeline in the event payload;
+  - one line in CloudWatch embedded metric format is printed, with a
+    "<span>_ms" metric per span and "duration_ms", dimensioned by Function
+    and carrying the run ID as a property.
+
+pipeline_breakdown() collects the traces of the earlier stages from the state
+machine event, which notify_post reports for the whole run.
+
+Request and response bodies are only logged for a PAYLOAD_LOG_SAMPLE_RATE
+share of calls (sample_payload), and only serialized when sampled.
+"""
+import functools
+import json
+import os
+import random
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+from run_manifest import get_run_id
+
+logger = logging.getLogger()
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "AnimeUtopia")
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+PAYLOAD_LOG_SAMPLE_RATE = float(os.environ.get("PAYLOAD_LOG_SAMPLE_RATE", "0"))
+# What a span spends its time on.
+SPAN_KINDS = ("network", "io", "subprocess", "wait", "cpu")
+
+_lock = threading.Lock()
+_trace = {"function": None, "run_id": None, "spans": {}}
+
+
+def begin(function_name, run_id):
+    """
+    Start the trace of an invocation, discarding the previous one.
+    """
+    with _lock:
+        _trace.update(function=function_name, run_id=run_id, spans={})
+
+
+def current_run_id():
+    """
+    Return the run ID of the invocation being traced.
+    """
+    return _trace["run_id"]
+
+
+def record(name, ms, kind="cpu"):
+    """
+    Add a duration measured elsewhere to a span of the current trace.
+
+    Args:
+        name (str): Span name.
+        ms (float): Milliseconds.
+        kind (str): One of SPAN_KINDS.
+    """
+    if ms is None:
+        return
+    with _lock:
+        span_entry = _trace["spans"].setdefault(name, {"kind": kind, "count": 0, "ms": 0.0})
+        span_entry["count"] += 1
+        span_entry["ms"] += ms
+
+
+@contextmanager
+def span(name, kind="cpu"):
+    """
+    Time the enclosed block as a span of the current trace.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000, kind)
+
+
+def timed(name, kind="cpu"):
+    """
+    Decorator timing every call of a function as a span.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def breakdown(duration_ms):
+    """
+    Return the current trace: function, run ID, duration and spans.
+    """
+    with _lock:
+        spans = {
+            name: {"kind": s["kind"], "count": s["count"], "ms": round(s["ms"], 1)}
+            for name, s in _trace["spans"].items()
+        }
+        return {
+            "function": _trace["function"],
+            "run_id": _trace["run_id"],
+            "duration_ms": round(duration_ms, 1),
+            "spans": spans,
+        }
+
+
+def emf_record(trace, timestamp_ms=None, error=False):
+    """
+    Format a trace as a CloudWatch embedded metric format document.
+    """
+    metrics = {f"{name}_ms": s["ms"] for name, s in trace["spans"].items()}
+    metrics["duration_ms"] = trace["duration_ms"]
+    document = {
+        "_aws": {
+            "Timestamp": timestamp_ms or int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Function"]],
+                "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in metrics],
+            }],
+        },
+        "Function": trace["function"],
+        "RunId": trace["run_id"],
+        "Error": error,
+    }
+    document.update(metrics)
+    return document
+
+
+def emit(trace, error=False):
+    """
+    Print a trace as an embedded metric format line. It goes to stdout
+    rather than the logger: CloudWatch only extracts metrics from log events
+    that are JSON documents, without the logger's prefix.
+    """
+    if METRICS_ENABLED:
+        print(json.dumps(emf_record(trace, error=error), separators=(",", ":")))
+
+
+def instrumented(function_name):
+    """
+    Decorator tracing a Lambda handler; see the module docstring.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            run_id = get_run_id(event or {}) or getattr(context, "aws_request_id", None)
+            begin(function_name, run_id)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = handler(event, context)
+                return result
+            finally:
+                trace = breakdown((time.perf_counter() - start) * 1000)
+                failed = not isinstance(result, dict) or bool(result.get("error"))
+                emit(trace, error=failed)
+                if isinstance(result, dict):
+                    result["trace"] = trace
+        return wrapper
+    return decorator
+
+
+def sample_payload(label, payload):
+    """
+    Log a request or response body for a PAYLOAD_LOG_SAMPLE_RATE share of
+    calls. Unsampled calls cost no serialization.
+    """
+    if PAYLOAD_LOG_SAMPLE_RATE <= 0 or random.random() >= PAYLOAD_LOG_SAMPLE_RATE:
+        return
+    logger.info("%s (run %s): %s", label, current_run_id(),
+                json.dumps(payload, separators=(",", ":"), default=str))
+
+
+def pipeline_breakdown(event, own=None):
+    """
+    Collect the per-stage timing of a state machine run from its event.
+
+    Args:
+        event (dict): State machine event; every earlier stage's result holds
+                      its trace.
+        own (dict): The calling stage's trace so far, if it is to be included.
+
+    Returns:
+        dict: "run_id", "stages" (function -> duration and span milliseconds)
+              in the order of the event and "total_ms".
+    """
+    traces = [
+        value["trace"] for value in event.values()
+        if isinstance(value, dict) and isinstance(value.get("trace"), dict)
+    ]
+    if own:
+        traces.append(own)
+    stages = {
+        trace["function"]: {
+            "duration_ms": trace["duration_ms"],
+            "spans": {name: s["ms"] for name, s in trace["spans"].items()},
+        }
+        for trace in traces
+    }
+    return {
+        "run_id": get_run_id(event) or next((t["run_id"] for t in traces if t.get("run_id")), None),
+        "stages": stages,
+        "total_ms": round(sum(s["duration_ms"] for s in stages.values()), 1),
+    }
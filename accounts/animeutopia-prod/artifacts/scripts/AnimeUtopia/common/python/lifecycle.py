@@ -0,0 +1,392 @@
+"""
+Warm-pool lifecycle decisions for the render instance.
+
+The render instance is kept running while work keeps arriving and released
+once it has been idle for RENDER_IDLE_TTL seconds, optionally by hibernating
+it so the next start resumes instead of booting. A profile of past post
+arrival times (hour-of-week) can start it ahead of expected arrivals.
+
+decide() and apply_transition() are pure: they take the persisted state and
+a snapshot of the world and return what to do, so simulate() can replay a
+recorded arrival timeline offline to trade latency against cost.
+
+Only queued jobs someone is draining count as work: a message that failed or
+was orphaned in flight stays on the queue until the next workflow's drainer
+takes it, and must not keep the instance up (or start it) meanwhile. The
+state is updated conditionally (see update), so a scheduled check working
+from a stale read cannot release the instance a workflow has just claimed.
+"""
+import json
+import math
+import os
+import logging
+from collections import namedtuple
+
+from botocore.exceptions import ClientError
+
+from drain_lease import current_holder, get_lease_store
+from post_store import conditional_update
+from readiness import instance_state
+from render_queue import queue_depth
+from runtime import get_client
+
+logger = logging.getLogger()
+
+WEEK_SECONDS = 7 * 24 * 3600
+HOUR_SECONDS = 3600
+MAX_ARRIVALS = 2000
+
+STATE_BUCKET = os.environ.get("LIFECYCLE_STATE_BUCKET")
+STATE_KEY = os.environ.get("LIFECYCLE_STATE_KEY", "state/render_lifecycle.json")
+STATE_FILE = os.environ.get("LIFECYCLE_STATE_FILE", "/tmp/render_lifecycle.json")
+
+Policy = namedtuple("Policy", [
+    "idle_ttl",          # seconds an idle running instance is kept warm
+    "hibernate",         # release by hibernating instead of stopping
+    "warmup_lead",       # seconds ahead to look for expected arrivals; 0 disables
+    "warmup_threshold",  # expected arrivals in the lead window that justify warming
+    "hourly_cost",       # instance cost per running hour, for the cost ledger
+])
+
+Decision = namedtuple("Decision", ["action", "reason"])
+
+
+def policy_from_env():
+    """
+    Build the lifecycle policy from the environment.
+
+    Returns:
+        Policy: RENDER_IDLE_TTL, RENDER_HIBERNATE, RENDER_WARMUP_LEAD,
+                RENDER_WARMUP_THRESHOLD and RENDER_HOURLY_COST.
+    """
+    return Policy(
+        idle_ttl=int(os.environ.get("RENDER_IDLE_TTL", "900")),
+        hibernate=os.environ.get("RENDER_HIBERNATE", "false").lower() == "true",
+        warmup_lead=int(os.environ.get("RENDER_WARMUP_LEAD", "0")),
+        warmup_threshold=float(os.environ.get("RENDER_WARMUP_THRESHOLD", "0.5")),
+        hourly_cost=float(os.environ.get("RENDER_HOURLY_COST", "0")),
+    )
+
+
+def learn_arrival_profile(arrivals):
+    """
+    Learn the expected number of post arrivals per hour of the week.
+
+    Args:
+        arrivals (list): Arrival times in epoch seconds.
+
+    Returns:
+        list: 168 expected arrival counts, indexed by hour of the week
+              (Monday 00:00 UTC is 0), or None without history.
+    """
+    if not arrivals:
+        return None
+    counts = [0] * 168
+    for ts in arrivals:
+        counts[_hour_of_week(ts)] += 1
+    weeks = max(1.0, (max(arrivals) - min(arrivals)) / WEEK_SECONDS)
+    return [c / weeks for c in counts]
+
+
+def _hour_of_week(ts):
+    # The epoch began on a Thursday; shift so that Monday is hour 0.
+    return int(((ts + 3 * 24 * 3600) % WEEK_SECONDS) // HOUR_SECONDS)
+
+
+def expected_arrivals(profile, start, end):
+    """
+    Return the expected number of arrivals between start and end.
+    """
+    if not profile or end <= start:
+        return 0.0
+    total = 0.0
+    t = start
+    while t < end:
+        hour_end = (math.floor(t / HOUR_SECONDS) + 1) * HOUR_SECONDS
+        span = min(end, hour_end) - t
+        total += profile[_hour_of_week(t)] * span / HOUR_SECONDS
+        t += span
+    return total
+
+
+def decide(state, snapshot, now, policy, profile=None):
+    """
+    Decide what to do with the render instance.
+
+    Args:
+        state (dict): Persisted lifecycle state (see apply_transition).
+        snapshot (dict): "instance_state" (EC2 state name), "pending_jobs",
+                         "active_jobs" and whether a render_video is
+                         "draining" the queue, at decision time.
+        now (float): Epoch seconds.
+        policy (Policy): Lifecycle policy.
+        profile (list): Arrival profile from learn_arrival_profile, or None.
+
+    Returns:
+        Decision: action ("start", "stop", "hibernate" or "keep") and reason.
+    """
+    instance_state = snapshot.get("instance_state")
+    # Queued jobs nobody drains (failed, or orphaned in flight) wait for the
+    # next workflow's drainer rather than keeping the instance busy.
+    busy = bool(snapshot.get("draining"))
+    expected = 0.0
+    if policy.warmup_lead > 0:
+        expected = expected_arrivals(profile, now, now + policy.warmup_lead)
+    arrival_expected = policy.warmup_lead > 0 and expected >= policy.warmup_threshold
+
+    if instance_state == "running":
+        if busy:
+            return Decision("keep", "queue being drained")
+        idle = now - state.get("last_activity", now)
+        if idle < policy.idle_ttl:
+            return Decision("keep", f"idle {idle:.0f}s of {policy.idle_ttl}s")
+        if arrival_expected:
+            return Decision("keep", f"{expected:.2f} arrivals expected")
+        return Decision("hibernate" if policy.hibernate else "stop", f"idle {idle:.0f}s")
+
+    if instance_state == "stopped":
+        if busy:
+            return Decision("start", "queue being drained")
+        if arrival_expected:
+            return Decision("start", f"warm-up: {expected:.2f} arrivals expected")
+        return Decision("keep", "idle")
+
+    return Decision("keep", f"instance {instance_state}")
+
+
+def apply_transition(state, action, now, policy):
+    """
+    Return the lifecycle state after an action, updating the cost ledger.
+
+    The state holds "running_since", "last_activity", "arrivals" and
+    "ledger" (running_seconds, boots, resumes, releases, cost).
+    """
+    state = dict(state)
+    ledger = dict(state.get("ledger") or {})
+    for field in ("running_seconds", "boots", "resumes", "releases", "cost"):
+        ledger.setdefault(field, 0)
+    if action == "start":
+        if state.get("running_since") is None:
+            ledger["resumes" if state.get("hibernated") else "boots"] += 1
+            state["running_since"] = now
+        state["hibernated"] = False
+    elif action in ("stop", "hibernate"):
+        if state.get("running_since") is not None:
+            ran = max(0.0, now - state["running_since"])
+            ledger["running_seconds"] += ran
+            ledger["cost"] = round(ledger["cost"] + ran / HOUR_SECONDS * policy.hourly_cost, 4)
+            state["running_since"] = None
+        ledger["releases"] += 1
+        state["hibernated"] = action == "hibernate"
+    state["ledger"] = ledger
+    return state
+
+
+def record_activity(state, now, arrival=False):
+    """
+    Return the state with now recorded as the latest activity, and as a post
+    arrival when arrival is True.
+    """
+    state = dict(state)
+    state["last_activity"] = now
+    if arrival:
+        state["arrivals"] = (list(state.get("arrivals") or []) + [now])[-MAX_ARRIVALS:]
+    return state
+
+
+class LocalFileLifecycleStore:
+    """Lifecycle state persisted as a JSON file on local disk."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save(self, state):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def update(self, mutate):
+        state = mutate(self.load())
+        if state is not None:
+            self.save(state)
+        return state
+
+
+class S3LifecycleStore:
+    """Lifecycle state persisted as a single JSON object in S3."""
+
+    def __init__(self, bucket, key, client=None):
+        self.bucket = bucket
+        self.key = key
+        self.client = client or get_client("s3")
+
+    def load(self):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return {}
+            raise
+        return json.loads(response["Body"].read())
+
+    def save(self, state):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=json.dumps(state, separators=(",", ":")),
+            ContentType="application/json"
+        )
+
+    def update(self, mutate):
+        return conditional_update(self.client, self.bucket, self.key, mutate)
+
+
+def get_lifecycle_store():
+    """
+    Return the lifecycle state store configured through the environment.
+
+    Returns:
+        S3LifecycleStore or LocalFileLifecycleStore: S3 when
+        LIFECYCLE_STATE_BUCKET is set, otherwise a local file.
+    """
+    if STATE_BUCKET:
+        return S3LifecycleStore(STATE_BUCKET, STATE_KEY)
+    return LocalFileLifecycleStore(STATE_FILE)
+
+
+def take_snapshot(ec2_client, sqs_client, instance_id, queue_url=None):
+    """
+    Observe the instance state and, when a render queue is configured, the
+    number of pending and in-flight render jobs and whether a render_video
+    holds the drain lease (see drain_lease).
+    """
+    snapshot = {
+        "instance_state": instance_state(ec2_client, instance_id),
+        "pending_jobs": 0,
+        "active_jobs": 0,
+        "draining": False,
+    }
+    if queue_url:
+        snapshot["pending_jobs"], snapshot["active_jobs"] = queue_depth(sqs_client, queue_url)
+        snapshot["draining"] = current_holder(get_lease_store()) is not None
+    return snapshot
+
+
+def release_instance(ec2_client, instance_ids, hibernate):
+    """
+    Stop the render instances, hibernating them when requested and supported.
+
+    Returns:
+        tuple: (action taken, stop_instances response). Falls back to a plain
+               stop if an instance was not launched with hibernation enabled.
+    """
+    if hibernate:
+        try:
+            return "hibernate", ec2_client.stop_instances(InstanceIds=list(instance_ids), Hibernate=True)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "UnsupportedHibernationConfiguration":
+                raise
+            logger.warning("Instances %s do not support hibernation; stopping them instead.", instance_ids)
+    return "stop", ec2_client.stop_instances(InstanceIds=list(instance_ids))
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def simulate(arrivals, policy, history=None, tick=300, boot_seconds=240,
+             resume_seconds=60, render_seconds=180):
+    """
+    Replay an arrival timeline against a policy.
+
+    Posts render one at a time. A post that arrives while the instance is
+    released waits for it to boot (or resume, after hibernation). The policy
+    is consulted on a fixed tick, as the scheduled lifecycle check does, and
+    after each render, as the workflow's StopEC2 step does.
+
+    Args:
+        arrivals (list): Post arrival times in epoch seconds.
+        policy (Policy): Policy to evaluate.
+        history (list): Earlier arrivals to learn the warm-up profile from.
+        tick (int): Seconds between scheduled lifecycle checks.
+        boot_seconds (int): Cold start until the instance can render.
+        resume_seconds (int): Resume from hibernation until it can render.
+        render_seconds (int): Render time per post.
+
+    Returns:
+        dict: Wait before render start (mean/p50/p95/max), running hours,
+              cost, boots, resumes and the number of posts.
+    """
+    arrivals = sorted(arrivals)
+    if not arrivals:
+        return {"posts": 0}
+    profile = learn_arrival_profile(history) if history else None
+    state = {"last_activity": arrivals[0]}
+    ready_at = None          # when a started instance can render
+    free_at = 0.0            # when the instance finishes its current render
+    waits = []
+
+    def release_or_keep(now, pending):
+        nonlocal state, ready_at
+        snapshot = {
+            "instance_state": "running" if ready_at is not None else "stopped",
+            "pending_jobs": pending, "active_jobs": 1 if free_at > now else 0,
+            "draining": free_at > now,
+        }
+        decision = decide(state, snapshot, now, policy, profile)
+        if decision.action in ("stop", "hibernate"):
+            state = apply_transition(state, decision.action, now, policy)
+            ready_at = None
+        elif decision.action == "start":
+            start(now)
+
+    def start(now):
+        nonlocal state, ready_at
+        hibernated = state.get("hibernated")
+        state = apply_transition(state, "start", now, policy)
+        ready_at = now + (resume_seconds if hibernated else boot_seconds)
+
+    next_tick = math.floor(arrivals[0] / tick) * tick + tick
+    for arrival in arrivals:
+        while next_tick < arrival:
+            release_or_keep(next_tick, 0)
+            next_tick += tick
+        if ready_at is None:
+            start(arrival)
+        begin = max(arrival, ready_at, free_at)
+        waits.append(begin - arrival)
+        free_at = begin + render_seconds
+        state = record_activity(state, free_at, arrival=False)
+        release_or_keep(free_at, 0)
+        while next_tick < free_at:
+            next_tick += tick
+    end = free_at + max(policy.idle_ttl, tick) + tick
+    while next_tick <= end and ready_at is not None:
+        release_or_keep(next_tick, 0)
+        next_tick += tick
+    if ready_at is not None:
+        state = apply_transition(state, "stop", next_tick, policy)
+
+    ledger = state["ledger"]
+    return {
+        "posts": len(arrivals),
+        "mean_wait_s": round(sum(waits) / len(waits), 1),
+        "p50_wait_s": round(_percentile(waits, 0.5), 1),
+        "p95_wait_s": round(_percentile(waits, 0.95), 1),
+        "max_wait_s": round(max(waits), 1),
+        "running_hours": round(ledger["running_seconds"] / HOUR_SECONDS, 2),
+        "cost": round(ledger["cost"], 2),
+        "boots": ledger["boots"],
+        "resumes": ledger["resumes"],
+    }
@@ -0,0 +1,122 @@
+"""
+Output preset matrix: the platform variants derived from one rendered master.
+
+aerender renders the comp once (the master, anime_post.mp4); every variant a
+post asks for - 9:16 for Reels/Shorts/TikTok, 1:1 for the feed, 16:9 for
+YouTube - is then transcoded from the master with ffmpeg on the render host
+instead of being rendered again. A variant either fills its frame by cropping
+the master ("crop") or fits the whole master inside it over a blurred,
+cropped copy of itself ("pad"), which keeps the square template's text
+intact in the tall and wide formats.
+
+A post selects variants by name under "outputs" (or RENDER_OUTPUTS applies);
+an entry may also be a dict overriding a preset's fields or defining a new
+one, e.g. {"name": "story", "width": 720, "height": 1280, "fit": "pad"}.
+"""
+import logging
+import os
+
+logger = logging.getLogger()
+
+PRESETS = {
+    "reels_9x16": {"width": 1080, "height": 1920, "fit": "pad", "crf": 21},
+    "feed_1x1": {"width": 1080, "height": 1080, "fit": "crop", "crf": 20},
+    "feed_4x5": {"width": 1080, "height": 1350, "fit": "pad", "crf": 21},
+    "youtube_16x9": {"width": 1920, "height": 1080, "fit": "pad", "crf": 20},
+}
+FITS = ("crop", "pad")
+
+RENDER_OUTPUTS = os.environ.get("RENDER_OUTPUTS", "")
+# x264 speed/size trade-off for the variants and the blur of pad backgrounds.
+VARIANT_X264_PRESET = os.environ.get("VARIANT_X264_PRESET", "veryfast")
+PAD_BLUR = 20
+
+
+def resolve_outputs(requested=None):
+    """
+    Resolve a post's output selection into complete presets.
+
+    Args:
+        requested (list or str): Preset names and/or preset dicts, or a
+                                 comma-separated string of names; RENDER_OUTPUTS
+                                 when None.
+
+    Returns:
+        list: Presets with "name", "width", "height", "fit", "crf" and the
+              output "file", in request order; unknown or invalid entries are
+              logged and skipped, duplicates dropped.
+    """
+    if requested is None:
+        requested = RENDER_OUTPUTS
+    if isinstance(requested, str):
+        requested = [name.strip() for name in requested.split(",") if name.strip()]
+
+    presets, seen = [], set()
+    for entry in requested:
+        if isinstance(entry, str):
+            entry = {"name": entry}
+        name = str(entry.get("name") or "")
+        preset = dict(PRESETS.get(name, {}), **entry)
+        try:
+            width, height = int(preset["width"]), int(preset["height"])
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Skipping unknown or incomplete output preset %r.", entry)
+            continue
+        # libx264 with 4:2:0 chroma needs even dimensions.
+        if not name or name in seen or width <= 0 or height <= 0 or width % 2 or height % 2 \
+                or preset.get("fit", "pad") not in FITS:
+            logger.warning("Skipping invalid output preset %r.", entry)
+            continue
+        seen.add(name)
+        presets.append({
+            "name": name,
+            "width": width,
+            "height": height,
+            "fit": preset.get("fit", "pad"),
+            "crf": int(preset.get("crf", 21)),
+            "file": f"anime_post_{name}.mp4",
+        })
+    return presets
+
+
+def variant_filter(preset):
+    """
+    Return the ffmpeg filter graph deriving a variant from the master.
+
+    The graph's output is labelled [v].
+    """
+    w, h = preset["width"], preset["height"]
+    cover = f"scale={w}:{h}:force_original_aspect_ratio=increase,crop={w}:{h}"
+    if preset["fit"] == "crop":
+        return f"[0:v]{cover},setsar=1[v]"
+    return (
+        f"[0:v]split[bg][fg];"
+        f"[bg]{cover},boxblur={PAD_BLUR}[blur];"
+        f"[fg]scale={w}:{h}:force_original_aspect_ratio=decrease[fit];"
+        f"[blur][fit]overlay=(W-w)/2:(H-h)/2,setsar=1[v]"
+    )
+
+
+def ffmpeg_args(preset, source, output):
+    """
+    Return the ffmpeg arguments transcoding the master into a variant.
+
+    The audio of the master, if any, is copied as is.
+
+    Args:
+        preset (dict): Preset as returned by resolve_outputs.
+        source (str): Path of the master.
+        output (str): Path of the variant.
+
+    Returns:
+        list: Arguments, without the ffmpeg executable.
+    """
+    return [
+        "-y", "-hide_banner", "-loglevel", "error",
+        "-i", source,
+        "-filter_complex", variant_filter(preset),
+        "-map", "[v]", "-map", "0:a?",
+        "-c:v", "libx264", "-preset", VARIANT_X264_PRESET, "-crf", str(preset["crf"]),
+        "-pix_fmt", "yuv420p", "-c:a", "copy", "-movflags", "+faststart",
+        output,
+    ]
@@ -0,0 +1,302 @@
+"""
+Versioned, sharded store of processed posts.
+
+Every stored post is its own object, never overwritten by another run:
+
+    <POST_STORE_PREFIX>dt=<YYYY-MM-DD>/run=<run_id>/<post_id>.json[.gz]
+
+written compactly and, with POST_STORE_COMPRESS=gzip, gzip-compressed (the
+render job runner decompresses it when staging). Lookups do not list the
+bucket; they read small append-only index objects instead:
+
+    index/dt=<YYYY-MM-DD>.json   entries stored that day, oldest first
+    index/title=<xx>.json        entries by normalized title, sharded on
+                                 the first byte of the title's SHA-1
+    latest.json                  pointer to the newest post
+
+The index objects and the pointer are updated read-modify-write with
+conditional writes (If-Match on the ETag read, If-None-Match for the first
+write), retried when another execution got there first, so concurrent runs
+neither lose entries nor move the pointer backwards.
+"""
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+POST_STORE_PREFIX = os.environ.get("POST_STORE_PREFIX", "posts/")
+POST_STORE_COMPRESS = os.environ.get("POST_STORE_COMPRESS", "")
+POST_STORE_VERSION = 1
+LATEST_NAME = "latest.json"
+# Entries kept per title in the title shards.
+TITLE_HISTORY = 20
+CONDITIONAL_ATTEMPTS = 10
+PUT_WORKERS = 8
+CONFLICT_CODES = ("PreconditionFailed", "ConditionalRequestConflict", "412", "409")
+MISSING_CODES = ("NoSuchKey", "404", "NotFound")
+
+
+def _error_code(error):
+    return error.response.get("Error", {}).get("Code")
+
+
+def normalize_title(title):
+    """
+    Normalize a title for the by-title index.
+    """
+    return re.sub(r"[\W_]+", " ", (title or "").casefold()).strip()
+
+
+def _title_shard(title):
+    return hashlib.sha1(normalize_title(title).encode("utf-8")).hexdigest()[:2]
+
+
+def _date(stored_at):
+    return datetime.fromtimestamp(stored_at, timezone.utc).strftime("%Y-%m-%d")
+
+
+def post_key(post_id, run_id, stored_at, compress=POST_STORE_COMPRESS):
+    """
+    Return the key a post is stored under.
+    """
+    suffix = ".json.gz" if compress == "gzip" else ".json"
+    return f"{POST_STORE_PREFIX}dt={_date(stored_at)}/run={run_id or 'adhoc'}/{post_id}{suffix}"
+
+
+def day_index_key(date):
+    return f"{POST_STORE_PREFIX}index/dt={date}.json"
+
+
+def title_index_key(title):
+    return f"{POST_STORE_PREFIX}index/title={_title_shard(title)}.json"
+
+
+def latest_key():
+    return POST_STORE_PREFIX + LATEST_NAME
+
+
+def encode_post(post, compress=POST_STORE_COMPRESS):
+    """
+    Serialize a post compactly.
+
+    Returns:
+        tuple: The body and the extra put_object arguments describing it.
+    """
+    body = json.dumps(post, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    extra = {"ContentType": "application/json", "Metadata": {"schema": str(POST_STORE_VERSION)}}
+    if compress == "gzip":
+        body = gzip.compress(body)
+        extra["ContentEncoding"] = "gzip"
+    return body, extra
+
+
+def decode_post(body, key):
+    """
+    Deserialize a stored post, decompressing it if its key says so.
+    """
+    if key.endswith(".gz"):
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+def _read_json(s3_client, bucket, key):
+    """
+    Return (document, ETag) of a JSON object, or (None, None) if it is absent.
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if _error_code(e) in MISSING_CODES:
+            return None, None
+        raise
+    return json.loads(response["Body"].read()), response["ETag"]
+
+
+def conditional_update(s3_client, bucket, key, mutate, attempts=CONDITIONAL_ATTEMPTS):
+    """
+    Update a JSON object read-modify-write, writing only if nobody else
+    changed it since it was read, and retrying from the read otherwise.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket (str): Bucket name.
+        key (str): Object key.
+        mutate (callable): Takes the current document (None if the object
+                           does not exist) and returns the new one, or None
+                           to leave the object as it is.
+        attempts (int): Attempts before giving up.
+
+    Returns:
+        dict or None: The document written, or None if mutate declined.
+
+    Raises:
+        RuntimeError: If every attempt lost the race.
+    """
+    for attempt in range(attempts):
+        current, etag = _read_json(s3_client, bucket, key)
+        document = mutate(current)
+        if document is None:
+            return None
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            s3_client.put_object(
+                Bucket=bucket, Key=key, ContentType="application/json",
+                Body=json.dumps(document, separators=(",", ":")), **condition
+            )
+            return document
+        except ClientError as e:
+            if _error_code(e) not in CONFLICT_CODES:
+                raise
+            logger.info("Conditional write of %s lost a race (attempt %d).", key, attempt + 1)
+            # Full jitter, so racing writers do not collide again in step.
+            time.sleep(random.uniform(0, min(0.05 * 2 ** attempt, 1.0)))
+    raise RuntimeError(f"Could not update {key} after {attempts} attempts.")
+
+
+def _append(entries):
+    def mutate(document):
+        document = document or {"version": POST_STORE_VERSION, "entries": []}
+        known = {e["key"] for e in document["entries"]}
+        new = [e for e in entries if e["key"] not in known]
+        if not new:
+            return None
+        document["entries"].extend(new)
+        return document
+    return mutate
+
+
+def _append_titles(entries):
+    def mutate(document):
+        document = document or {"version": POST_STORE_VERSION, "titles": {}}
+        changed = False
+        for entry in entries:
+            history = document["titles"].setdefault(entry["title_key"], [])
+            if any(e["key"] == entry["key"] for e in history):
+                continue
+            history.append(entry)
+            del history[:-TITLE_HISTORY]
+            changed = True
+        return document if changed else None
+    return mutate
+
+
+def _advance_latest(entry):
+    def mutate(document):
+        if document and (document.get("stored_at", 0), document.get("key", "")) >= (
+            entry["stored_at"], entry["key"]
+        ):
+            return None
+        return dict(entry, version=POST_STORE_VERSION)
+    return mutate
+
+
+def store_posts(s3_client, bucket, posts, run_id, stored_at=None):
+    """
+    Store posts and record them in the indexes and the latest pointer.
+
+    The post objects are written concurrently; each index shard and the
+    pointer then take one conditional update for the whole batch.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket (str): Bucket name.
+        posts (list): (post_id, post) pairs, in feed order (newest first).
+        run_id (str): Run ID, or None outside the state machine.
+        stored_at (float): Epoch seconds; now by default.
+
+    Returns:
+        list: The index entries, in the order of posts: "key", "post_id",
+              "run_id", "title", "title_key", "stored_at" and "bytes".
+    """
+    stored_at = time.time() if stored_at is None else stored_at
+
+    def put(item):
+        post_id, post = item
+        key = post_key(post_id, run_id, stored_at)
+        body, extra = encode_post(post)
+        s3_client.put_object(Bucket=bucket, Key=key, Body=body, **extra)
+        return {
+            "key": key,
+            "post_id": post_id,
+            "run_id": run_id,
+            "title": post.get("title"),
+            "title_key": normalize_title(post.get("title")),
+            "stored_at": round(stored_at, 3),
+            "bytes": len(body),
+        }
+
+    if not posts:
+        return []
+    with ThreadPoolExecutor(max_workers=min(PUT_WORKERS, len(posts))) as pool:
+        entries = list(pool.map(put, posts))
+
+    conditional_update(s3_client, bucket, day_index_key(_date(stored_at)), _append(entries))
+    shards = defaultdict(list)
+    for entry in entries:
+        shards[title_index_key(entry["title"])].append(entry)
+    for key, shard_entries in shards.items():
+        conditional_update(s3_client, bucket, key, _append_titles(shard_entries))
+    # The feed lists the newest post first; it is what the pointer points to.
+    conditional_update(s3_client, bucket, latest_key(), _advance_latest(entries[0]))
+    return entries
+
+
+def load_post(s3_client, bucket, key):
+    """
+    Read a stored post.
+    """
+    return decode_post(s3_client.get_object(Bucket=bucket, Key=key)["Body"].read(), key)
+
+
+def latest_pointer(s3_client, bucket):
+    """
+    Return the latest pointer (the index entry of the newest post), or None.
+    """
+    return _read_json(s3_client, bucket, latest_key())[0]
+
+
+def latest_posts(s3_client, bucket, n=10, days=7, now=None):
+    """
+    Return the index entries of the newest posts, newest first, reading the
+    day shards backwards from today.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket (str): Bucket name.
+        n (int): Number of entries.
+        days (int): Day shards to look back through at most.
+        now (float): Epoch seconds; now by default.
+
+    Returns:
+        list: Up to n index entries.
+    """
+    today = datetime.fromtimestamp(time.time() if now is None else now, timezone.utc)
+    entries = []
+    for back in range(days):
+        date = (today - timedelta(days=back)).strftime("%Y-%m-%d")
+        document = _read_json(s3_client, bucket, day_index_key(date))[0]
+        if document:
+            entries.extend(sorted(document["entries"], key=lambda e: e["stored_at"], reverse=True))
+        if len(entries) >= n:
+            break
+    return entries[:n]
+
+
+def posts_by_title(s3_client, bucket, title):
+    """
+    Return the index entries of the posts stored under a title, newest first.
+    """
+    document = _read_json(s3_client, bucket, title_index_key(title))[0] or {}
+    entries = (document.get("titles") or {}).get(normalize_title(title), [])
+    return sorted(entries, key=lambda e: e["stored_at"], reverse=True)
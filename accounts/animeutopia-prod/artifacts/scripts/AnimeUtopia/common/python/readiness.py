@@ -0,0 +1,221 @@
+"""
+Render instance readiness checks shared by the render handlers.
+
+Replaces fixed 10-second polling with exponential backoff plus jitter, and
+queries SSM for the one instance of interest instead of listing every managed
+instance in the account. Every wait reports how long it took, and a wait run
+in a background thread can be ended early through a threading.Event.
+"""
+import random
+import time
+import logging
+
+logger = logging.getLogger()
+
+TERMINAL_STATES = ("shutting-down", "terminated")
+
+
+class InstanceNotReady(Exception):
+    """Raised when an instance can no longer become ready."""
+
+
+def backoff_delays(base_delay=1.0, max_delay=8.0, rng=random):
+    """
+    Yield exponentially growing delays with equal jitter.
+
+    Each delay is drawn uniformly from [d/2, d] where d doubles from base_delay
+    up to max_delay, so concurrent waiters spread out without ever retrying in
+    a tight loop.
+
+    Args:
+        base_delay (float): First nominal delay in seconds.
+        max_delay (float): Cap on the nominal delay.
+        rng (random.Random): Source of jitter.
+
+    Yields:
+        float: Seconds to sleep before the next check.
+    """
+    attempt = 0
+    while True:
+        delay = min(max_delay, base_delay * (2 ** attempt))
+        yield rng.uniform(delay / 2, delay)
+        attempt += 1
+
+
+def wait_until(check, timeout, base_delay=1.0, max_delay=8.0,
+               sleep=time.sleep, clock=time.monotonic, label="condition", stop=None):
+    """
+    Call check until it returns a truthy value or the timeout elapses.
+
+    Args:
+        check (callable): Zero-argument callable; a truthy result ends the wait.
+        timeout (float): Maximum seconds to wait.
+        base_delay (float): First backoff delay in seconds.
+        max_delay (float): Cap on the backoff delay.
+        sleep (callable): Sleep function, replaceable for simulations.
+        clock (callable): Monotonic clock, replaceable for simulations.
+        label (str): Name used in log messages.
+        stop (threading.Event): Ends the wait, as a timeout, once set; the
+            backoff sleeps wait on it instead of calling sleep.
+
+    Returns:
+        tuple: The last check result (None on timeout), seconds waited and the
+               number of checks made.
+    """
+    start = clock()
+    attempts = 0
+    for delay in backoff_delays(base_delay, max_delay):
+        if stop is not None and stop.is_set():
+            waited = clock() - start
+            logger.info("%s wait stopped after %.1fs (%d checks).", label, waited, attempts)
+            return None, waited, attempts
+        attempts += 1
+        result = check()
+        waited = clock() - start
+        if result:
+            logger.info("%s ready after %.1fs (%d checks).", label, waited, attempts)
+            return result, waited, attempts
+        remaining = timeout - waited
+        if remaining <= 0:
+            logger.warning("%s not ready after %.1fs (%d checks).", label, waited, attempts)
+            return None, waited, attempts
+        if stop is not None:
+            stop.wait(min(delay, remaining))
+        else:
+            sleep(min(delay, remaining))
+
+
+def instance_state(ec2_client, instance_id):
+    """
+    Return the EC2 state name of an instance.
+    """
+    response = ec2_client.describe_instances(InstanceIds=[instance_id])
+    return response["Reservations"][0]["Instances"][0]["State"]["Name"]
+
+
+def ssm_ping_status(ssm_client, instance_id):
+    """
+    Return the SSM agent ping status of a single instance, or None if it has
+    not registered. The lookup is filtered server-side to that instance.
+    """
+    response = ssm_client.describe_instance_information(
+        Filters=[{"Key": "InstanceIds", "Values": [instance_id]}]
+    )
+    for info in response.get("InstanceInformationList", []):
+        if info.get("InstanceId") == instance_id:
+            return info.get("PingStatus")
+    return None
+
+
+def ssm_ping_statuses(ssm_client, instance_ids):
+    """
+    Return the SSM agent ping status of several instances in one lookup.
+
+    Returns:
+        dict: instance ID -> ping status, or None if it has not registered.
+    """
+    statuses = dict.fromkeys(instance_ids)
+    kwargs = {"Filters": [{"Key": "InstanceIds", "Values": list(instance_ids)}]}
+    while True:
+        response = ssm_client.describe_instance_information(**kwargs)
+        for info in response.get("InstanceInformationList", []):
+            if info.get("InstanceId") in statuses:
+                statuses[info["InstanceId"]] = info.get("PingStatus")
+        if not response.get("NextToken"):
+            return statuses
+        kwargs["NextToken"] = response["NextToken"]
+
+
+def wait_for_instance_running(ec2_client, instance_id, timeout=300, **kwargs):
+    """
+    Wait until an EC2 instance reaches the "running" state.
+
+    Args:
+        ec2_client: A boto3 EC2 client.
+        instance_id (str): The EC2 instance ID.
+        timeout (float): Maximum seconds to wait.
+        **kwargs: Backoff options forwarded to wait_until.
+
+    Returns:
+        tuple: True if running (False on timeout) and the seconds waited.
+
+    Raises:
+        InstanceNotReady: If the instance is shutting down or terminated.
+    """
+    def check():
+        state = instance_state(ec2_client, instance_id)
+        if state in TERMINAL_STATES:
+            raise InstanceNotReady(f"Instance {instance_id} is {state}.")
+        if state != "running":
+            logger.info("Instance %s state is '%s'.", instance_id, state)
+        return state == "running"
+
+    result, waited, _ = wait_until(check, timeout, label=f"Instance {instance_id}", **kwargs)
+    return bool(result), waited
+
+
+def wait_for_ssm_online(ssm_client, instance_id, timeout=300, **kwargs):
+    """
+    Wait until the SSM agent on an instance reports PingStatus "Online".
+
+    Args:
+        ssm_client: A boto3 SSM client.
+        instance_id (str): The EC2 instance ID.
+        timeout (float): Maximum seconds to wait.
+        **kwargs: Backoff options forwarded to wait_until.
+
+    Returns:
+        tuple: True if online (False on timeout) and the seconds waited.
+    """
+    def check():
+        return ssm_ping_status(ssm_client, instance_id) == "Online"
+
+    result, waited, _ = wait_until(check, timeout, label=f"SSM agent on {instance_id}", **kwargs)
+    return bool(result), waited
+
+
+def wait_until_ready(ec2_client, ssm_client, instance_id, timeout=300, stop=None, **kwargs):
+    """
+    Wait until an instance is running and reachable through SSM.
+
+    Args:
+        ec2_client: A boto3 EC2 client.
+        ssm_client: A boto3 SSM client.
+        instance_id (str): The EC2 instance ID.
+        timeout (float): Maximum seconds to wait for each phase.
+        stop (threading.Event): Ends the wait early once set.
+        **kwargs: Backoff options forwarded to wait_until.
+
+    Returns:
+        dict: "ready", "instance_wait_s", "ssm_wait_s" and, when not ready,
+              "error" with a description of the failed phase.
+    """
+    report = {"ready": False, "instance_wait_s": 0.0, "ssm_wait_s": 0.0}
+    try:
+        running, report["instance_wait_s"] = wait_for_instance_running(
+            ec2_client, instance_id, timeout, stop=stop, **kwargs
+        )
+    except InstanceNotReady as e:
+        report["error"] = str(e)
+        return report
+    if not running:
+        if stop is not None and stop.is_set():
+            report["error"] = f"Stopped waiting for instance {instance_id} to be 'running'."
+        else:
+            report["error"] = f"Instance {instance_id} not 'running' after {timeout}s."
+        return report
+
+    online, report["ssm_wait_s"] = wait_for_ssm_online(
+        ssm_client, instance_id, timeout, stop=stop, **kwargs
+    )
+    if not online:
+        if stop is not None and stop.is_set():
+            report["error"] = f"Stopped waiting for instance {instance_id} to register with SSM."
+        else:
+            report["error"] = f"Instance {instance_id} not registered with SSM after {timeout}s."
+        return report
+
+    report["ready"] = True
+    report["instance_wait_s"] = round(report["instance_wait_s"], 2)
+    report["ssm_wait_s"] = round(report["ssm_wait_s"], 2)
+    return report
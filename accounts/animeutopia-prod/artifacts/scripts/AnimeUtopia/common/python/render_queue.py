@@ -0,0 +1,105 @@
+"""
+Queue of posts waiting to be rendered.
+
+store_data enqueues one job per stored post; render_video drains the queue
+while the render instance is up, so one boot serves every pending post. A job
+is deleted only after its render succeeded; failed jobs reappear after the
+queue's visibility timeout and go to the dead-letter queue after repeated
+failures.
+"""
+import json
+import os
+import logging
+
+logger = logging.getLogger()
+
+RENDER_QUEUE_URL = os.environ.get("RENDER_QUEUE_URL")
+SEND_BATCH_SIZE = 10
+
+
+def enqueue_jobs(sqs_client, queue_url, jobs):
+    """
+    Add render jobs to the queue.
+
+    Args:
+        sqs_client: A boto3 SQS client.
+        queue_url (str): Queue URL.
+        jobs (list): Job dicts with "run_id", "post_id", "post_key" and
+                     "image_key".
+
+    Returns:
+        int: Number of jobs enqueued.
+
+    Raises:
+        RuntimeError: If SQS rejected any of the messages.
+    """
+    sent = 0
+    for start in range(0, len(jobs), SEND_BATCH_SIZE):
+        batch = jobs[start:start + SEND_BATCH_SIZE]
+        response = sqs_client.send_message_batch(
+            QueueUrl=queue_url,
+            Entries=[
+                {"Id": str(i), "MessageBody": json.dumps(job)}
+                for i, job in enumerate(batch)
+            ]
+        )
+        failed = response.get("Failed", [])
+        if failed:
+            raise RuntimeError(f"Failed to enqueue {len(failed)} render jobs: {failed}")
+        sent += len(batch)
+    return sent
+
+
+def receive_job(sqs_client, queue_url, wait_seconds):
+    """
+    Take the next render job from the queue, long-polling up to wait_seconds.
+
+    Returns:
+        tuple or None: (receipt handle, job dict), or None if the queue stayed
+                       empty.
+    """
+    response = sqs_client.receive_message(
+        QueueUrl=queue_url,
+        MaxNumberOfMessages=1,
+        WaitTimeSeconds=max(0, min(20, int(wait_seconds))),
+        AttributeNames=["ApproximateReceiveCount", "SentTimestamp"]
+    )
+    messages = response.get("Messages", [])
+    if not messages:
+        return None
+    message = messages[0]
+    job = json.loads(message["Body"])
+    job["sent_at_ms"] = int(message.get("Attributes", {}).get("SentTimestamp", 0))
+    job["receive_count"] = int(message.get("Attributes", {}).get("ApproximateReceiveCount", 1))
+    return message["ReceiptHandle"], job
+
+
+def complete_job(sqs_client, queue_url, receipt_handle):
+    """
+    Remove a successfully rendered job from the queue.
+    """
+    sqs_client.delete_message(QueueUrl=queue_url, ReceiptHandle=receipt_handle)
+
+
+def queue_depth(sqs_client, queue_url):
+    """
+    Return the approximate number of (pending, in-flight) render jobs.
+    """
+    attributes = sqs_client.get_queue_attributes(
+        QueueUrl=queue_url,
+        AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"]
+    )["Attributes"]
+    return (
+        int(attributes.get("ApproximateNumberOfMessages", 0)),
+        int(attributes.get("ApproximateNumberOfMessagesNotVisible", 0)),
+    )
+
+
+def extend_job(sqs_client, queue_url, receipt_handle, seconds):
+    """
+    Keep a job hidden from other consumers for another `seconds`, e.g. while
+    it is retried on another render instance.
+    """
+    sqs_client.change_message_visibility(
+        QueueUrl=queue_url, ReceiptHandle=receipt_handle, VisibilityTimeout=int(seconds)
+    )
@@ -0,0 +1,286 @@
+"""
+Placement of render jobs on a pool of render instances.
+
+RenderScheduler tracks every instance's running jobs against its concurrency
+limit and its health (SSM ping status plus consecutive node failures), and
+places each job on a healthy instance with a free slot:
+
+  - "least_loaded" picks the instance with the lowest share of its slots in
+    use, spreading jobs out for the lowest latency;
+  - "bin_pack" picks the busiest instance that still has a free slot, so
+    work concentrates on few instances and the rest can be released.
+
+A job whose instance failed (the command could not be delivered, timed out,
+or the runner never reported) is retried on an instance it has not run on.
+The scheduler does no I/O, so simulate_cluster() can drive it against a
+simulated cluster to benchmark placement policies locally.
+"""
+import heapq
+import logging
+import os
+import random
+
+logger = logging.getLogger()
+
+PLACEMENTS = ("least_loaded", "bin_pack")
+
+
+def render_pool(instance_id):
+    """
+    Return the instances of the render pool: RENDER_INSTANCE_IDS
+    (comma-separated) if set, otherwise instance_id alone.
+    """
+    ids = [i.strip() for i in os.environ.get("RENDER_INSTANCE_IDS", "").split(",") if i.strip()]
+    return ids or [instance_id]
+
+
+class RenderNode:
+    """One render instance as seen by the scheduler."""
+
+    def __init__(self, instance_id, capacity=1):
+        self.instance_id = instance_id
+        self.capacity = capacity
+        self.running = set()
+        self.ping_status = "Online"
+        self.failures = 0
+        self.completed = 0
+
+    @property
+    def load(self):
+        return len(self.running) / self.capacity
+
+    @property
+    def free_slots(self):
+        return self.capacity - len(self.running)
+
+
+class RenderScheduler:
+    """
+    Assign render jobs to the instances of a pool.
+
+    Args:
+        instance_ids (list): Instances in the pool.
+        capacity (int): Concurrent render jobs per instance.
+        placement (str): "least_loaded" or "bin_pack".
+        max_attempts (int): Attempts per job before it is given up on.
+        failure_threshold (int): Consecutive node failures after which an
+                                 instance gets no more jobs.
+    """
+
+    def __init__(self, instance_ids, capacity=1, placement="least_loaded",
+                 max_attempts=2, failure_threshold=2):
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Unknown placement {placement!r}; expected one of {PLACEMENTS}.")
+        self.nodes = {i: RenderNode(i, capacity) for i in instance_ids}
+        self.placement = placement
+        self.max_attempts = max_attempts
+        self.failure_threshold = failure_threshold
+        self.tried = {}
+
+    def set_ping_status(self, instance_id, ping_status):
+        """
+        Record an instance's SSM ping status; only "Online" instances get jobs.
+        """
+        node = self.nodes[instance_id]
+        if node.ping_status != ping_status:
+            logger.info("Render instance %s is now %s.", instance_id, ping_status)
+        node.ping_status = ping_status
+
+    def is_healthy(self, instance_id):
+        node = self.nodes[instance_id]
+        return node.ping_status == "Online" and node.failures < self.failure_threshold
+
+    def healthy_ids(self):
+        return [i for i in self.nodes if self.is_healthy(i)]
+
+    def free_slots(self):
+        """
+        Return the number of job slots free on healthy instances.
+        """
+        return sum(self.nodes[i].free_slots for i in self.healthy_ids())
+
+    def place(self, job_id):
+        """
+        Pick an instance for a job and reserve a slot on it.
+
+        Instances the job already ran on are avoided while any other has a
+        free slot.
+
+        Returns:
+            str or None: The instance ID, or None if no healthy instance has
+                         a free slot.
+        """
+        candidates = [self.nodes[i] for i in self.healthy_ids() if self.nodes[i].free_slots > 0]
+        if not candidates:
+            return None
+        tried = self.tried.get(job_id, [])
+        untried = [n for n in candidates if n.instance_id not in tried]
+        candidates = untried or candidates
+        if self.placement == "bin_pack":
+            node = max(candidates, key=lambda n: (n.load, -n.free_slots))
+        else:
+            node = min(candidates, key=lambda n: (n.load, len(n.running)))
+        node.running.add(job_id)
+        self.tried.setdefault(job_id, []).append(node.instance_id)
+        return node.instance_id
+
+    def release(self, instance_id, job_id, succeeded, node_fault=False):
+        """
+        Free a job's slot and decide what happens to the job.
+
+        Args:
+            instance_id (str): Instance the job ran on.
+            job_id (str): The job.
+            succeeded (bool): Whether the render succeeded.
+            node_fault (bool): Whether the failure lies with the instance
+                               rather than the job.
+
+        Returns:
+            str: "done", "retry" (place it again) or "failed".
+        """
+        node = self.nodes[instance_id]
+        node.running.discard(job_id)
+        if succeeded:
+            node.failures = 0
+            node.completed += 1
+            self.tried.pop(job_id, None)
+            return "done"
+        if node_fault:
+            node.failures += 1
+            if node.failures == self.failure_threshold:
+                logger.warning("Render instance %s failed %d jobs in a row; taking it out of the pool.",
+                               instance_id, node.failures)
+            if len(self.tried.get(job_id, [])) < self.max_attempts:
+                return "retry"
+        self.tried.pop(job_id, None)
+        return "failed"
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def simulate_cluster(arrivals, instances, capacity=1, placement="least_loaded",
+                     render_seconds=180, jitter=0.2, contention=0.6,
+                     failure_rate=0.0, outages=(), detect_seconds=60,
+                     max_attempts=2, seed=0):
+    """
+    Run a RenderScheduler against a simulated render cluster.
+
+    Args:
+        arrivals (list): Job arrival times in seconds.
+        instances (int): Number of render instances.
+        capacity (int): Concurrent jobs per instance.
+        placement (str): Placement policy.
+        render_seconds (float): Render time of a job alone on an instance.
+        jitter (float): Relative spread of render times.
+        contention (float): Slowdown per additional job sharing an instance
+                            (aerender jobs compete for CPU and disk).
+        failure_rate (float): Probability that an instance fails a job.
+        outages (iterable): (instance index, start, end) periods in which an
+                            instance is down; its jobs fail once the outage
+                            is detected, detect_seconds after it starts.
+        detect_seconds (float): Delay before a dead instance's jobs fail and
+                                its ping status turns ConnectionLost.
+        max_attempts (int): Attempts per job.
+        seed (int): Random seed.
+
+    Returns:
+        dict: Completed and failed jobs, retries, throughput per hour of
+              backlog (time with jobs waiting or running), job latency
+              (arrival to completion) percentiles and jobs per instance.
+    """
+    rng = random.Random(seed)
+    ids = [f"i-sim{n:02d}" for n in range(instances)]
+    scheduler = RenderScheduler(ids, capacity, placement, max_attempts)
+    events = []
+    seq = 0
+
+    def push(at, kind, *payload):
+        nonlocal seq
+        seq += 1
+        heapq.heappush(events, (at, seq, kind, payload))
+
+    for job_id, at in enumerate(sorted(arrivals)):
+        push(at, "arrive", job_id)
+    for index, start, end in outages:
+        push(start + detect_seconds, "down", ids[index])
+        push(end, "up", ids[index])
+
+    arrived = {}
+    waiting = []
+    running = {}   # job_id -> (instance_id, finish event seq)
+    latencies = []
+    failed = retries = 0
+    busy_seconds = 0.0
+    backlog_seconds = 0.0  # time with at least one job waiting or running
+    now = 0.0
+
+    def dispatch():
+        nonlocal busy_seconds
+        while waiting and scheduler.free_slots():
+            job_id = waiting.pop(0)
+            instance_id = scheduler.place(job_id)
+            node = scheduler.nodes[instance_id]
+            duration = render_seconds * rng.uniform(1 - jitter, 1 + jitter)
+            duration *= 1 + contention * (len(node.running) - 1)
+            ok = rng.random() >= failure_rate
+            busy_seconds += duration
+            push(now + duration, "finish", job_id, instance_id, ok)
+            running[job_id] = (instance_id, seq)
+
+    while events:
+        at, event_seq, kind, payload = heapq.heappop(events)
+        if waiting or running:
+            backlog_seconds += at - now
+        now = at
+        if kind == "arrive":
+            arrived[payload[0]] = now
+            waiting.append(payload[0])
+        elif kind == "finish":
+            job_id, instance_id, ok = payload
+            if running.get(job_id, (None, None))[1] != event_seq:
+                continue
+            del running[job_id]
+            outcome = scheduler.release(instance_id, job_id, ok, node_fault=not ok)
+            if outcome == "done":
+                latencies.append(now - arrived[job_id])
+            elif outcome == "retry":
+                retries += 1
+                waiting.insert(0, job_id)
+            else:
+                failed += 1
+        elif kind == "down":
+            scheduler.set_ping_status(payload[0], "ConnectionLost")
+            for job_id, (instance_id, _) in list(running.items()):
+                if instance_id == payload[0]:
+                    del running[job_id]
+                    if scheduler.release(instance_id, job_id, False, node_fault=True) == "retry":
+                        retries += 1
+                        waiting.insert(0, job_id)
+                    else:
+                        failed += 1
+        elif kind == "up":
+            scheduler.set_ping_status(payload[0], "Online")
+            scheduler.nodes[payload[0]].failures = 0
+        dispatch()
+    # Jobs still waiting had no healthy instance left to run on.
+    failed += len(waiting)
+
+    return {
+        "jobs": len(arrivals),
+        "completed": len(latencies),
+        "failed": failed,
+        "retries": retries,
+        "backlog_s": round(backlog_seconds, 1),
+        "throughput_per_hour": round(len(latencies) / backlog_seconds * 3600, 2) if backlog_seconds else None,
+        "p50_latency_s": round(_percentile(latencies, 0.5) or 0, 1),
+        "p95_latency_s": round(_percentile(latencies, 0.95) or 0, 1),
+        "p99_latency_s": round(_percentile(latencies, 0.99) or 0, 1),
+        "max_latency_s": round(max(latencies), 1) if latencies else None,
+        "busy_instance_hours": round(busy_seconds / 3600, 2),
+        "jobs_per_instance": {i: scheduler.nodes[i].completed for i in ids},
+    }
@@ -0,0 +1,125 @@
+"""
+Run-scoped artifact keys and the render manifest.
+
+The state machine's InitRun state puts {"run_id": <execution name>} under
+$.run. Every stage that writes or reads run artifacts derives their keys from
+that ID, so the keys notify_post presigns are exactly the keys the render job
+uploaded to. In batch mode each post gets its own prefix within the run.
+"""
+import hashlib
+import json
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+RUN_PREFIX = os.environ.get("RUN_PREFIX", "runs/")
+MANIFEST_NAME = "manifest.json"
+HEAD_WORKERS = 8
+
+
+def get_run_id(event):
+    """
+    Return the run ID carried in a state machine event, or None.
+    """
+    return (event.get("run") or {}).get("run_id")
+
+
+def post_id_for(post):
+    """
+    Return a stable identifier for a post, derived from its link or title.
+    """
+    source = post.get("link") or post.get("title") or ""
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+
+def run_key(run_id, name, post_id=None):
+    """
+    Return the object key of a run artifact.
+
+    Args:
+        run_id (str): Run ID, or None outside the state machine.
+        name (str): Artifact path relative to the run, e.g. "anime_post.mp4".
+        post_id (str): Post the artifact belongs to, for per-post artifacts.
+
+    Returns:
+        str: "<RUN_PREFIX><run_id>/[posts/<post_id>/]<name>", or the part
+             after the run prefix when there is no run.
+    """
+    if post_id:
+        name = f"posts/{post_id}/{name}"
+    if not run_id:
+        return name
+    return f"{RUN_PREFIX}{run_id}/{name}"
+
+
+def manifest_key(run_id, post_id=None):
+    """
+    Return the key of the render manifest for a run or one of its posts.
+    """
+    return run_key(run_id, MANIFEST_NAME, post_id)
+
+
+def load_manifest(s3_client, bucket, key):
+    """
+    Read a render manifest from S3.
+
+    Returns:
+        dict or None: The manifest, or None if it does not exist.
+    """
+    try:
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404", "NotFound"):
+            return None
+        raise
+    return json.loads(body)
+
+
+def uploaded_keys(manifest):
+    """
+    Return the keys the manifest records as present in the bucket.
+    """
+    return [
+        artifact["key"] for artifact in manifest.get("artifacts", [])
+        if artifact.get("status") in ("uploaded", "already_uploaded")
+    ]
+
+
+def variant_keys(manifest):
+    """
+    Return the uploaded variants the manifest records, as name -> key.
+    """
+    return {
+        artifact["variant"]: artifact["key"] for artifact in manifest.get("artifacts", [])
+        if artifact.get("variant") and artifact.get("status") in ("uploaded", "already_uploaded")
+    }
+
+
+def head_objects(s3_client, bucket, keys):
+    """
+    Check which objects exist, issuing the HEAD requests concurrently.
+
+    Args:
+        s3_client: A boto3 S3 client.
+        bucket (str): Bucket name.
+        keys (list): Object keys.
+
+    Returns:
+        dict: key -> size in bytes, or None if the object does not exist.
+    """
+    def head(key):
+        try:
+            return key, s3_client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404", "NotFound"):
+                return key, None
+            raise
+
+    if not keys:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(HEAD_WORKERS, len(keys))) as pool:
+        return dict(pool.map(head, keys))
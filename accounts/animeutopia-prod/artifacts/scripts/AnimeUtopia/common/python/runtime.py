@@ -0,0 +1,123 @@
+"""
+AWS clients and HTTP sessions shared across warm invocations.
+
+Lambda keeps the execution environment between invocations, so a client
+built once keeps its connection pool, and with it established TLS
+connections, for every later invocation instead of paying construction and
+handshakes each time. get_client() returns one boto3 client per service and
+region, built on first use with a connection pool sized for the handlers'
+thread pools and the standard retry mode. get_session() returns one
+requests.Session per name, with keep-alive pools, retries of idempotent
+requests and a default timeout. requests is imported only by get_session(),
+so handlers without it can use the rest of the module.
+"""
+import functools
+import os
+import threading
+import logging
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger()
+
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "32"))
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "5"))
+AWS_CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", "5"))
+AWS_READ_TIMEOUT = float(os.environ.get("AWS_READ_TIMEOUT", "60"))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "16"))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "10"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_clients = {}
+_sessions = {}
+
+
+def client_config():
+    """
+    Return the botocore configuration of the shared clients.
+    """
+    return Config(
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": AWS_MAX_ATTEMPTS, "mode": "standard"},
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT,
+    )
+
+
+def get_client(service, region=None):
+    """
+    Return the shared boto3 client of a service.
+
+    Args:
+        service (str): Service name, e.g. "s3".
+        region (str): Region; the function's own (AWS_REGION) by default.
+
+    Returns:
+        A boto3 client, created on first use.
+    """
+    key = (service, region or os.environ.get("AWS_REGION"))
+    client = _clients.get(key)
+    if client is None:
+        # boto3's default session is not safe to build clients from
+        # concurrently.
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = boto3.client(service, region_name=key[1], config=client_config())
+                _clients[key] = client
+    return client
+
+
+def _new_session(timeout):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    # POSTs are not retried (urllib3's default), so a webhook message is
+    # never sent twice.
+    retry = Retry(total=HTTP_RETRIES, backoff_factor=0.3, status_forcelist=HTTP_RETRY_STATUSES,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # A timeout passed by the caller still wins.
+    session.request = functools.partial(session.request, timeout=timeout)
+    return session
+
+
+def get_session(name="default", timeout=HTTP_TIMEOUT):
+    """
+    Return a shared requests.Session.
+
+    Args:
+        name (str): Session name; callers talking to different services use
+                    different sessions so their pools do not compete.
+        timeout (float): Default (connect and read) timeout in seconds, used
+                         when the session is created.
+
+    Returns:
+        requests.Session: The session, created on first use.
+    """
+    session = _sessions.get(name)
+    if session is None:
+        with _lock:
+            session = _sessions.get(name)
+            if session is None:
+                session = _sessions[name] = _new_session(timeout)
+    return session
+
+
+def reset():
+    """
+    Drop the shared clients and sessions, e.g. after swapping the boto3
+    module for a stand-in.
+    """
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _clients.clear()
+        _sessions.clear()
@@ -1,9 +1,270 @@
-import feedparser
+import gzip
+import json
+import os
+import re
+import time
 import logging
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import feedparser
+
+from feed_state import apply_fetch, get_state_store, is_pending, outstanding_guids
+from instrumentation import instrumented, span, timed
+from rss_stream import parse_feed_stream
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+FEED_REGISTRY = [
+    {
+        "name": "animenewsnetwork",
+        "url": "https://www.animenewsnetwork.com/newsroom/rss.xml",
+        "timeout": 5,
+        "anime_only": False
+    },
+    {
+        "name": "crunchyroll",
+        "url": "https://cr-news-api-service.prd.crunchyrollsvc.com/v1/en-US/rss",
+        "timeout": 5,
+        "anime_only": True
+    },
+    {
+        "name": "myanimelist",
+        "url": "https://myanimelist.net/rss/news.xml",
+        "timeout": 5,
+        "anime_only": True
+    }
+]
+
+FEED_MAX_WORKERS = int(os.environ.get("FEED_MAX_WORKERS", "8"))
+FEED_TOTAL_TIMEOUT = float(os.environ.get("FEED_TOTAL_TIMEOUT", "8"))
+FEED_PARSER = os.environ.get("FEED_PARSER", "feedparser")
+FEED_ENTRY_BUDGET = int(os.environ.get("FEED_ENTRY_BUDGET", "200"))
+FEED_MAX_POSTS = int(os.environ.get("FEED_MAX_POSTS", "5"))
+USER_AGENT = "Mozilla/5.0 (compatible; FeedMatrix/1.0)"
+
+
+def get_feed_registry():
+    """Return the feeds to poll.
+
+    FEED_REGISTRY_JSON may hold a JSON list of feed definitions (name, url and
+    optionally timeout, anime_only and parser) that replaces the built-in
+    registry.
+
+    Returns:
+        list: Feed definitions.
+    """
+    raw = os.environ.get("FEED_REGISTRY_JSON")
+    if raw:
+        return json.loads(raw)
+    return FEED_REGISTRY
+
+
+def fetch_feed(feed_def, feed_state, seen=frozenset(), outstanding=frozenset()):
+    """Fetch and parse a single feed with its own timeout and validators.
+
+    With the "stream" parser (FEED_PARSER or the feed's "parser" key) the
+    response is parsed incrementally while it downloads, only anime entries are
+    kept, and reading stops at the first seen entry below every outstanding
+    one or after FEED_ENTRY_BUDGET entries. The default "feedparser" parser
+    reads the whole document.
+
+    Args:
+        feed_def (dict): Feed definition from the registry.
+        feed_state (dict): Stored ETag/Last-Modified for this feed.
+        seen (set): GUIDs handled by previous runs, used by the stream parser.
+        outstanding (set): GUIDs of this feed's entries not stored yet, used
+                           by the stream parser.
+
+    Returns:
+        dict: The feed definition, HTTP status, parsed feed (None on 304 or
+              failure), GUIDs read by the stream parser, new validators and an
+              error message if any.
+    """
+    headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip"}
+    if feed_state.get("etag"):
+        headers["If-None-Match"] = feed_state["etag"]
+    if feed_state.get("modified"):
+        headers["If-Modified-Since"] = feed_state["modified"]
+
+    result = {"feed": feed_def, "status": None, "parsed": None, "guids": [],
+              "etag": feed_state.get("etag"), "modified": feed_state.get("modified"),
+              "error": None}
+    streaming = feed_def.get("parser", FEED_PARSER) == "stream"
+    request = urllib.request.Request(feed_def["url"], headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=feed_def.get("timeout", 5)) as response:
+            result["status"] = response.status
+            result["etag"] = response.headers.get("ETag")
+            result["modified"] = response.headers.get("Last-Modified")
+            stream = response
+            if (response.headers.get("Content-Encoding") or "").lower() == "gzip":
+                stream = gzip.GzipFile(fileobj=response)
+            if streaming:
+                anime_only = feed_def.get("anime_only", False)
+                streamed = parse_feed_stream(
+                    stream,
+                    seen=seen,
+                    max_entries=FEED_ENTRY_BUDGET,
+                    anime_filter=None if anime_only else is_anime_entry,
+                    outstanding=outstanding
+                )
+                result["parsed"] = feedparser.FeedParserDict(entries=streamed["entries"])
+                result["guids"] = streamed["guids"]
+                return result
+            body = stream.read()
+    except urllib.error.HTTPError as e:
+        result["status"] = e.code
+        if e.code != 304:
+            result["error"] = f"HTTP {e.code}"
+        return result
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+
+    parsed = feedparser.parse(body)
+    if parsed.bozo and not parsed.entries:
+        result["error"] = f"Failed to parse feed: {parsed.bozo_exception}"
+        return result
+    result["parsed"] = parsed
+    return result
+
+
+def fetch_feeds(feeds, state, seen=frozenset()):
+    """Fetch every feed concurrently, bounded by worker count and a total budget.
+
+    Args:
+        feeds (list): Feed definitions from the registry.
+        state (dict): Persisted fetcher state holding per-feed validators and
+                      outstanding entries.
+        seen (set): GUIDs handled by previous runs.
+
+    Returns:
+        list: Results from fetch_feed for the feeds that finished in time.
+    """
+    feed_states = state.get("feeds", {})
+    results = []
+    executor = ThreadPoolExecutor(max_workers=max(1, min(FEED_MAX_WORKERS, len(feeds))))
+    futures = {
+        executor.submit(
+            fetch_feed, feed_def, feed_states.get(feed_def["url"], {}), seen,
+            outstanding_guids(state, feed_def["url"])
+        ): feed_def
+        for feed_def in feeds
+    }
+    try:
+        for future in as_completed(futures, timeout=FEED_TOTAL_TIMEOUT):
+            results.append(future.result())
+    except FuturesTimeoutError:
+        pending = [f["name"] for fut, f in futures.items() if not fut.done()]
+        logger.warning("Feed budget exhausted, skipping: %s", ", ".join(pending))
+    finally:
+        executor.shutdown(wait=False)
+    return results
+
+
+def normalize_title(title):
+    """Normalize a headline for cross-feed duplicate detection."""
+    return re.sub(r"[^0-9a-z]+", " ", (title or "").casefold()).strip()
+
+
+def normalize_link(link):
+    """Normalize a link for cross-feed duplicate detection."""
+    if not link:
+        return ""
+    parts = urlsplit(link.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return host + parts.path.rstrip("/")
+
+
+def entry_timestamp(entry):
+    """Return the entry publication time as a POSIX timestamp, or 0."""
+    published = entry.get("published")
+    if not published:
+        return 0
+    try:
+        return parsedate_to_datetime(published).timestamp()
+    except (TypeError, ValueError):
+        return 0
+
+
+def merge_feed_entries(results):
+    """Merge entries from several feeds into one deduplicated, newest-first list.
+
+    Entries are deduplicated on normalized title and normalized link, so the
+    same story syndicated by several sources is only kept once.
+
+    Args:
+        results (list): Results from fetch_feeds.
+
+    Returns:
+        FeedParserDict: A feed-like object whose entries are the merged batch.
+    """
+    tagged = []
+    for order, result in enumerate(results):
+        parsed = result["parsed"]
+        if not parsed:
+            continue
+        feed_def = result["feed"]
+        for position, entry in enumerate(parsed.entries):
+            entry["source"] = feed_def["name"]
+            entry["anime_only"] = feed_def.get("anime_only", False)
+            tagged.append((-entry_timestamp(entry), order, position, entry))
+    tagged.sort(key=lambda item: item[:3])
+
+    merged = []
+    seen_titles = set()
+    seen_links = set()
+    for _, _, _, entry in tagged:
+        title_key = normalize_title(entry.get("title"))
+        link_key = normalize_link(entry.get("link"))
+        if (title_key and title_key in seen_titles) or (link_key and link_key in seen_links):
+            continue
+        seen_titles.add(title_key)
+        seen_links.add(link_key)
+        merged.append(entry)
+    return feedparser.FeedParserDict(entries=merged)
+
+
+@timed("state_save", "io")
+def store_state(store, mutate):
+    """Update the fetcher state, logging rather than failing on errors."""
+    try:
+        store.update(mutate)
+    except Exception as e:
+        logger.exception("Failed to save feed state: %s", e)
+
+
+def entry_guid(entry):
+    """Return a stable identifier for a feed entry."""
+    return entry.get("id") or entry.get("link") or entry.get("title")
+
+
+def is_anime_entry(entry):
+    """Return True if the feed entry is categorised as anime."""
+    if entry.get("anime_only"):
+        return True
+    return "anime" in entry.get("category", "").lower()
+
+
+def entry_to_post(entry):
+    """Convert a feed entry into the post dictionary used by the workflow."""
+    return {
+        "guid": entry_guid(entry),
+        "title": entry.get("title"),
+        "link": entry.get("link"),
+        "description": entry.get("description"),
+        "pubDate": entry.get("published"),
+        "category": entry.get("category", ""),
+        "source": entry.get("source")
+    }
+
 
 def get_first_post_if_anime(feed):
     """Retrieve the first anime-related entry from the RSS feed.
@@ -18,38 +279,134 @@ def get_first_post_if_anime(feed):
     try:
         if feed.entries:
             first = feed.entries[0]
-            category = first.get("category", "").lower()
-            if "anime" in category:
-                return {
-                    "title": first.get("title"),
-                    "link": first.get("link"),
-                    "description": first.get("description"),
-                    "pubDate": first.get("published"),
-                    "category": first.get("category", "")
-                }
+            if is_anime_entry(first):
+                return entry_to_post(first)
     except Exception as error:
         logger.exception("Error processing feed entries: %s", error)
     return None
 
 
+def get_unseen_anime_posts(feed, seen):
+    """Collect every anime-related entry that is not in the seen index.
+
+    Args:
+        feed (FeedParserDict): Parsed RSS feed.
+        seen (set): GUIDs of entries handled by previous runs.
+
+    Returns:
+        tuple: A list of post dictionaries in feed order and the list of
+               GUIDs that were encountered for the first time.
+    """
+    posts = []
+    new_guids = []
+    for entry in feed.entries:
+        guid = entry_guid(entry)
+        if not guid or guid in seen:
+            continue
+        new_guids.append(guid)
+        if is_anime_entry(entry):
+            posts.append(entry_to_post(entry))
+    return posts, new_guids
+
+
+@instrumented("fetch_rss")
 def lambda_handler(event, context):
-    """Fetch the RSS feed and determine if the first post is anime-related.
+    """Fetch every registered feed incrementally and emit the unseen anime posts.
+
+    Feeds are fetched concurrently with the previous ETag/Last-Modified
+    validators, so unchanged feeds cost a single 304 round trip. Entries from
+    all feeds are merged, deduplicated and checked against a persisted
+    seen-GUID index so posts below the top of a feed are not lost.
+
+    At most FEED_MAX_POSTS posts are emitted per run, newest first; the rest
+    are left for the next runs. The emitted posts are not marked seen here but
+    by store_data once they are stored, from the "checkpoint" in the result
+    (see feed_state.py). Without a seen index (the first run, or after the
+    state was lost) the index is seeded with every entry read and nothing is
+    emitted, so a backlog of old headlines is never posted as one batch.
 
     Args:
         event (dict): Lambda event data.
         context (object): Lambda context object.
 
     Returns:
-        dict: Dictionary with a status and post details if an anime post is found.
+        dict: Dictionary with a status, the newest anime post, the batch of
+              unseen anime posts and its checkpoint if any were found; the
+              invocation's timing is added under "trace" (see
+              instrumentation.py).
     """
-    feed_url = "https://www.animenewsnetwork.com/newsroom/rss.xml"
-    feed = feedparser.parse(feed_url)
+    now = time.time()
+    store = get_state_store()
+    try:
+        with span("state_load", "io"):
+            state = store.load()
+    except Exception as e:
+        # Starting from an empty index would seed it and drop this run's posts.
+        logger.exception("Failed to load feed state: %s", e)
+        return {"status": "error", "message": "Failed to load feed state."}
+
+    seeding = "seen" not in state
+    seen = set(state.get("seen", []))
+    with span("feeds", "network"):
+        results = fetch_feeds(get_feed_registry(), state, seen)
+
+    validators = {}
+    for result in results:
+        name = result["feed"]["name"]
+        if result["error"]:
+            logger.error("Feed %s failed: %s", name, result["error"])
+            continue
+        if result["status"] == 304:
+            logger.info("Feed %s not modified since last fetch.", name)
+            continue
+        validators[result["feed"]["url"]] = {
+            "etag": result["etag"],
+            "modified": result["modified"]
+        }
+
+    if results and all(r["error"] for r in results):
+        return {"status": "error", "message": "Failed to fetch RSS feeds."}
+
+    streamed_guids = [g for r in results for g in r["guids"] if g not in seen]
+    with span("merge"):
+        merged = merge_feed_entries(results)
+    if not merged.entries and not streamed_guids:
+        store_state(store, lambda current: apply_fetch(current, now, feeds=validators))
+        return {"status": "no_post", "not_modified": True}
+
+    posts, new_guids = get_unseen_anime_posts(merged, seen)
+    new_guids = list(dict.fromkeys(new_guids + streamed_guids))
+    if seeding:
+        logger.info("No seen index yet; seeding it with %d entries without emitting them.", len(new_guids))
+        store_state(store, lambda current: apply_fetch(current, now, seen=new_guids[::-1], feeds=validators))
+        return {"status": "no_post", "seeded": len(new_guids)}
+
+    anime_guids = {post["guid"] for post in posts}
+    waiting = [post for post in posts if is_pending(state, post["guid"], now)]
+    posts = [post for post in posts if not is_pending(state, post["guid"], now)]
+    batch, deferred = posts[:FEED_MAX_POSTS], posts[FEED_MAX_POSTS:]
+    logger.info("Found %d new entries, %d anime-related: emitting %d, %d left for later runs, "
+                "%d still being stored by another run.",
+                len(new_guids), len(anime_guids), len(batch), len(deferred), len(waiting))
 
-    if feed.bozo:
-        logger.error("Failed to parse RSS feed: %s", feed.bozo_exception)
-        return {"status": "error", "message": "Failed to parse RSS feed."}
+    # A feed's validators advance only once every anime entry read from it is
+    # stored; until then it has to be fetched in full again.
+    urls = {r["feed"]["name"]: r["feed"]["url"] for r in results}
+    held = {urls.get(post["source"]) for post in deferred + waiting}
+    emitted = {urls.get(post["source"]) for post in batch} - held
+    checkpoint = {
+        "guids": [post["guid"] for post in batch][::-1],
+        "feeds": {url: v for url, v in validators.items() if url in emitted},
+    }
+    store_state(store, lambda current: apply_fetch(
+        current, now,
+        seen=[g for g in new_guids if g not in anime_guids][::-1],
+        pending=checkpoint["guids"],
+        feeds={url: v for url, v in validators.items() if url not in held and url not in emitted},
+        outstanding={post["guid"]: urls.get(post["source"]) for post in batch + deferred + waiting},
+    ))
 
-    recent_post = get_first_post_if_anime(feed)
-    if recent_post:
-        return {"status": "anime_post_found", "post": recent_post}
+    if batch:
+        return {"status": "anime_post_found", "post": batch[0], "posts": batch,
+                "checkpoint": checkpoint, "deferred": len(deferred)}
     return {"status": "no_post"}
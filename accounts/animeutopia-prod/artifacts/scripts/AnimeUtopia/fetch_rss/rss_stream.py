@@ -0,0 +1,101 @@
+import logging
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger()
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _element_to_entry(element):
+    """
+    Convert an RSS <item> or Atom <entry> element into a plain entry dict
+    carrying the same keys the feedparser path exposes.
+    """
+    entry = {}
+    categories = []
+    for child in element:
+        name = _local_name(child.tag)
+        text = (child.text or "").strip()
+        if name == "title":
+            entry["title"] = text
+        elif name == "link":
+            entry["link"] = child.get("href") or text
+        elif name in ("guid", "id"):
+            entry["id"] = text
+        elif name == "category":
+            categories.append(child.get("term") or text)
+        elif name in ("description", "summary"):
+            entry["description"] = text
+        elif name in ("pubDate", "published"):
+            entry["published"] = text
+        elif name == "updated" and "published" not in entry:
+            entry["published"] = text
+    if categories:
+        entry["category"] = ",".join(categories)
+    return entry
+
+
+def parse_feed_stream(stream, seen=frozenset(), max_entries=None, anime_filter=None,
+                      outstanding=frozenset()):
+    """
+    Incrementally parse an RSS/Atom document and keep only matching entries.
+
+    Entries are built one at a time and their elements are released as soon as
+    they have been classified, so memory stays bounded by the number of kept
+    entries rather than the size of the document. Parsing stops at the first
+    entry already in the seen index (feeds are newest-first) below every
+    outstanding entry, or once max_entries entries have been read. Seen
+    entries above an outstanding one are skipped.
+
+    Args:
+        stream (file-like): Binary stream positioned at the start of the document.
+        seen (set): GUIDs handled by previous runs.
+        max_entries (int): Maximum number of entries to read, or None.
+        anime_filter (callable): Predicate applied to each entry; entries for
+                                 which it returns False are not kept.
+        outstanding (set): GUIDs read by earlier runs but not stored yet,
+                           which parsing has to reach.
+
+    Returns:
+        dict: "entries" (kept entries in feed order), "guids" (GUIDs of every
+              new entry read, kept or not) and "stop_reason".
+    """
+    entries = []
+    guids = []
+    stop_reason = "end_of_feed"
+    read = 0
+    unreached = set(outstanding)
+
+    stack = []
+    for event, element in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            stack.append(element)
+            continue
+        stack.pop()
+        if _local_name(element.tag) not in ("item", "entry"):
+            continue
+
+        entry = _element_to_entry(element)
+        if stack:
+            stack[-1].remove(element)
+        read += 1
+
+        guid = entry.get("id") or entry.get("link") or entry.get("title")
+        unreached.discard(guid)
+        if guid in seen:
+            if not unreached:
+                stop_reason = "seen_item"
+                break
+        else:
+            if guid:
+                guids.append(guid)
+            if anime_filter is None or anime_filter(entry):
+                entries.append(entry)
+        if max_entries is not None and read >= max_entries:
+            stop_reason = "entry_budget"
+            break
+
+    logger.info("Streamed %d entries, kept %d (%s).", read, len(entries), stop_reason)
+    return {"entries": entries, "guids": guids, "stop_reason": stop_reason}
@@ -1,27 +1,69 @@
 import os
 import logging
-import boto3
-from datetime import datetime, timezone
-import uuid
 import json
 
-import requests
+from instrumentation import instrumented, pipeline_breakdown, span
+from runtime import get_client, get_session
+from run_manifest import (
+    get_run_id, head_objects, load_manifest, manifest_key, uploaded_keys, variant_keys
+)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+URL_EXPIRY = 604800
+
+
+def rendered_manifests(event):
+    """
+    List the (title, manifest key) of every post rendered in this run.
+
+    Queue mode reports each render under videoResult.renders; otherwise the
+    run has a single manifest. A queue drainer renders whatever is queued,
+    so the renders may include other executions' posts, and this run's own
+    posts may have been rendered (and are notified) by another execution.
+    """
+    video_result = event.get("videoResult") or {}
+    renders = video_result.get("renders")
+    if renders is not None:
+        return [
+            (r.get("title"), r["manifest_key"])
+            for r in renders if "error" not in r and r.get("manifest_key")
+        ]
+    key = video_result.get("manifest_key") or manifest_key(get_run_id(event))
+    return [(None, key)]
+
+
+def presign(s3, bucket, key):
+    return s3.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key},
+        ExpiresIn=URL_EXPIRY
+    )
+
+
+@instrumented("notify_post")
 def lambda_handler(event, context):
     """
-    Generates two pre-signed URLs and posts a message with both links
-    to a Microsoft Teams channel via an Incoming Webhook.
-    
+    Generates pre-signed URLs for the artifacts the render job uploaded in
+    this run and posts a message with the links to a Microsoft Teams channel
+    via an Incoming Webhook.
+
+    The keys come from the render manifests of the run (one per post in queue
+    mode), including a link per platform variant of the video. Every listed
+    key is checked in one concurrent HEAD pass first, so no link is sent for
+    an object that does not exist.
+
     Environment Variables:
       - TARGET_BUCKET: Name of the S3 bucket where files are stored.
       - TEAMS_WEBHOOK_URL: Webhook URL for the Microsoft Teams channel.
-    
+
     Returns:
-      dict: A dictionary containing the status, video_url, project_url, 
-            keys used or an error message.
+      dict: A dictionary containing the status, the links and keys per post
+            under "posts" (the first post's also at the top level) and the
+            per-stage timing of the run's earlier stages under "pipeline"
+            (see instrumentation.pipeline_breakdown), "rendered_elsewhere"
+            when the run's drainer rendered nothing, or an error message.
     """
     bucket = os.environ.get("TARGET_BUCKET")
     if not bucket:
@@ -35,59 +77,113 @@ def lambda_handler(event, context):
         logger.error(error_msg)
         return {"error": error_msg}
 
-    s3 = boto3.client("s3")
+    s3 = get_client("s3")
+
+    video_result = event.get("videoResult") or {}
+    rendered = rendered_manifests(event)
+    if not rendered and video_result.get("mode") == "queue" and "error" not in video_result:
+        # Not an error: another execution's drainer took this run's jobs off
+        # the queue and notifies them with its own renders.
+        logger.info("Nothing rendered by this run's drainer; no message to post.")
+        return {"status": "rendered_elsewhere", "posts": []}
 
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
-    unique_id = uuid.uuid4().hex
-    video_key = f"anime_post_{timestamp}_{unique_id}.mp4"
-    project_key = f"exports/anime_template_exported_{timestamp}_{unique_id}.aep"
+    manifests = []
+    for title, key in rendered:
+        try:
+            with span("manifests", "network"):
+                manifest = load_manifest(s3, bucket, key)
+        except Exception as e:
+            logger.exception("Error reading render manifest %s: %s", key, e)
+            return {"error": f"Failed to read render manifest {key}."}
+        if manifest is None:
+            logger.error("No render manifest at %s.", key)
+            continue
+        manifests.append((title, key, manifest))
+    if not manifests:
+        error_msg = "No render manifest found for this run."
+        logger.error(error_msg)
+        return {"error": error_msg}
 
     try:
-        video_url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": video_key},
-            ExpiresIn=604800 
-        )
+        with span("head_objects", "network"):
+            sizes = head_objects(
+                s3, bucket, [k for _, _, manifest in manifests for k in uploaded_keys(manifest)]
+            )
     except Exception as e:
-        logger.exception("Error generating presigned URL for video file: %s", e)
-        return {"error": "Failed to generate presigned URL for video file."}
+        logger.exception("Error checking uploaded artifacts: %s", e)
+        return {"error": "Failed to check uploaded artifacts."}
+    missing = [k for k, size in sizes.items() if size is None]
+    if missing:
+        logger.warning("Artifacts listed in the run's manifests are missing: %s", missing)
 
-    try:
-        project_url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": project_key},
-            ExpiresIn=604800
+    posts = []
+    for title, key, manifest in manifests:
+        existing = [k for k in uploaded_keys(manifest) if sizes.get(k) is not None]
+        variants = {name: k for name, k in variant_keys(manifest).items() if k in existing}
+        video_key = next(
+            (k for k in existing if k.endswith(".mp4") and k not in variants.values()), None
         )
-    except Exception as e:
-        logger.exception("Error generating presigned URL for project file: %s", e)
-        return {"error": "Failed to generate presigned URL for project file."}
+        project_key = next((k for k in existing if k.endswith(".aep")), None)
+        if not video_key:
+            logger.error("Rendered video listed in %s does not exist.", key)
+            continue
+        try:
+            video_url = presign(s3, bucket, video_key)
+            project_url = presign(s3, bucket, project_key) if project_key else None
+            variant_urls = {name: presign(s3, bucket, k) for name, k in variants.items()}
+        except Exception as e:
+            logger.exception("Error generating presigned URLs for %s: %s", key, e)
+            return {"error": "Failed to generate presigned URLs."}
+        posts.append({
+            "title": title,
+            "video_url": video_url,
+            "project_url": project_url,
+            "video_key": video_key,
+            "project_key": project_key,
+            "variant_urls": variant_urls,
+            "variant_keys": variants,
+            "manifest_key": key
+        })
+    if not posts:
+        error_msg = "No rendered video of this run exists."
+        logger.error(error_msg)
+        return {"error": error_msg, "missing": missing}
 
-    message_text = (
-        f"Your new post has been processed!\n\n"
-        f"**Video URL**: {video_url}\n\n"
-        f"**After Effects Project URL**: {project_url}"
+    sections = []
+    for post in posts:
+        lines = []
+        if post["title"]:
+            lines.append(f"**{post['title']}**")
+        lines.append(f"**Video URL**: {post['video_url']}")
+        for name, url in post["variant_urls"].items():
+            lines.append(f"**{name}**: {url}")
+        if post["project_url"]:
+            lines.append(f"**After Effects Project URL**: {post['project_url']}")
+        sections.append("\n\n".join(lines))
+    heading = (
+        "Your new post has been processed!" if len(posts) == 1
+        else f"Your {len(posts)} new posts have been processed!"
     )
+    message_text = heading + "\n\n" + "\n\n---\n\n".join(sections)
 
     teams_payload = {
-        "text": message_text 
+        "text": message_text
     }
 
     try:
-        response = requests.post(
-            teams_webhook_url,
-            headers={"Content-Type": "application/json"},
-            data=json.dumps(teams_payload)
-        )
+        with span("webhook", "network"):
+            response = get_session("webhook").post(
+                teams_webhook_url,
+                headers={"Content-Type": "application/json"},
+                data=json.dumps(teams_payload)
+            )
         response.raise_for_status()
     except Exception as e:
         logger.exception("Error posting message to Microsoft Teams: %s", e)
         return {"error": "Failed to post to Microsoft Teams channel."}
 
     logger.info("Message posted to Microsoft Teams successfully.")
-    return {
-        "status": "message_posted",
-        "video_url": video_url,
-        "project_url": project_url,
-        "video_key": video_key,
-        "project_key": project_key
-    }
+    pipeline = pipeline_breakdown(event)
+    logger.info("Run %s took %.0f ms across stages: %s", pipeline["run_id"], pipeline["total_ms"],
+                {name: stage["duration_ms"] for name, stage in pipeline["stages"].items()})
+    return dict(posts[0], status="message_posted", posts=posts, pipeline=pipeline)
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+from runtime import get_client
+
+logger = logging.getLogger()
+
+CACHE_BUCKET = os.environ.get("ANILIST_CACHE_BUCKET")
+CACHE_PREFIX = os.environ.get("ANILIST_CACHE_PREFIX", "cache/anilist/")
+CACHE_FILE = os.environ.get("ANILIST_CACHE_FILE", "/tmp/anilist_cache.json")
+CACHE_TTL = int(os.environ.get("ANILIST_CACHE_TTL", str(7 * 24 * 3600)))
+NEGATIVE_TTL = int(os.environ.get("ANILIST_NEGATIVE_TTL", str(6 * 3600)))
+LRU_SIZE = int(os.environ.get("ANILIST_LRU_SIZE", "256"))
+
+
+def normalize_title(title):
+    """
+    Normalize a core title into a cache key.
+
+    Args:
+        title (str): Core title as extracted from a headline.
+
+    Returns:
+        str: Lower-cased title with punctuation and whitespace collapsed.
+    """
+    return re.sub(r"[\W_]+", " ", (title or "").casefold()).strip()
+
+
+class LocalFileBackend:
+    """
+    Persistent tier stored as a single JSON file, used locally and as the
+    fallback when no cache bucket is configured.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._data = {}
+        return self._data
+
+    def get(self, key):
+        return self._load().get(key)
+
+    def put(self, key, entry):
+        data = self._load()
+        data[key] = entry
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+class S3Backend:
+    """
+    Persistent tier stored as one small JSON object per key in S3.
+    """
+
+    def __init__(self, bucket, prefix, client=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client or get_client("s3")
+
+    def _object_key(self, key):
+        return self.prefix + hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(response["Body"].read())
+
+    def put(self, key, entry):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Body=json.dumps(entry, separators=(",", ":")),
+            ContentType="application/json"
+        )
+
+
+class AniListCache:
+    """
+    Two-tier cache of AniList lookups keyed on the normalized core title.
+
+    The first tier is an in-process LRU that survives warm invocations; the
+    second is a persistent backend shared by every container. Misses (no
+    matching media) are cached with a shorter TTL so unknown titles do not
+    hit AniList on every post.
+    """
+
+    def __init__(self, backend, max_entries=LRU_SIZE, ttl=CACHE_TTL, negative_ttl=NEGATIVE_TTL):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lru = OrderedDict()
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+    def _remember(self, key, entry):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get(self, title):
+        """
+        Look up a title in the memory tier, then the persistent tier.
+
+        Args:
+            title (str): Core title.
+
+        Returns:
+            dict or None: Cached entry with "titles", "image_url" and "found",
+                          or None if absent or expired.
+        """
+        key = normalize_title(title)
+        now = time.time()
+
+        entry = self._lru.get(key)
+        if entry is not None and entry["expires_at"] > now:
+            self._lru.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry
+
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            logger.warning("AniList cache read failed for '%s': %s", key, e)
+            entry = None
+        if entry is not None and entry["expires_at"] > now:
+            self._remember(key, entry)
+            self.stats["persistent_hits"] += 1
+            return entry
+
+        self._lru.pop(key, None)
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, title, titles, image_url):
+        """
+        Store a lookup result in both tiers.
+
+        Args:
+            title (str): Core title the lookup was made for.
+            titles (list): Title variants returned by AniList (empty on a miss).
+            image_url (str or None): Cover image URL.
+        """
+        key = normalize_title(title)
+        found = bool(titles)
+        entry = {
+            "titles": titles,
+            "image_url": image_url,
+            "found": found,
+            "expires_at": time.time() + (self.ttl if found else self.negative_ttl)
+        }
+        self._remember(key, entry)
+        try:
+            self.backend.put(key, entry)
+        except Exception as e:
+            logger.warning("AniList cache write failed for '%s': %s", key, e)
+
+
+_cache = None
+
+
+def get_cache():
+    """
+    Return the process-wide AniList cache, creating it on first use.
+
+    Returns:
+        AniListCache: Cache backed by S3 when ANILIST_CACHE_BUCKET is set,
+                      otherwise by a local JSON file.
+    """
+    global _cache
+    if _cache is None:
+        if CACHE_BUCKET:
+            backend = S3Backend(CACHE_BUCKET, CACHE_PREFIX)
+        else:
+            backend = LocalFileBackend(CACHE_FILE)
+        _cache = AniListCache(backend)
+    return _cache
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+import logging
+
+from botocore.exceptions import ClientError
+
+from runtime import get_client
+
+logger = logging.getLogger()
+
+ASSET_BUCKET = os.environ.get("ASSET_BUCKET")
+ASSET_PREFIX = os.environ.get("ASSET_PREFIX", "assets/")
+ASSET_DIR = os.environ.get("ASSET_DIR", "/tmp/assets")
+
+
+class LocalAssetBackend:
+    """
+    Asset objects stored as files under a local directory, used locally and as
+    the fallback when no asset bucket is configured.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, body, content_type):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+
+class S3AssetBackend:
+    """
+    Asset objects stored in S3; existence is checked with HEAD requests.
+    """
+
+    def __init__(self, bucket, client=None):
+        self.bucket = bucket
+        self.client = client or get_client("s3")
+
+    @staticmethod
+    def _missing(error):
+        return error.response.get("Error", {}).get("Code") in ("NoSuchKey", "404", "NotFound")
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if self._missing(e):
+                return False
+            raise
+
+    def get(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+
+    def put(self, key, body, content_type):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+
+
+class AssetStore:
+    """
+    Content-addressed store for cover images and their processed variants.
+
+    Layout under the prefix:
+
+        by-url/<sha256(url)>.json           {"url", "sha256"} for a source URL
+        <sha256(content)>/source            the original download
+        <sha256(content)>/<variant>.jpg     processed variants
+
+    A known URL whose variant already exists resolves with two small reads
+    and no download or image processing. Identical images served from
+    different URLs share the same content hash and variants.
+    """
+
+    def __init__(self, backend, prefix=ASSET_PREFIX):
+        self.backend = backend
+        self.prefix = prefix
+        self._resolved = {}
+
+    def _url_key(self, url):
+        return f"{self.prefix}by-url/{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+
+    def source_key(self, content_hash):
+        return f"{self.prefix}{content_hash}/source"
+
+    def variant_key(self, content_hash, variant):
+        return f"{self.prefix}{content_hash}/{variant}.jpg"
+
+    def content_hash_for_url(self, url):
+        """
+        Return the content hash recorded for a source URL, or None.
+        """
+        raw = self.backend.get(self._url_key(url))
+        if raw is None:
+            return None
+        return json.loads(raw)["sha256"]
+
+    def resolve_variant(self, url, variant):
+        """
+        Return the key of an existing variant for a source URL without
+        downloading anything, or None if it has to be produced.
+
+        Args:
+            url (str): Source image URL.
+            variant (str): Variant name, see image_pipeline.variant_spec.
+
+        Returns:
+            str or None: Asset key of the variant.
+        """
+        memo_key = (url, variant)
+        if memo_key in self._resolved:
+            return self._resolved[memo_key]
+        content_hash = self.content_hash_for_url(url)
+        if content_hash is None:
+            return None
+        key = self.variant_key(content_hash, variant)
+        if not self.backend.exists(key):
+            return None
+        self._resolved[memo_key] = key
+        return key
+
+    def store_source(self, url, data):
+        """
+        Record downloaded source bytes and the URL that served them.
+
+        Args:
+            url (str): Source image URL.
+            data (bytes): Downloaded image.
+
+        Returns:
+            str: The content hash (hex SHA-256) of data.
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        source_key = self.source_key(content_hash)
+        if not self.backend.exists(source_key):
+            self.backend.put(source_key, data, "application/octet-stream")
+        self.backend.put(
+            self._url_key(url),
+            json.dumps({"url": url, "sha256": content_hash}).encode("utf-8"),
+            "application/json"
+        )
+        return content_hash
+
+    def store_variant(self, url, content_hash, variant, body):
+        """
+        Upload a processed variant unless an identical one already exists.
+
+        Returns:
+            str: Asset key of the variant.
+        """
+        key = self.variant_key(content_hash, variant)
+        if not self.backend.exists(key):
+            self.backend.put(key, body, "image/jpeg")
+        else:
+            logger.info("Variant already stored, skipping upload: %s", key)
+        self._resolved[(url, variant)] = key
+        return key
+
+
+_store = None
+
+
+def get_asset_store():
+    """
+    Return the process-wide asset store, creating it on first use.
+
+    Returns:
+        AssetStore: Backed by S3 when ASSET_BUCKET is set, otherwise by ASSET_DIR.
+    """
+    global _store
+    if _store is None:
+        if ASSET_BUCKET:
+            backend = S3AssetBackend(ASSET_BUCKET)
+        else:
+            backend = LocalAssetBackend(ASSET_DIR)
+        _store = AssetStore(backend)
+    return _store
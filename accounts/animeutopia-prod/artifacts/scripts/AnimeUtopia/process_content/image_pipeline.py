@@ -0,0 +1,243 @@
+import io
+import os
+import subprocess
+import time
+import logging
+
+from PIL import Image, ImageFilter, ImageOps, ImageStat
+
+try:
+    from PIL import ImageCms
+except ImportError:
+    ImageCms = None
+
+logger = logging.getLogger()
+
+COMP_WIDTH = int(os.environ.get("COMP_WIDTH", "1080"))
+COMP_HEIGHT = int(os.environ.get("COMP_HEIGHT", "1080"))
+JPEG_QUALITY = int(os.environ.get("JPEG_QUALITY", "90"))
+IMAGE_BACKEND = os.environ.get("IMAGE_BACKEND", "pillow")
+IMAGE_MAGICK_EXE = os.environ.get("IMAGE_MAGICK_EXE", "/opt/bin/magick")
+SMART_CROP = os.environ.get("SMART_CROP", "true").lower() == "true"
+GRADIENT_IMAGE_PATH = os.environ.get(
+    "GRADIENT_IMAGE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "Black Gradient.png")
+)
+
+PIPELINE_VERSION = 1
+
+_gradient_cache = {}
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def to_srgb(image):
+    """
+    Convert an image to 8-bit sRGB, honouring an embedded ICC profile.
+
+    Args:
+        image (PIL.Image.Image): Decoded image.
+
+    Returns:
+        PIL.Image.Image: RGB image in the sRGB colour space.
+    """
+    icc = image.info.get("icc_profile")
+    if icc and ImageCms is not None:
+        try:
+            source = ImageCms.ImageCmsProfile(io.BytesIO(icc))
+            target = ImageCms.createProfile("sRGB")
+            return ImageCms.profileToProfile(image, source, target, outputMode="RGB")
+        except Exception as e:
+            logger.warning("ICC conversion failed, falling back to plain RGB: %s", e)
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def saliency_centre(image):
+    """
+    Estimate where the interesting part of an image is.
+
+    Uses the edge-energy centroid of a small greyscale thumbnail, which favours
+    detailed regions such as characters' faces over flat backgrounds.
+
+    Args:
+        image (PIL.Image.Image): RGB image.
+
+    Returns:
+        tuple: Centering fractions (x, y) suitable for ImageOps.fit.
+    """
+    thumb = image.convert("L")
+    thumb.thumbnail((128, 128))
+    edges = thumb.filter(ImageFilter.FIND_EDGES)
+    width, height = edges.size
+    total = ImageStat.Stat(edges).sum[0]
+    if not total:
+        return 0.5, 0.5
+    pixels = edges.load()
+    x_weight = y_weight = 0
+    for y in range(height):
+        for x in range(width):
+            value = pixels[x, y]
+            x_weight += x * value
+            y_weight += y * value
+    return (x_weight / total) / max(width - 1, 1), (y_weight / total) / max(height - 1, 1)
+
+
+def load_gradient(size):
+    """
+    Return the comp gradient overlay resized to size, or None if unavailable.
+
+    Args:
+        size (tuple): Target (width, height).
+
+    Returns:
+        PIL.Image.Image or None: RGBA overlay.
+    """
+    if size not in _gradient_cache:
+        overlay = None
+        if GRADIENT_IMAGE_PATH and os.path.exists(GRADIENT_IMAGE_PATH):
+            overlay = Image.open(GRADIENT_IMAGE_PATH).convert("RGBA")
+            if overlay.size != size:
+                overlay = overlay.resize(size, Image.LANCZOS)
+        elif GRADIENT_IMAGE_PATH:
+            # The comp's gradient layer then stays enabled and is applied by aerender.
+            logger.warning("Gradient overlay %s not found; not pre-compositing it.", GRADIENT_IMAGE_PATH)
+        _gradient_cache[size] = overlay
+    return _gradient_cache[size]
+
+
+def convert_with_pillow(data, size):
+    """
+    Decode, colour-convert, cover-fit to size, optionally composite the comp
+    gradient and encode a progressive JPEG, all in memory.
+
+    Args:
+        data (bytes): Encoded source image.
+        size (tuple): Target (width, height).
+
+    Returns:
+        tuple: The JPEG bytes and a dict of per-step timings in milliseconds
+               plus what was applied ("centering", "gradient_applied").
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder downscale by a power of two while decoding when the
+    # source is much larger than the target.
+    image.draft("RGB", size)
+    image = ImageOps.exif_transpose(image)
+    image = to_srgb(image)
+    timings["decode_ms"] = _elapsed_ms(start)
+
+    centering = (0.5, 0.5)
+    if SMART_CROP:
+        start = time.perf_counter()
+        centering = saliency_centre(image)
+        timings["saliency_ms"] = _elapsed_ms(start)
+    timings["centering"] = [round(c, 3) for c in centering]
+
+    start = time.perf_counter()
+    image = ImageOps.fit(image, size, method=Image.LANCZOS, centering=centering)
+    timings["resize_ms"] = _elapsed_ms(start)
+
+    gradient = load_gradient(size)
+    timings["gradient_applied"] = gradient is not None
+    if gradient is not None:
+        start = time.perf_counter()
+        image = Image.alpha_composite(image.convert("RGBA"), gradient).convert("RGB")
+        timings["composite_ms"] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=JPEG_QUALITY, progressive=True, optimize=True)
+    timings["encode_ms"] = _elapsed_ms(start)
+    return output.getvalue(), timings
+
+
+def convert_with_magick(data, size):
+    """
+    Cover-fit and re-encode an image with the ImageMagick executable, piping
+    the image through stdin/stdout.
+
+    Args:
+        data (bytes): Encoded source image.
+        size (tuple): Target (width, height).
+
+    Returns:
+        tuple: The JPEG bytes and a dict of timings in milliseconds.
+    """
+    width, height = size
+    start = time.perf_counter()
+    result = subprocess.run(
+        [
+            IMAGE_MAGICK_EXE, "-", "-auto-orient",
+            "-resize", f"{width}x{height}^",
+            "-gravity", "center", "-extent", f"{width}x{height}",
+            "-interlace", "Plane", "-quality", str(JPEG_QUALITY),
+            "jpg:-"
+        ],
+        input=data,
+        capture_output=True,
+        check=True
+    )
+    return result.stdout, {"convert_ms": _elapsed_ms(start), "gradient_applied": False}
+
+
+def variant_spec(size=None, backend=None):
+    """
+    Describe the background variant the current configuration produces.
+
+    The name changes whenever the output would differ (size, backend, smart
+    crop, gradient overlay or PIPELINE_VERSION), so it can be used as a cache
+    key for processed images.
+
+    Args:
+        size (tuple): Target (width, height); defaults to COMP_WIDTH x COMP_HEIGHT.
+        backend (str): Backend name; defaults to IMAGE_BACKEND.
+
+    Returns:
+        dict: "name", "width", "height" and "gradient_applied".
+    """
+    width, height = size or (COMP_WIDTH, COMP_HEIGHT)
+    backend = backend or IMAGE_BACKEND
+    smart_crop = backend == "pillow" and SMART_CROP
+    gradient = backend == "pillow" and load_gradient((width, height)) is not None
+    name = f"bg-v{PIPELINE_VERSION}-{width}x{height}-{backend}"
+    if smart_crop:
+        name += "-sc"
+    if gradient:
+        name += "-grad"
+    return {"name": name, "width": width, "height": height, "gradient_applied": gradient}
+
+
+BACKENDS = {
+    "pillow": convert_with_pillow,
+    "magick": convert_with_magick,
+}
+
+
+def process_image(data, size=None, backend=None):
+    """
+    Convert a downloaded cover image into a comp-sized progressive JPEG.
+
+    Args:
+        data (bytes): Encoded source image.
+        size (tuple): Target (width, height); defaults to COMP_WIDTH x COMP_HEIGHT.
+        backend (str): "pillow" (default, in-process) or "magick".
+
+    Returns:
+        tuple: The JPEG bytes and a dict of per-step timings in milliseconds,
+               the output width and height and whether the gradient overlay
+               was composited in.
+    """
+    size = size or (COMP_WIDTH, COMP_HEIGHT)
+    backend = backend or IMAGE_BACKEND
+    jpeg, timings = BACKENDS[backend](data, size)
+    timings["backend"] = backend
+    timings["width"], timings["height"] = size
+    logger.info("Image processed with %s to %dx%d: %s", backend, size[0], size[1], timings)
+    return jpeg, timings
@@ -1,36 +1,37 @@
 import json
 import os
-import re
-import subprocess
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from fuzzywuzzy import fuzz, process
+
+from anilist_cache import get_cache
+from asset_store import get_asset_store
+from image_pipeline import process_image, variant_spec
+from instrumentation import instrumented, sample_payload, span, timed
+from runtime import get_session
+from template_index import get_template_index, validate_post
+from title_catalog import get_catalog
+from title_matcher import MATCH_THRESHOLD, TitleIndex, split_title
 
 ANILIST_API_URL = "https://graphql.anilist.com"
-IMAGE_MAGICK_EXE = (
-    r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI\magick.exe"
-)
+ANILIST_MAX_ALIASES = int(os.environ.get("ANILIST_MAX_ALIASES", "10"))
+ANILIST_MAX_REQUEST_BYTES = int(os.environ.get("ANILIST_MAX_REQUEST_BYTES", "16000"))
+# A batched request that is rate limited (HTTP 429) or fails server-side (5xx)
+# is resent up to ANILIST_RETRIES times, after its Retry-After or a doubling
+# delay, never longer than ANILIST_MAX_RETRY_WAIT seconds.
+ANILIST_RETRIES = int(os.environ.get("ANILIST_RETRIES", "2"))
+ANILIST_MAX_RETRY_WAIT = float(os.environ.get("ANILIST_MAX_RETRY_WAIT", "30"))
+# Covers downloaded and converted at once; downloads overlap with Pillow,
+# which releases the GIL while decoding, resizing and encoding.
+COVER_WORKERS = int(os.environ.get("COVER_WORKERS", "4"))
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-def fetch_anilist_titles_and_image(core_title):
-    """
-    Query the AniList API for an anime with the given title and retrieve title
-    variants and the cover image.
-
-    Args:
-        core_title (str): The core title to search for.
-
-    Returns:
-        tuple: A tuple containing a list of title variants and the path to the
-               downloaded (and converted) cover image.
-    """
-    query = """
-    query ($searchTitle: String) {
-      Media(type: ANIME, search: $searchTitle) {
+MEDIA_FIELDS = """
         title {
           romaji
           english
@@ -40,97 +41,359 @@ def fetch_anilist_titles_and_image(core_title):
           extraLarge
           large
           medium
-        }
-      }
-    }
+        }"""
+
+
+def parse_media(media):
+    """
+    Extract title variants and the cover image URL from an AniList Media object.
+
+    Args:
+        media (dict or None): Media object from an AniList response.
+
+    Returns:
+        tuple: A list of title variants and the cover image URL.
+    """
+    if not media:
+        return [], None
+    titles = list(filter(
+        None,
+        [
+            media["title"].get("romaji"),
+            media["title"].get("english"),
+            media["title"].get("native"),
+        ]
+    ))
+    return titles, (media.get("coverImage") or {}).get("extraLarge")
+
+
+def build_batch_query(core_titles):
+    """
+    Build one aliased GraphQL document searching for several titles at once.
+
+    Args:
+        core_titles (list): Titles to search for; alias tN maps to core_titles[N].
+
+    Returns:
+        tuple: The query string and its variables.
+    """
+    params = ", ".join(f"$s{i}: String" for i in range(len(core_titles)))
+    fields = " ".join(MEDIA_FIELDS.split())
+    selections = " ".join(
+        f"t{i}: Media(type: ANIME, search: $s{i}) {{ {fields} }}"
+        for i in range(len(core_titles))
+    )
+    query = f"query ({params}) {{ {selections} }}"
+    variables = {f"s{i}": title for i, title in enumerate(core_titles)}
+    return query, variables
+
+
+def chunk_titles(core_titles):
+    """
+    Split titles into groups that respect the alias and request size limits.
+
+    Args:
+        core_titles (list): Titles to search for.
+
+    Returns:
+        list: Lists of titles, one per request.
+    """
+    chunks = []
+    current = []
+    for title in core_titles:
+        candidate = current + [title]
+        query, variables = build_batch_query(candidate)
+        size = len(json.dumps({"query": query, "variables": variables}).encode("utf-8"))
+        if current and (len(candidate) > ANILIST_MAX_ALIASES or size > ANILIST_MAX_REQUEST_BYTES):
+            chunks.append(current)
+            current = [title]
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def query_anilist(core_title):
+    """
+    Query the AniList API for a single title.
+
+    Args:
+        core_title (str): The core title to search for.
+
+    Returns:
+        tuple: A list of title variants and the cover image URL; ([], None) if
+               AniList has no matching media.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
+    """
+    query = f"""
+    query ($searchTitle: String) {{
+      Media(type: ANIME, search: $searchTitle) {{{MEDIA_FIELDS}
+      }}
+    }}
     """
     variables = {"searchTitle": core_title}
 
-    logger.info("Sending request to AniList API with payload: %s",
-                json.dumps({"query": query, "variables": variables}, indent=4))
+    sample_payload("AniList request", {"query": query, "variables": variables})
+
+    response = get_session("anilist").post(
+        ANILIST_API_URL, json={"query": query, "variables": variables}
+    )
+    if response.status_code == 404:
+        return [], None
+    response.raise_for_status()
+    data = response.json()
+
+    sample_payload("AniList response", data)
+    return parse_media((data.get("data") or {}).get("Media"))
+
+
+def retry_wait(response, attempt):
+    """
+    Return the seconds to wait before resending a rejected AniList request.
+
+    Args:
+        response (requests.Response): The HTTP 429 or 5xx response.
+        attempt (int): Number of retries already made.
 
+    Returns:
+        float: Retry-After when it is given in seconds, otherwise 2 ** attempt;
+               at most ANILIST_MAX_RETRY_WAIT.
+    """
     try:
-        response = requests.post(
+        delay = float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        delay = 2 ** attempt
+    return max(0.0, min(delay, ANILIST_MAX_RETRY_WAIT))
+
+
+def post_anilist_batch(query, variables):
+    """
+    Send a batched AniList request, resending it while it is rate limited or
+    fails server-side, up to ANILIST_RETRIES times.
+
+    Returns:
+        requests.Response: The last response.
+
+    Raises:
+        requests.exceptions.RequestException: If the request cannot be sent.
+    """
+    for attempt in range(ANILIST_RETRIES + 1):
+        response = get_session("anilist").post(
             ANILIST_API_URL, json={"query": query, "variables": variables}
         )
-        response.raise_for_status()
-        data = response.json()
-
-        logger.info("AniList API response: %s", json.dumps(data, indent=4))
-
-        titles = []
-        image_url = None
-        media = data.get("data", {}).get("Media")
-        if media:
-            titles.extend(filter(
-                None,
-                [
-                    media["title"].get("romaji"),
-                    media["title"].get("english"),
-                    media["title"].get("native"),
-                ]
-            ))
-            image_url = media.get("coverImage", {}).get("extraLarge")
-
-        if image_url:
-            image_path = download_image(image_url)
+        if (response.status_code != 429 and response.status_code < 500) or attempt == ANILIST_RETRIES:
+            return response
+        delay = retry_wait(response, attempt)
+        logger.warning("Batched AniList request returned HTTP %s; retrying in %.1fs.",
+                       response.status_code, delay)
+        time.sleep(delay)
+
+
+@timed("anilist", "network")
+def query_anilist_batch(core_titles):
+    """
+    Resolve several titles with aliased multi-title AniList requests.
+
+    Titles are grouped by chunk_titles. Only a title whose alias comes back
+    with an error other than "not found" is retried on its own with
+    query_anilist. A request that is rate limited or fails server-side is
+    resent by post_anilist_batch instead; if it still fails, its titles stay
+    unresolved rather than being sent again as single queries, and once
+    AniList keeps rate limiting no further requests are sent.
+
+    Args:
+        core_titles (list): Distinct titles to search for.
+
+    Returns:
+        dict: Maps each resolved title to (title variants, cover image URL).
+              Titles whose request failed, or that failed even on the
+              single-query fallback, are absent.
+    """
+    results = {}
+    retry = []
+    for chunk in chunk_titles(core_titles):
+        query, variables = build_batch_query(chunk)
+        logger.info("Sending batched AniList request for %d titles.", len(chunk))
+        try:
+            response = post_anilist_batch(query, variables)
+            if response.status_code == 429:
+                logger.error("AniList is still rate limiting; not sending the remaining batches.")
+                break
+            data = response.json()
+            sample_payload("AniList batch response", data)
+        except Exception as err:
+            logger.error("Batched AniList request failed: %s", err)
+            continue
+        if response.status_code not in (200, 404) or data.get("data") is None:
+            logger.error("Batched AniList request returned HTTP %s.", response.status_code)
+            continue
+
+        failed_aliases = set()
+        for error in data.get("errors") or []:
+            path = error.get("path") or []
+            if path and error.get("status") != 404:
+                failed_aliases.add(path[0])
+
+        for i, title in enumerate(chunk):
+            alias = f"t{i}"
+            if alias in failed_aliases:
+                retry.append(title)
+            else:
+                results[title] = parse_media(data["data"].get(alias))
+
+    for title in retry:
+        try:
+            results[title] = query_anilist(title)
+        except requests.exceptions.HTTPError as http_err:
+            logger.error("HTTP error occurred: %s", http_err)
+        except Exception as err:
+            logger.error("Error occurred while fetching AniList data: %s", err)
+    return results
+
+
+def fetch_anilist_batch(core_titles):
+    """
+    Retrieve title variants and cover images for several titles. The local title
+    catalog is consulted first, then the AniList lookup cache, and only the
+    remaining titles are batched into as few AniList requests as the configured
+    limits allow. The distinct cover images are then produced concurrently,
+    COVER_WORKERS at a time.
+
+    Args:
+        core_titles (list): Core titles to search for.
+
+    Returns:
+        dict: Maps each core title to a tuple of title variants and the
+              download_image result for its cover image (or None).
+    """
+    catalog = get_catalog()
+    cache = get_cache()
+    lookups = {}
+    misses = []
+    for title in dict.fromkeys(core_titles):
+        with span("lookup_cache", "io"):
+            entry = catalog.lookup(title) if catalog else None
+            cached = cache.get(title) if entry is None else None
+        if entry is not None:
+            logger.info("Title catalog hit for: %s", title)
+            lookups[title] = entry
+            continue
+        if cached is not None:
+            logger.info("AniList cache hit for: %s", title)
+            lookups[title] = (cached["titles"], cached["image_url"])
         else:
-            image_path = None
+            misses.append(title)
+
+    if misses:
+        for title, (titles, image_url) in query_anilist_batch(misses).items():
+            cache.put(title, titles, image_url)
+            lookups[title] = (titles, image_url)
+
+    urls = list(dict.fromkeys(image_url for _, image_url in lookups.values() if image_url))
+    images = {}
+    if urls:
+        # Created here rather than by whichever worker needs it first.
+        get_asset_store()
+        with ThreadPoolExecutor(max_workers=min(COVER_WORKERS, len(urls))) as pool:
+            images = dict(zip(urls, pool.map(download_image, urls)))
+
+    results = {}
+    for title in core_titles:
+        titles, image_url = lookups.get(title, ([], None))
+        results[title] = (titles, images.get(image_url))
+    return results
 
-        return titles, image_path
-    except requests.exceptions.HTTPError as http_err:
-        logger.error("HTTP error occurred: %s", http_err)
-    except Exception as err:
-        logger.error("Error occurred while fetching AniList data: %s", err)
-    return [], None
+
+def fetch_anilist_titles_and_image(core_title):
+    """
+    Retrieve title variants and the cover image for a single title.
+
+    Args:
+        core_title (str): The core title to search for.
+
+    Returns:
+        tuple: A tuple containing a list of title variants and the asset key of
+               the converted cover image.
+    """
+    titles, image = fetch_anilist_batch([core_title])[core_title]
+    return titles, image["key"] if image else None
 
 
 def download_image(url):
     """
-    Download an image from the provided URL and convert it to a proper JPEG
-    using ImageMagick.
+    Produce the comp-sized, pre-cropped background for a cover image URL in the
+    content-addressed asset store.
+
+    If the store already holds the variant for this URL, nothing is downloaded
+    or processed. Otherwise the image is downloaded into memory, its source is
+    recorded by content hash, and the variant is produced and uploaded unless
+    an identical image from another URL already provided it.
 
     Args:
         url (str): URL of the image to download.
 
     Returns:
-        str or None: Path to the converted image file, or None if the download
-                     fails or the image is incomplete.
+        dict or None: "key" of the stored image and "background", describing
+                      the comp-fitted output (width, height, prefit,
+                      gradient_applied) or None if conversion failed and the
+                      original was kept. None if the download fails or the
+                      image is incomplete.
     """
-    file_path = os.path.join(os.getcwd(), "backgroundimage.jpg")
+    store = get_asset_store()
+    spec = variant_spec()
+    background = {
+        "width": spec["width"],
+        "height": spec["height"],
+        "prefit": True,
+        "gradient_applied": spec["gradient_applied"]
+    }
+
+    with span("asset_store", "io"):
+        key = store.resolve_variant(url, spec["name"])
+    if key:
+        logger.info("Reusing stored background %s for %s", key, url)
+        return {"key": key, "background": background}
+
     try:
         logger.info("Downloading image from: %s", url)
-        response = requests.get(url, stream=True, headers={"User-Agent": "Mozilla/5.0"})
-        response.raise_for_status()
-        with open(file_path, "wb") as f:
-            for chunk in response.iter_content(1024):
-                f.write(chunk)
-        logger.info("Image saved to: %s", file_path)
-
-        file_size = os.path.getsize(file_path)
-        logger.info("Downloaded file size: %d bytes", file_size)
-        if file_size < 1000:
-            logger.error("File size too small, likely incomplete.")
-            return None
-
-        converted_path = os.path.join(os.getcwd(), "backgroundimage_converted.jpg")
-        try:
-            subprocess.run(
-                [IMAGE_MAGICK_EXE, file_path, converted_path],
-                check=True
-            )
-            logger.info("Converted image saved to: %s", converted_path)
-            return converted_path
-        except subprocess.CalledProcessError as cpe:
-            logger.error("ImageMagick conversion failed: %s", cpe)
-            return file_path
-        except Exception as e:
-            logger.error("Unexpected error during image conversion: %s", e)
-            return file_path
+        start = time.perf_counter()
+        with span("image_download", "network"):
+            response = get_session("covers").get(url, headers={"User-Agent": "Mozilla/5.0"})
+            response.raise_for_status()
+            data = response.content
+        download_ms = round((time.perf_counter() - start) * 1000, 2)
+        logger.info("Downloaded %d bytes in %.2f ms", len(data), download_ms)
     except Exception as e:
         logger.error("Failed to download image: %s", e)
         return None
 
+    if len(data) < 1000:
+        logger.error("File size too small, likely incomplete.")
+        return None
+
+    with span("asset_store", "io"):
+        content_hash = store.store_source(url, data)
+        key = store.resolve_variant(url, spec["name"])
+    if key:
+        logger.info("Identical image already processed, reusing %s", key)
+        return {"key": key, "background": background}
+
+    try:
+        with span("image_convert"):
+            jpeg, details = process_image(data)
+    except Exception as e:
+        logger.error("Image conversion failed, keeping original: %s", e)
+        return {"key": store.source_key(content_hash), "background": None}
+
+    with span("asset_store", "io"):
+        key = store.store_variant(url, content_hash, spec["name"], jpeg)
+    logger.info("Converted image stored as: %s (details: %s)", key,
+                dict(details, download_ms=download_ms))
+    return {"key": key, "background": background}
+
 
 def extract_core_title_and_description(full_title, anime_titles):
     """
@@ -144,29 +407,17 @@ def extract_core_title_and_description(full_title, anime_titles):
     Returns:
         tuple: A tuple containing the core title and the extracted description.
     """
-    separators = [
-        " Anime ", " Gets ", " Announces ", " Reveals ", " Confirmed ",
-        " Premieres ", " Debuts ", " Trailer ", " English Dub "
-    ]
-    separator_pattern = "(" + "|".join(map(re.escape, separators)) + ")"
-    match = re.search(separator_pattern, full_title, flags=re.IGNORECASE)
-
-    if match:
-        core_title = full_title[:match.start()].strip()
-        description = full_title[match.start():].strip()
-    else:
-        core_title = full_title.strip()
-        description = ""
+    core_title, description = split_title(full_title)
 
     logger.info("Core Title for fuzzy matching: %s", core_title)
     logger.info("Extracted Description: %s", description)
 
-    match_result = process.extractOne(core_title, anime_titles, scorer=fuzz.partial_ratio)
+    match_result = TitleIndex(anime_titles).best_match(core_title)
     if match_result:
         title, score = match_result
         logger.info("Matching '%s' with AniList titles: '%s' (Score: %d)",
                     core_title, title, score)
-        if score > 80:
+        if score > MATCH_THRESHOLD:
             core_title = title
     else:
         logger.info("No fuzzy match found for: %s", core_title)
@@ -174,26 +425,23 @@ def extract_core_title_and_description(full_title, anime_titles):
     return core_title, description
 
 
-def lambda_handler(event, context):
+def process_post(post, lookup):
     """
-    Process the content of an anime post by querying AniList and downloading an image.
+    Apply an AniList lookup result to a single post.
+
+    The comp-fitted background description is recorded under "background" so
+    the After Effects script can place the image at 100% without rescaling.
 
     Args:
-        event (dict): Event data containing a 'post' key with post details.
-        context (object): Lambda context object.
+        post (dict): Post details with at least a title.
+        lookup (tuple): Title variants and the download_image result for the
+                        post's cover image.
 
     Returns:
-        dict: Dictionary with the processed post details.
+        dict: The updated post.
     """
-    post = event.get("post")
-    if not post:
-        post = event.get("rssData", {}).get("post", {})
-
     full_title = post.get("title", "")
-    if not full_title:
-        return {"status": "error", "error": "No title provided in post."}
-
-    anime_titles, image_path = fetch_anilist_titles_and_image(full_title)
+    anime_titles, image = lookup
     if not anime_titles:
         logger.info("No anime titles returned from AniList; defaulting to full title.")
         anime_titles = [full_title]
@@ -201,6 +449,72 @@ def lambda_handler(event, context):
 
     post["title"] = core_title if core_title else full_title
     post["description"] = description if description else post.get("description", "")
-    post["image_path"] = image_path
-    
-    return {"status": "processed", "post": post}
\ No newline at end of file
+    post["image_key"] = image["key"] if image else None
+    post["background"] = image["background"] if image else None
+    return post
+
+
+@instrumented("process_content")
+def lambda_handler(event, context):
+    """
+    Process anime posts by querying AniList and downloading their images.
+
+    A batch under 'posts' (as emitted by fetch_rss) is resolved with a single
+    batched AniList lookup; otherwise the single 'post' is processed.
+
+    Each processed post is checked against the published template index
+    (see template_index.py) and the result recorded under "template_check".
+    Posts with errors are not passed on to rendering but listed under
+    'rejected'; without an index every post is passed on unchecked.
+
+    Args:
+        event (dict): Event data containing a 'post' key with post details,
+                      and optionally a 'posts' batch.
+        context (object): Lambda context object.
+
+    Returns:
+        dict: Dictionary with the processed post details, plus the whole batch
+              under 'posts' when one was supplied, the rejected posts
+              under 'rejected' and the invocation's timing under 'trace'
+              (AniList, image download and conversion, asset store).
+    """
+    rss_data = event.get("rssData", {})
+    posts = event.get("posts") or rss_data.get("posts")
+    if not posts:
+        post = event.get("post")
+        if not post:
+            post = rss_data.get("post", {})
+        posts = [post]
+
+    posts = [p for p in posts if p.get("title")]
+    if not posts:
+        return {"status": "error", "error": "No title provided in post."}
+
+    lookup_titles = [split_title(p["title"])[0] or p["title"] for p in posts]
+    lookups = fetch_anilist_batch(lookup_titles)
+    logger.info("AniList cache stats: %s", get_cache().stats)
+
+    processed = [
+        process_post(post, lookups[title]) for post, title in zip(posts, lookup_titles)
+    ]
+
+    with span("template_index", "io"):
+        index = get_template_index()
+    accepted, rejected = [], []
+    for post in processed:
+        if index is not None:
+            post["template_check"] = validate_post(post, index)
+            if post["template_check"]["errors"]:
+                logger.warning("Rejecting '%s': %s", post.get("title"), post["template_check"]["errors"])
+                rejected.append(post)
+                continue
+        accepted.append(post)
+    if not accepted:
+        return {"status": "error", "error": "No post passed the template check.", "rejected": rejected}
+
+    result = {"status": "processed", "post": accepted[0]}
+    if len(accepted) > 1:
+        result["posts"] = accepted
+    if rejected:
+        result["rejected"] = rejected
+    return result
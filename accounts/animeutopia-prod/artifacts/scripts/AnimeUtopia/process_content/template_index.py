@@ -0,0 +1,155 @@
+import json
+import os
+import time
+import logging
+
+from botocore.exceptions import ClientError
+
+from runtime import get_client
+
+logger = logging.getLogger()
+
+TEMPLATE_INDEX_BUCKET = os.environ.get("TEMPLATE_INDEX_BUCKET")
+TEMPLATE_INDEX_KEY = os.environ.get("TEMPLATE_INDEX_KEY", "templates/anime_template/index.json")
+TEMPLATE_INDEX_FILE = os.environ.get("TEMPLATE_INDEX_FILE", "/tmp/template_index.json")
+TEMPLATE_INDEX_TTL = int(os.environ.get("TEMPLATE_INDEX_TTL", "300"))
+TEMPLATE_COMP = os.environ.get("TEMPLATE_COMP", "standard-news-template")
+
+# Post fields and the template layers the After Effects script writes them to.
+FIELD_LAYERS = {
+    "title": "Title",
+    "description": "Description",
+    "background": "BackgroundImage",
+}
+REQUIRED_FIELDS = ("title",)
+TEXT_FIELDS = ("title", "description")
+
+# Rough glyph metrics, as fractions of the font size, used to estimate how
+# much text fits a paragraph box.
+GLYPH_WIDTH = 0.55
+LINE_HEIGHT = 1.2
+
+
+def text_capacity(layer):
+    """
+    Estimate how many characters fit a text layer's paragraph box.
+
+    Args:
+        layer (dict): Layer entry from the template index.
+
+    Returns:
+        int or None: Approximate character capacity, or None for point text
+                     (no box) or when the index lacks the metrics.
+    """
+    box = layer.get("box")
+    font_size = layer.get("font_size")
+    if not box or not font_size:
+        return None
+    per_line = int(box[0] // (font_size * GLYPH_WIDTH))
+    lines = int(box[1] // (font_size * LINE_HEIGHT))
+    return max(per_line, 0) * max(lines, 0)
+
+
+def validate_post(post, index, comp_name=TEMPLATE_COMP):
+    """
+    Check a post against the template index before it is queued for render.
+
+    Errors make the render fail or come out wrong: the comp or a layer a
+    required field is written to is missing, a required field is empty, or a
+    text field is bound to a layer that is not a text layer. Warnings are
+    worth a look but render: text longer than its box is estimated to hold,
+    a background that will be rescaled, or no background at all.
+
+    Args:
+        post (dict): Processed post.
+        index (dict): Template index as built by template_index.jsx.
+        comp_name (str): Name of the comp the post is rendered with.
+
+    Returns:
+        dict: "errors" and "warnings" lists of messages.
+    """
+    errors, warnings = [], []
+    comp = (index.get("comps") or {}).get(comp_name)
+    if comp is None:
+        return {"errors": [f"Template has no comp '{comp_name}'."], "warnings": []}
+
+    layers = comp.get("layers") or {}
+    for field, layer_name in FIELD_LAYERS.items():
+        layer = layers.get(layer_name)
+        required = field in REQUIRED_FIELDS
+        if layer is None:
+            (errors if required else warnings).append(f"Template has no layer '{layer_name}' for {field}.")
+            continue
+        if field in TEXT_FIELDS and layer.get("kind") != "text":
+            errors.append(f"Layer '{layer_name}' for {field} is not a text layer.")
+            continue
+
+        value = post.get(field)
+        if required and not value:
+            errors.append(f"Post has no {field}.")
+        elif field in TEXT_FIELDS and value:
+            capacity = text_capacity(layer)
+            if capacity is not None and len(value) > capacity:
+                warnings.append(
+                    f"{field} has {len(value)} characters; '{layer_name}' holds about {capacity}."
+                )
+
+    background = post.get("background")
+    if not post.get("image_key"):
+        warnings.append("Post has no background image.")
+    elif background and (background.get("width"), background.get("height")) != (
+        comp.get("width"), comp.get("height")
+    ):
+        warnings.append(
+            f"Background is {background.get('width')}x{background.get('height')}, "
+            f"comp is {comp.get('width')}x{comp.get('height')}; it will be rescaled."
+        )
+    return {"errors": errors, "warnings": warnings}
+
+
+def _load_s3(bucket, key):
+    try:
+        response = get_client("s3").get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(response["Body"].read())
+
+
+def _load_file(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+_index = None
+_loaded_at = 0.0
+
+
+def get_template_index():
+    """
+    Return the published template index, reloading it every TEMPLATE_INDEX_TTL
+    seconds so a new template version is picked up by warm containers.
+
+    Returns:
+        dict or None: Index read from TEMPLATE_INDEX_BUCKET, or from
+                      TEMPLATE_INDEX_FILE when no bucket is configured; None
+                      if it has not been published or cannot be read.
+    """
+    global _index, _loaded_at
+    now = time.time()
+    if _loaded_at and now - _loaded_at < TEMPLATE_INDEX_TTL:
+        return _index
+    try:
+        if TEMPLATE_INDEX_BUCKET:
+            index = _load_s3(TEMPLATE_INDEX_BUCKET, TEMPLATE_INDEX_KEY)
+        else:
+            index = _load_file(TEMPLATE_INDEX_FILE)
+    except Exception as e:
+        logger.warning("Template index unavailable: %s", e)
+        index = _index
+    _index, _loaded_at = index, now
+    return _index
@@ -0,0 +1,211 @@
+"""
+Compact on-disk anime title catalog for offline enrichment.
+
+File layout (little-endian):
+
+    header      "<8sIIII"  magic, key count, media count,
+                           key table offset, media table offset
+    key table   key count x "<III"  string offset, string length, media index,
+                           sorted by the UTF-8 bytes of the normalized key
+    media table media count x "<II" record offset, record length
+    string pool normalized keys and media records; a record is the title
+                variants and the cover URL joined with US (0x1f)
+
+The Lambda memory-maps the file and binary-searches the key table in place,
+so nothing is deserialized except the record of a matching title.
+
+Build a catalog from an AniList export (a JSON array or JSON lines of Media
+objects, or of {"titles": [...], "image_url": ...} records):
+
+    python title_catalog.py anilist_export.json anime_catalog.bin
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import logging
+
+from title_matcher import normalize
+
+logger = logging.getLogger()
+
+MAGIC = b"FMCAT001"
+HEADER = struct.Struct("<8sIIII")
+KEY_ENTRY = struct.Struct("<III")
+MEDIA_ENTRY = struct.Struct("<II")
+FIELD_SEP = "\x1f"
+
+CATALOG_PATH = os.environ.get(
+    "TITLE_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "anime_catalog.bin")
+)
+
+
+def _media_record(item):
+    """Return (title variants, cover URL) from an AniList Media or plain record."""
+    if "titles" in item:
+        titles = [t for t in item["titles"] if t]
+        return titles, item.get("image_url")
+    title = item.get("title") or {}
+    titles = [t for t in (title.get("romaji"), title.get("english"), title.get("native")) if t]
+    titles += [t for t in item.get("synonyms") or [] if t]
+    cover = (item.get("coverImage") or {}).get("extraLarge")
+    return titles, cover
+
+
+def build_catalog(items, path):
+    """
+    Write a catalog file from an iterable of media records.
+
+    Args:
+        items (iterable): AniList Media objects or {"titles", "image_url"} dicts.
+        path (str): Destination file.
+
+    Returns:
+        tuple: Number of keys and number of media written.
+    """
+    media = []
+    keys = {}
+    for item in items:
+        titles, cover = _media_record(item)
+        if not titles:
+            continue
+        media_index = len(media)
+        media.append(FIELD_SEP.join(titles + [cover or ""]).encode("utf-8"))
+        for title in titles:
+            key = normalize(title).encode("utf-8")
+            if key:
+                keys.setdefault(key, media_index)
+
+    sorted_keys = sorted(keys.items())
+    key_table_offset = HEADER.size
+    media_table_offset = key_table_offset + KEY_ENTRY.size * len(sorted_keys)
+    pool_offset = media_table_offset + MEDIA_ENTRY.size * len(media)
+
+    pool = bytearray()
+    key_table = bytearray()
+    for key, media_index in sorted_keys:
+        key_table += KEY_ENTRY.pack(pool_offset + len(pool), len(key), media_index)
+        pool += key
+    media_table = bytearray()
+    for record in media:
+        media_table += MEDIA_ENTRY.pack(pool_offset + len(pool), len(record))
+        pool += record
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(sorted_keys), len(media),
+                            key_table_offset, media_table_offset))
+        f.write(key_table)
+        f.write(media_table)
+        f.write(pool)
+    os.replace(tmp_path, path)
+    return len(sorted_keys), len(media)
+
+
+class TitleCatalog:
+    """
+    Read-only, memory-mapped view of a catalog file.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.key_count, self.media_count, self._keys_at, self._media_at = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"Not a title catalog: {path}")
+
+    def __len__(self):
+        return self.key_count
+
+    def _key(self, position):
+        offset, length, media_index = KEY_ENTRY.unpack_from(
+            self._map, self._keys_at + position * KEY_ENTRY.size
+        )
+        return self._map[offset:offset + length], media_index
+
+    def _media(self, media_index):
+        offset, length = MEDIA_ENTRY.unpack_from(
+            self._map, self._media_at + media_index * MEDIA_ENTRY.size
+        )
+        fields = self._map[offset:offset + length].decode("utf-8").split(FIELD_SEP)
+        return fields[:-1], fields[-1] or None
+
+    def lookup(self, title):
+        """
+        Find a title by exact normalized match.
+
+        Args:
+            title (str): Core title to look up.
+
+        Returns:
+            tuple or None: (title variants, cover image URL) if found.
+        """
+        target = normalize(title).encode("utf-8")
+        if not target:
+            return None
+        low, high = 0, self.key_count
+        while low < high:
+            mid = (low + high) // 2
+            key, media_index = self._key(mid)
+            if key < target:
+                low = mid + 1
+            elif key > target:
+                high = mid
+            else:
+                return self._media(media_index)
+        return None
+
+    def close(self):
+        self._map.close()
+
+
+_catalog = None
+_catalog_loaded = False
+
+
+def get_catalog():
+    """
+    Return the process-wide catalog, or None if no catalog file is deployed.
+
+    Returns:
+        TitleCatalog or None: Catalog mapped from TITLE_CATALOG_PATH.
+    """
+    global _catalog, _catalog_loaded
+    if not _catalog_loaded:
+        _catalog_loaded = True
+        if os.path.exists(CATALOG_PATH):
+            try:
+                _catalog = TitleCatalog(CATALOG_PATH)
+                logger.info("Loaded title catalog with %d keys.", len(_catalog))
+            except Exception as e:
+                logger.error("Failed to open title catalog %s: %s", CATALOG_PATH, e)
+    return _catalog
+
+
+def _read_items(path):
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from json.load(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an anime title catalog.")
+    parser.add_argument("source", help="AniList export as a JSON array or JSON lines.")
+    parser.add_argument("output", help="Catalog file to write.")
+    args = parser.parse_args()
+    key_count, media_count = build_catalog(_read_items(args.source), args.output)
+    print(f"Wrote {key_count} keys for {media_count} titles to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import re
+from collections import Counter, defaultdict
+
+from rapidfuzz import fuzz, process
+
+SEPARATORS = [
+    " Anime ", " Gets ", " Announces ", " Reveals ", " Confirmed ",
+    " Premieres ", " Debuts ", " Trailer ", " English Dub "
+]
+SEPARATOR_RE = re.compile(
+    "(" + "|".join(map(re.escape, SEPARATORS)) + ")", flags=re.IGNORECASE
+)
+NORMALIZE_RE = re.compile(r"[\W_]+")
+
+NGRAM_SIZE = 3
+SHORTLIST_SIZE = 32
+MATCH_THRESHOLD = 80
+
+
+def split_title(full_title):
+    """
+    Split a headline into the core title and the remaining description at the
+    first common separator.
+
+    Args:
+        full_title (str): The full title string.
+
+    Returns:
+        tuple: A tuple containing the core title and the description.
+    """
+    match = SEPARATOR_RE.search(full_title)
+    if match:
+        return full_title[:match.start()].strip(), full_title[match.start():].strip()
+    return full_title.strip(), ""
+
+
+def normalize(title):
+    """
+    Normalize a title for indexing and scoring.
+
+    Args:
+        title (str): Title to normalize.
+
+    Returns:
+        str: Lower-cased title with punctuation and whitespace collapsed.
+    """
+    return NORMALIZE_RE.sub(" ", (title or "").casefold()).strip()
+
+
+def ngrams(text, size=NGRAM_SIZE):
+    """
+    Return the set of character n-grams of a normalized string, padded so that
+    short titles still produce at least one gram.
+    """
+    padded = f" {text} "
+    if len(padded) <= size:
+        return {padded}
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
+
+
+class TitleIndex:
+    """
+    Catalog of known anime titles with a character n-gram inverted index.
+
+    Fuzzy matching first shortlists the catalog entries sharing the most
+    n-grams with the query and only scores that shortlist with partial_ratio,
+    instead of scoring every title in the catalog.
+    """
+
+    def __init__(self, titles, shortlist_size=SHORTLIST_SIZE):
+        self.titles = list(dict.fromkeys(t for t in titles if t))
+        self.normalized = [normalize(t) for t in self.titles]
+        self.shortlist_size = shortlist_size
+        self._postings = defaultdict(list)
+        for title_id, text in enumerate(self.normalized):
+            for gram in ngrams(text):
+                self._postings[gram].append(title_id)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def shortlist(self, query):
+        """
+        Return ids of the catalog titles sharing the most n-grams with query.
+
+        Args:
+            query (str): Normalized query string.
+
+        Returns:
+            list: Candidate title ids, best first.
+        """
+        if len(self.titles) <= self.shortlist_size:
+            return list(range(len(self.titles)))
+        counts = Counter()
+        for gram in ngrams(query):
+            counts.update(self._postings.get(gram, ()))
+        return [title_id for title_id, _ in counts.most_common(self.shortlist_size)]
+
+    def best_match(self, query):
+        """
+        Find the best fuzzy match for a single core title.
+
+        Args:
+            query (str): Core title to match.
+
+        Returns:
+            tuple or None: (catalog title, score), or None if nothing scored.
+        """
+        normalized = normalize(query)
+        candidates = self.shortlist(normalized)
+        if not candidates:
+            return None
+        choices = [self.normalized[i] for i in candidates]
+        result = process.extractOne(normalized, choices, scorer=fuzz.partial_ratio)
+        if result is None:
+            return None
+        _, score, position = result
+        return self.titles[candidates[position]], score
+
+    def match_many(self, queries, threshold=MATCH_THRESHOLD):
+        """
+        Resolve many core titles in one call.
+
+        Duplicate queries are scored once. Queries without a match above the
+        threshold resolve to None.
+
+        Args:
+            queries (list): Core titles to match.
+            threshold (int): Minimum partial_ratio score to accept a match.
+
+        Returns:
+            list: (catalog title, score) or None for each query, in order.
+        """
+        resolved = {}
+        for query in dict.fromkeys(queries):
+            match = self.best_match(query)
+            resolved[query] = match if match and match[1] > threshold else None
+        return [resolved[q] for q in queries]
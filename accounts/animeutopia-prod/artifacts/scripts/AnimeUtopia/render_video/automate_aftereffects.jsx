@@ -1,79 +1,84 @@
 #include "json2.jsx"
+#include "template_index.jsx"
 
 function logMessage(level, msg) {
     var t = new Date().toISOString();
     $.writeln("[" + level + " " + t + "] " + msg);
 }
 
-function downloadFromUrl(url, localPath) {
+function readTextFile(path) {
+    var f = new File(path);
+    if (!f.exists) {
+        return null;
+    }
+    f.encoding = "UTF-8";
+    if (!f.open("r")) {
+        return null;
+    }
+    var content = f.read();
+    f.close();
+    return content;
+}
+
+function readJsonFile(path) {
+    var raw = readTextFile(path);
+    if (raw === null) {
+        logMessage("ERROR", "File not found or unreadable: " + path);
+        return null;
+    }
     try {
-        logMessage("INFO", "Attempting download: " + url);
-        var s = new Socket();
-        var urlParts = url.split("://");
-        if (urlParts.length < 2) {
-            throw new Error("Invalid URL format: " + url);
-        }
-        var hostAndPath = urlParts[1].split("/");
-        var host = hostAndPath.shift();
-        var path = "/" + hostAndPath.join("/");
-
-        if (s.open(host + ":80", "BINARY")) {
-            var request = "GET " + path + " HTTP/1.0\r\nHost: " + host + "\r\n\r\n";
-            s.write(request);
-            var response = s.read(999999);
-            s.close();
-            var parts = response.split("\r\n\r\n");
-            if (parts.length < 2) {
-                throw new Error("Invalid HTTP response.");
-            }
-            var content = parts.slice(1).join("\r\n\r\n");
-            var f = new File(localPath);
-            if (!f.open("w")) {
-                throw new Error("Failed to open local file for writing: " + localPath);
-            }
-            f.write(content);
-            f.close();
-            logMessage("INFO", "File downloaded: " + localPath);
-            return true;
-        } else {
-            throw new Error("Unable to open socket: " + host);
-        }
-    } catch (e) {
-        logMessage("ERROR", "Download failed: " + e.message);
-        return false;
+        return JSON.parse(raw);
+    } catch (ex) {
+        logMessage("ERROR", "JSON parse error in " + path + ": " + ex.message);
+        return null;
     }
 }
 
-function doJsonUpdates() {
-    var presignedUrl = $.getenv("PRESIGNED_URL");
-    if (!presignedUrl) {
-        logMessage("WARN", "No PRESIGNED_URL found in environment. Skipping JSON updates.");
-        return;
+// The render job runner stages the post JSON and assets into a local bundle
+// (bundle.json lists them) before aerender starts; nothing is downloaded here.
+function loadBundlePost() {
+    var bundleDir = $.getenv("RENDER_BUNDLE_DIR");
+    if (!bundleDir) {
+        logMessage("WARN", "No RENDER_BUNDLE_DIR found in environment. Skipping JSON updates.");
+        return null;
+    }
+    bundleDir = bundleDir.replace(/\\/g, "/");
+    var bundle = readJsonFile(bundleDir + "/bundle.json");
+    if (!bundle || !bundle.posts || !bundle.posts.length) {
+        logMessage("ERROR", "No posts in bundle at " + bundleDir);
+        return null;
     }
-    logMessage("INFO", "Got PRESIGNED_URL: " + presignedUrl);
 
-    var localJsonPath = "C:/animeutopia/output/most_recent_post.json";
-    if (!downloadFromUrl(presignedUrl, localJsonPath)) {
-        logMessage("ERROR", "Failed to download JSON from " + presignedUrl);
-        return;
+    var wanted = $.getenv("RENDER_POST_ID");
+    var entry = null;
+    for (var i = 0; i < bundle.posts.length; i++) {
+        if (!wanted || bundle.posts[i].post_id === wanted) {
+            entry = bundle.posts[i];
+            break;
+        }
+    }
+    if (!entry) {
+        logMessage("ERROR", "Post " + wanted + " is not in the bundle.");
+        return null;
     }
 
-    var jsonFile = new File(localJsonPath);
-    if (!jsonFile.exists) {
-        logMessage("ERROR", "JSON file does not exist after download.");
-        return;
+    var postData = readJsonFile(bundleDir + "/" + entry.post);
+    if (!postData) {
+        return null;
     }
-    jsonFile.open("r");
-    var rawData = jsonFile.read();
-    jsonFile.close();
+    logMessage("INFO", "Post " + entry.post_id + " loaded from bundle (" + bundle.posts.length + " posts).");
+    return {
+        post: postData,
+        background: entry.background ? bundleDir + "/" + entry.background : null
+    };
+}
 
-    var postData;
-    try {
-        postData = JSON.parse(rawData);
-    } catch (ex) {
-        logMessage("ERROR", "JSON parse error: " + ex.message);
+function doJsonUpdates() {
+    var staged = loadBundlePost();
+    if (!staged) {
         return;
     }
+    var postData = staged.post;
     logMessage("INFO", "JSON loaded. Title=" + postData.title);
 
     if (!app.project.file) {
@@ -82,22 +87,34 @@ function doJsonUpdates() {
     }
 
     var compName = "standard-news-template";
-    var comp = null;
-    for (var i = 1; i <= app.project.items.length; i++) {
-        var it = app.project.items[i];
-        if (it instanceof CompItem && it.name === compName) {
-            comp = it;
-            break;
+    // Direct lookups through the template index; the project is scanned only
+    // when the index is missing or was built for another template version.
+    var index = loadTemplateIndex();
+    var comp = indexedComp(index, compName);
+    if (comp) {
+        logMessage("INFO", "Comp found through the template index.");
+    } else {
+        index = null;
+        for (var i = 1; i <= app.project.numItems; i++) {
+            var it = app.project.item(i);
+            if (it instanceof CompItem && it.name === compName) {
+                comp = it;
+                break;
+            }
+        }
+        if (!comp) {
+            logMessage("ERROR", "Comp not found: " + compName);
+            return;
+        }
+        var indexPath = $.getenv("RENDER_TEMPLATE_INDEX");
+        if (indexPath && $.getenv("RENDER_TEMPLATE_HASH")) {
+            writeTemplateIndex(indexPath, buildTemplateIndex(app.project));
         }
-    }
-    if (!comp) {
-        logMessage("ERROR", "Comp not found: " + compName);
-        return;
     }
 
-    var titleLayer = comp.layer("Title");
-    var descLayer  = comp.layer("Description");
-    var bgLayer    = comp.layer("BackgroundImage");
+    var titleLayer = indexedLayer(comp, index, "Title");
+    var descLayer  = indexedLayer(comp, index, "Description");
+    var bgLayer    = indexedLayer(comp, index, "BackgroundImage");
 
     if (titleLayer) {
         titleLayer.property("Source Text").setValue(postData.title || "No Title");
@@ -107,8 +124,8 @@ function doJsonUpdates() {
     }
     logMessage("INFO", "Text layers updated.");
 
-    if (bgLayer) {
-        var bgFile = new File("C:/animeutopia/output/backgroundimage_converted.jpg");
+    if (bgLayer && staged.background) {
+        var bgFile = new File(staged.background);
         if (bgFile.exists) {
             logMessage("INFO", "Replacing background with: " + bgFile.fsName);
             var importOpts = new ImportOptions(bgFile);
@@ -116,13 +133,26 @@ function doJsonUpdates() {
             bgLayer.replaceSource(newFootage, false);
 
             var compW = comp.width, compH = comp.height;
-            var lyW   = bgLayer.source.width, lyH = bgLayer.source.height;
-            var scaleX = (compW / lyW) * 100;
-            var scaleY = (compH / lyH) * 100;
-            var scaleVal = Math.max(scaleX, scaleY);
-            bgLayer.transform.scale.setValue([scaleVal, scaleVal]);
-            bgLayer.transform.position.setValue([compW / 2, compH / 2]);
-            logMessage("INFO", "Background replaced & scaled.");
+            var bg = postData.background;
+            if (bg && bg.prefit && bg.width === compW && bg.height === compH) {
+                bgLayer.transform.scale.setValue([100, 100]);
+                bgLayer.transform.position.setValue([compW / 2, compH / 2]);
+                logMessage("INFO", "Background replaced (pre-fitted, placed at 100%).");
+
+                var gradientLayer = comp.layer("Black Gradient");
+                if (bg.gradient_applied && gradientLayer) {
+                    gradientLayer.enabled = false;
+                    logMessage("INFO", "Gradient pre-composited; layer disabled.");
+                }
+            } else {
+                var lyW   = bgLayer.source.width, lyH = bgLayer.source.height;
+                var scaleX = (compW / lyW) * 100;
+                var scaleY = (compH / lyH) * 100;
+                var scaleVal = Math.max(scaleX, scaleY);
+                bgLayer.transform.scale.setValue([scaleVal, scaleVal]);
+                bgLayer.transform.position.setValue([compW / 2, compH / 2]);
+                logMessage("INFO", "Background replaced & scaled.");
+            }
         }
     }
 
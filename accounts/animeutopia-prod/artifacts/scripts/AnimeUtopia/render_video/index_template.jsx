@@ -0,0 +1,31 @@
+// Offline template indexer. Run once per template version on the render
+// host through Update-TemplateIndex (render_job.ps1), which runs
+//
+//   AfterFX.exe -noui -r index_template.jsx
+//
+// with RENDER_TEMPLATE_PATH, RENDER_TEMPLATE_INDEX and the template
+// fingerprint (RENDER_TEMPLATE_HASH/SIZE/MTIME) set.
+#include "json2.jsx"
+#include "template_index.jsx"
+
+function logMessage(level, msg) {
+    var t = new Date().toISOString();
+    $.writeln("[" + level + " " + t + "] " + msg);
+}
+
+(function main() {
+    var projectPath = $.getenv("RENDER_TEMPLATE_PATH");
+    var indexPath = $.getenv("RENDER_TEMPLATE_INDEX");
+    if (!projectPath || !indexPath) {
+        logMessage("ERROR", "RENDER_TEMPLATE_PATH and RENDER_TEMPLATE_INDEX must be set.");
+        return;
+    }
+    var project = app.open(new File(projectPath));
+    if (!project) {
+        logMessage("ERROR", "Cannot open template: " + projectPath);
+        return;
+    }
+    writeTemplateIndex(indexPath, buildTemplateIndex(project));
+    project.close(CloseOptions.DO_NOT_SAVE_CHANGES);
+    app.quit();
+})();
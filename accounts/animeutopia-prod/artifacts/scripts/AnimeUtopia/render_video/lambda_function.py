@@ -1,97 +1,702 @@
 import os
 import json
 import logging
-import boto3
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
+from drain_lease import acquire_lease, get_lease_store, release_lease
+from instrumentation import instrumented, record, span
+from output_presets import ffmpeg_args, resolve_outputs
+from post_store import load_post
+from readiness import ssm_ping_statuses, wait_until, wait_until_ready
+from render_queue import RENDER_QUEUE_URL, complete_job, extend_job, receive_job
+from render_scheduler import RenderScheduler, render_pool
+from run_manifest import get_run_id, manifest_key, run_key
+from runtime import get_client
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+RENDER_JOB_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "render_job.ps1")
+RENDER_TIMEOUT = int(os.environ.get("RENDER_TIMEOUT", "840"))
+RESULT_MARKER = "RENDER_JOB_RESULT "
+# Seconds of Lambda time kept back for reporting after the render wait.
+WAIT_MARGIN = 15
+# Queue mode: stop once no job has arrived for this many seconds, and do not
+# start a job with less than RENDER_JOB_BUDGET seconds of Lambda time left.
+RENDER_QUEUE_IDLE = int(os.environ.get("RENDER_QUEUE_IDLE", "60"))
+RENDER_JOB_BUDGET = int(os.environ.get("RENDER_JOB_BUDGET", "300"))
+# Queue mode renders on a pool of instances (INSTANCE_ID alone by default).
+RENDER_INSTANCE_CONCURRENCY = int(os.environ.get("RENDER_INSTANCE_CONCURRENCY", "1"))
+RENDER_PLACEMENT = os.environ.get("RENDER_PLACEMENT", "least_loaded")
+RENDER_MAX_ATTEMPTS = int(os.environ.get("RENDER_MAX_ATTEMPTS", "2"))
+# Seconds between SSM command polls and between pool health checks.
+POLL_INTERVAL = 5
+HEALTH_REFRESH = 30
+
+PROJECT_PATH = "C:\\animeutopia\\anime_template.aep"
+COMP_NAME = "standard-news-template"
+OUTPUT_DIR = "C:\\animeutopia\\output"
+VIDEO_NAME = "anime_post.mp4"
+PROJECT_EXPORT_NAME = "anime_template_exported.aep"
+# Output file on the render host -> object name within the run.
+ARTIFACT_NAMES = {
+    VIDEO_NAME: "anime_post.mp4",
+    PROJECT_EXPORT_NAME: "exports/anime_template_exported.aep",
+}
+
+UPLOAD_PART_SIZE_MB = int(os.environ.get("UPLOAD_PART_SIZE_MB", "16"))
+UPLOAD_MAX_CONCURRENCY = int(os.environ.get("UPLOAD_MAX_CONCURRENCY", "10"))
+FFMPEG_PATH = os.environ.get("FFMPEG_PATH", "ffmpeg.exe")
+# Where the runner publishes the template index it rebuilt after the template changed.
+TEMPLATE_INDEX_KEY = os.environ.get("TEMPLATE_INDEX_KEY", "templates/anime_template/index.json")
+
+# Runner timings -> span of the trace they are recorded as, and its kind.
+RUNNER_SPANS = {
+    "queue_ms": ("ssm_dispatch", "wait"),
+    "stage_ms": ("bundle_stage", "network"),
+    "template_ms": ("template_index", "io"),
+    "render_ms": ("aerender", "subprocess"),
+    "transcode_ms": ("transcode", "subprocess"),
+    "upload_after_render_ms": ("upload_tail", "network"),
+}
+
+TERMINAL_COMMAND_STATUSES = ("Success", "Failed", "Cancelled", "TimedOut")
+NODE_FAULT_STATUSES = ("Cancelled", "TimedOut")
+
 def default_serializer(o):
     if isinstance(o, datetime):
         return o.isoformat()
     raise TypeError(f"Type {type(o)} not serializable")
 
-def wait_for_ssm_registration(ssm_client, instance_id, timeout=300, interval=10):
-    waited = 0
-    while waited < timeout:
-        info = ssm_client.describe_instance_information()
-        registered_ids = [
-            i["InstanceId"]
-            for i in info.get("InstanceInformationList", [])
-            if i.get("PingStatus") == "Online"
-        ]
-        if instance_id in registered_ids:
-            logger.info("Instance %s is registered with SSM.", instance_id)
-            return True
+def ps_quote(value):
+    """
+    Quote a value as a PowerShell single-quoted string literal.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+def ps_hashtable(values):
+    """
+    Format a dict of strings as a PowerShell hashtable literal.
+    """
+    return "@{ " + "; ".join(f"{key} = {ps_quote(value or '')}" for key, value in values.items()) + " }"
+
+def ps_array(values):
+    """
+    Format a list of strings as a PowerShell array literal.
+    """
+    return "@(" + ", ".join(ps_quote(value) for value in values) + ")"
+
+def ps_variants(presets, output_dir):
+    """
+    Format the variants of a job as the runner's -Variants argument.
+
+    Args:
+        presets (list): Presets as returned by resolve_outputs.
+        output_dir (str): Output directory of the job on the render host.
+
+    Returns:
+        str: A PowerShell array of hashtables.
+    """
+    master = f"{output_dir}\\{VIDEO_NAME}"
+    variants = []
+    for preset in presets:
+        args = ffmpeg_args(preset, master, f"{output_dir}\\{preset['file']}")
+        variants.append(
+            f"@{{ name = {ps_quote(preset['name'])}; file = {ps_quote(preset['file'])};"
+            f" width = {preset['width']}; height = {preset['height']}; fit = {ps_quote(preset['fit'])};"
+            f" args = {ps_array(args)} }}"
+        )
+    return "@(" + ", ".join(variants) + ")"
+
+def build_render_commands(run_id, post_id, bucket_name, post_key, image_key, queued_at_ms, outputs=None):
+    """
+    Build the SSM commands that define the render job runner and invoke it.
+
+    The runner stages the post JSON and background image from the bucket into
+    a local bundle before aerender starts (see Invoke-BundleStage). aerender
+    renders the master once; the variants of the post's output preset matrix
+    are transcoded from it on the render host and uploaded as
+    variants/<preset>.mp4 next to it.
+
+    Args:
+        run_id (str): Run ID that scopes the uploaded artifacts, or None.
+        post_id (str): Post ID that scopes them within the run, or None.
+        bucket_name (str): Bucket holding the post data; outputs are uploaded to it.
+        post_key (str): Key of the post JSON.
+        image_key (str): Processed background image key, or None.
+        queued_at_ms (int): Epoch milliseconds when the job was sent.
+        outputs (list): The post's output presets (see output_presets);
+                        RENDER_OUTPUTS when None.
+
+    Returns:
+        list: PowerShell commands for AWS-RunPowerShellScript.
+    """
+    with open(RENDER_JOB_SCRIPT, "r", encoding="utf-8") as f:
+        runner = f.read()
+    # Jobs sharing an instance must not share an output directory.
+    output_dir = f"{OUTPUT_DIR}\\{post_id}" if post_id else OUTPUT_DIR
+    presets = resolve_outputs(outputs)
+    names = dict(ARTIFACT_NAMES)
+    names.update((preset["file"], f"variants/{preset['name']}.mp4") for preset in presets)
+    artifacts = "; ".join(
+        f"{ps_quote(name)} = {ps_quote(run_key(run_id, object_name, post_id))}"
+        for name, object_name in names.items()
+    )
+    # A failed variant does not fail the job: the master is still published.
+    optional = [PROJECT_EXPORT_NAME] + [preset["file"] for preset in presets]
+    post = ps_hashtable({"post_id": post_id, "post_key": post_key, "image_key": image_key})
+    invocation = (
+        f"Invoke-RenderJob -Project {ps_quote(PROJECT_PATH)} -Comp {ps_quote(COMP_NAME)}"
+        f" -OutputDir {ps_quote(output_dir)} -Bucket {ps_quote(bucket_name)}"
+        f" -Artifacts @{{ {artifacts} }} -VideoName {ps_quote(VIDEO_NAME)}"
+        f" -Optional {ps_array(optional)}"
+        f" -Posts @({post}) -PostId {ps_quote(post_id or '')}"
+        f" -QueuedAtMs {queued_at_ms} -TimeoutSeconds {RENDER_TIMEOUT}"
+        f" -ManifestKey {ps_quote(manifest_key(run_id, post_id))} -Region {ps_quote(os.environ.get('AWS_REGION', ''))}"
+        f" -PartSizeMB {UPLOAD_PART_SIZE_MB} -MaxConcurrency {UPLOAD_MAX_CONCURRENCY}"
+        f" -TemplateIndexKey {ps_quote(TEMPLATE_INDEX_KEY)}"
+        f" -Variants {ps_variants(presets, output_dir)} -FfmpegPath {ps_quote(FFMPEG_PATH)}"
+    )
+    return [runner, invocation]
+
+def parse_job_result(output):
+    """
+    Extract the runner's RENDER_JOB_RESULT JSON from the command output.
+
+    Returns:
+        dict or None: The parsed result, or None if the runner did not report.
+    """
+    for line in reversed((output or "").splitlines()):
+        if line.startswith(RESULT_MARKER):
+            try:
+                return json.loads(line[len(RESULT_MARKER):])
+            except ValueError:
+                logger.warning("Unparseable render job result: %s", line)
+                return None
+    return None
+
+def wait_for_command(ssm, command_id, instance_id, timeout):
+    """
+    Wait for an SSM command invocation to reach a terminal status.
+
+    Args:
+        ssm: A boto3 SSM client.
+        command_id (str): The command ID returned by send_command.
+        instance_id (str): The EC2 instance ID.
+        timeout (float): Maximum seconds to wait.
+
+    Returns:
+        tuple: The last get_command_invocation response (None if it never
+               reached a terminal status) and the seconds waited.
+    """
+    def check():
+        try:
+            invocation = ssm.get_command_invocation(CommandId=command_id, InstanceId=instance_id)
+        except ssm.exceptions.InvocationDoesNotExist:
+            return None
+        if invocation["Status"] in TERMINAL_COMMAND_STATUSES:
+            return invocation
+        return None
+
+    invocation, waited, _ = wait_until(
+        check, timeout, base_delay=2.0, max_delay=5.0, label=f"Render command {command_id}"
+    )
+    return invocation, waited
+
+def remaining_seconds(context):
+    """
+    Return the Lambda time left in seconds (unbounded outside Lambda).
+    """
+    if context is None:
+        return float("inf")
+    return context.get_remaining_time_in_millis() / 1000
+
+def send_render_job(ssm, instance_id, bucket_name, job):
+    """
+    Send one post's render job to an instance without waiting for it.
+
+    Args:
+        ssm: A boto3 SSM client.
+        instance_id (str): The EC2 instance ID.
+        bucket_name (str): Bucket holding the post data and outputs.
+        job (dict): "post_key" of the post JSON, "image_key", the
+                    "run_id"/"post_id" that scope the outputs and the
+                    post's "outputs" presets.
+
+    Returns:
+        dict: The outcome so far, with "command_id" once sent or "error".
+    """
+    result = {"post_id": job.get("post_id"), "title": job.get("title"), "instance_id": instance_id}
+    try:
+        commands = build_render_commands(
+            job.get("run_id"), job.get("post_id"), bucket_name, job["post_key"],
+            job.get("image_key"), int(time.time() * 1000), job.get("outputs")
+        )
+        ssm_response = ssm.send_command(
+            InstanceIds=[instance_id],
+            DocumentName="AWS-RunPowerShellScript",
+            Parameters={"commands": commands, "executionTimeout": [str(RENDER_TIMEOUT)]},
+        )
+        result["command_id"] = ssm_response["Command"]["CommandId"]
+        logger.info("Render job for %s sent to %s as SSM command %s.",
+                    job["post_key"], instance_id, result["command_id"])
+    except Exception as e:
+        logger.exception("Failed to send render job to %s.", instance_id)
+        result["error"] = str(e)
+    return result
+
+def finish_render_job(result, invocation, timeout):
+    """
+    Complete a render outcome from the command's final invocation.
+
+    Args:
+        result (dict): Outcome returned by send_render_job.
+        invocation (dict): The terminal get_command_invocation response, or
+                           None if the command did not finish in time.
+        timeout (float): Seconds the command was given, for the error.
+
+    Returns:
+        dict: The outcome with the command status, the runner's report under
+              "job" and the manifest key, or "error" if the render failed.
+    """
+    if invocation is None:
+        result["error"] = f"Render command {result['command_id']} did not finish within {timeout:.0f}s."
+        logger.error(result["error"])
+        return result
+
+    report = parse_job_result(invocation.get("StandardOutputContent"))
+    timings = (report or {}).get("timings") or {}
+    for timing, (name, kind) in RUNNER_SPANS.items():
+        record(name, timings.get(timing), kind)
+    result["command_status"] = invocation["Status"]
+    result["job"] = report
+    result["manifest_key"] = (report or {}).get("manifest_key")
+    if invocation["Status"] != "Success" or not report or report.get("status") != "succeeded":
+        result["error"] = (
+            f"Render job failed with command status {invocation['Status']}: "
+            f"{(invocation.get('StandardErrorContent') or '').strip()[-1000:]}"
+        )
+        logger.error(result["error"])
+    else:
+        logger.info("Render job complete: %s", report.get("timings"))
+    return result
+
+def is_node_fault(result):
+    """
+    Whether a failed render is the instance's fault rather than the job's:
+    the command was not delivered, did not finish, or the runner never
+    reported. Such jobs are retried on another instance.
+    """
+    return "command_id" not in result or result.get("command_status") in NODE_FAULT_STATUSES or not result.get("job")
+
+def run_render_job(ssm, instance_id, bucket_name, job, timeout):
+    """
+    Render one post on the instance and wait for the job to finish.
+
+    Returns:
+        dict: See finish_render_job.
+    """
+    result = send_render_job(ssm, instance_id, bucket_name, job)
+    if "error" in result:
+        return result
+    invocation, waited = wait_for_command(ssm, result["command_id"], instance_id, timeout)
+    result["command_wait_s"] = round(waited, 2)
+    return finish_render_job(result, invocation, timeout)
+
+def poll_command(ssm, command_id, instance_id):
+    """
+    Return the command invocation if it reached a terminal status, else None.
+    """
+    try:
+        invocation = ssm.get_command_invocation(CommandId=command_id, InstanceId=instance_id)
+    except ssm.exceptions.InvocationDoesNotExist:
+        return None
+    if invocation["Status"] in TERMINAL_COMMAND_STATUSES:
+        return invocation
+    return None
+
+def refresh_health(ssm, scheduler, instance_ids):
+    """
+    Update the scheduler with the SSM ping status of the given pool instances.
+    """
+    if not instance_ids:
+        return
+    try:
+        statuses = ssm_ping_statuses(ssm, list(instance_ids))
+    except Exception as e:
+        logger.warning("Could not refresh render instance health: %s", e)
+        return
+    for instance_id, status in statuses.items():
+        scheduler.set_ping_status(instance_id, status or "Unregistered")
+
+def start_readiness(ec2, ssm, pool):
+    """
+    Start waiting for every pool instance to become ready, in the background.
+
+    Returns:
+        tuple: The executor, a dict of readiness future -> instance ID and the
+               event that ends the waits still running once set.
+    """
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(pool))
+    pending = {executor.submit(wait_until_ready, ec2, ssm, i, stop=stop): i for i in pool}
+    return executor, pending, stop
+
+
+def collect_readiness(scheduler, pending, readiness, timeout=0):
+    """
+    Bring the instances whose readiness wait finished into the scheduler.
+
+    Waits up to timeout seconds (None: indefinitely) for at least one of the
+    pending waits to finish. An instance that became ready is marked Online;
+    one that did not stays out of the pool. Finished waits are removed from
+    pending and their reports stored in readiness.
+    """
+    if not pending:
+        return
+    done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+    for future in done:
+        instance_id = pending.pop(future)
+        try:
+            report = future.result()
+        except Exception as e:
+            logger.exception("Readiness check of %s failed.", instance_id)
+            report = {"ready": False, "instance_wait_s": 0.0, "ssm_wait_s": 0.0, "error": str(e)}
+        readiness[instance_id] = report
+        record("instance_running", report["instance_wait_s"] * 1000, "wait")
+        record("ssm_registration", report["ssm_wait_s"] * 1000, "wait")
+        if report["ready"]:
+            scheduler.set_ping_status(instance_id, "Online")
         else:
-            logger.info("Instance %s not yet registered with SSM. Waiting...", instance_id)
-            time.sleep(interval)
-            waited += interval
-    return False
+            logger.warning("Render instance %s is not ready: %s", instance_id, report["error"])
+
+
+def drain_queue(ssm, sqs, scheduler, bucket_name, context, pending=None, readiness=None,
+                renew_lease=None):
+    """
+    Render queued posts on the instance pool until the queue has been idle
+    for RENDER_QUEUE_IDLE seconds with a slot free or the Lambda runs short
+    of time.
+
+    Jobs are taken from the queue only while the scheduler has a free slot
+    on a healthy instance and run concurrently across the pool. A job whose
+    instance failed is retried on another instance, keeping its message
+    hidden meanwhile. Jobs are removed from the queue only when their render
+    succeeded; others reappear once their visibility timeout expires.
+
+    Instances still booting (pending, see start_readiness) join the pool as
+    their readiness wait finishes; their reports go into readiness.
+
+    renew_lease is called every HEALTH_REFRESH seconds to keep the drain
+    lease (see drain_lease); once it returns False no more jobs are taken.
+
+    Returns:
+        tuple: The list of render outcomes and why draining stopped ("idle",
+               "time_limit", "no_healthy_instance" or "lease_lost").
+    """
+    pending = {} if pending is None else pending
+    readiness = {} if readiness is None else readiness
+    renders = []
+    inflight = {}
+    retries = []
+    lease_held = True
+    idle_deadline = time.monotonic() + RENDER_QUEUE_IDLE
+    health_checked = time.monotonic()
+    while True:
+        collect_readiness(scheduler, pending, readiness)
+        if time.monotonic() - health_checked >= HEALTH_REFRESH:
+            # Only instances that passed their readiness wait; the others
+            # are still booting or were left out.
+            refresh_health(ssm, scheduler, [i for i, r in readiness.items() if r["ready"]])
+            if lease_held and renew_lease and not renew_lease():
+                logger.warning("Lost the render queue drain lease; finishing the jobs in flight.")
+                lease_held = False
+            health_checked = time.monotonic()
+        out_of_time = remaining_seconds(context) - WAIT_MARGIN < RENDER_JOB_BUDGET
+        if not lease_held:
+            # Jobs awaiting a retry go back to the queue for the new drainer.
+            for receipt, _ in retries:
+                extend_job(sqs, RENDER_QUEUE_URL, receipt, 0)
+            retries = []
+            if not inflight:
+                return renders, "lease_lost"
 
+        while lease_held and not out_of_time and scheduler.free_slots() > 0:
+            if retries:
+                receipt, job = retries.pop(0)
+            else:
+                idle_left = idle_deadline - time.monotonic()
+                if idle_left <= 0:
+                    break
+                item = receive_job(sqs, RENDER_QUEUE_URL, 0 if inflight else idle_left)
+                if item is None:
+                    break
+                receipt, job = item
+                job["picked_at_ms"] = int(time.time() * 1000)
+                idle_deadline = time.monotonic() + RENDER_QUEUE_IDLE
+            instance_id = scheduler.place(job["post_id"])
+            result = send_render_job(ssm, instance_id, bucket_name, job)
+            timeout = min(RENDER_TIMEOUT, remaining_seconds(context) - WAIT_MARGIN)
+            entry = {"receipt": receipt, "job": job, "result": result,
+                     "timeout": timeout, "deadline": time.monotonic() + timeout}
+            if "error" in result:
+                settle(sqs, scheduler, entry, renders, retries)
+            else:
+                inflight[result["command_id"]] = entry
+
+        if not inflight:
+            if out_of_time:
+                return renders, "time_limit"
+            if not scheduler.healthy_ids():
+                if pending:
+                    collect_readiness(scheduler, pending, readiness, POLL_INTERVAL)
+                    continue
+                return renders, "no_healthy_instance"
+            if not retries and idle_deadline <= time.monotonic():
+                return renders, "idle"
+            continue
+
+        time.sleep(POLL_INTERVAL)
+        for command_id, entry in list(inflight.items()):
+            instance_id = entry["result"]["instance_id"]
+            invocation = poll_command(ssm, command_id, instance_id)
+            if invocation is None and time.monotonic() < entry["deadline"]:
+                continue
+            if invocation is None:
+                try:
+                    ssm.cancel_command(CommandId=command_id, InstanceIds=[instance_id])
+                except Exception as e:
+                    logger.warning("Could not cancel render command %s: %s", command_id, e)
+            del inflight[command_id]
+            finish_render_job(entry["result"], invocation, entry["timeout"])
+            settle(sqs, scheduler, entry, renders, retries)
+            # No job could be taken while the slot was busy, so the idle
+            # period starts when it frees up.
+            idle_deadline = max(idle_deadline, time.monotonic() + RENDER_QUEUE_IDLE)
+
+def settle(sqs, scheduler, entry, renders, retries):
+    """
+    Release a finished job's slot and complete, retry or give up on it.
+    """
+    result, job = entry["result"], entry["job"]
+    outcome = scheduler.release(
+        result["instance_id"], job["post_id"], "error" not in result, is_node_fault(result)
+    )
+    if outcome == "retry":
+        logger.warning("Retrying render of %s on another instance: %s", job["post_id"], result["error"])
+        extend_job(sqs, RENDER_QUEUE_URL, entry["receipt"], RENDER_TIMEOUT + WAIT_MARGIN)
+        retries.append((entry["receipt"], job))
+    elif outcome == "done":
+        complete_job(sqs, RENDER_QUEUE_URL, entry["receipt"])
+    if job.get("sent_at_ms"):
+        result["queue_wait_s"] = round((job["picked_at_ms"] - job["sent_at_ms"]) / 1000, 2)
+    result["attempt"] = job.get("receive_count", 1)
+    result["outcome"] = outcome
+    renders.append(result)
+
+def boot_cost(event, ready_at, previous):
+    """
+    Work out the instance boot time paid by this run: from StartEC2's request
+    to the instance being ready, if StartEC2 actually started it.
+
+    Args:
+        event (dict): State machine input with StartEC2's result under
+                      "ec2StartResult".
+        ready_at (float): Epoch seconds when the instance became ready.
+        previous (dict): Result of an earlier RenderVideo pass in this run.
+
+    Returns:
+        dict: "boot_s", 0 if the instance was already running.
+    """
+    if previous.get("boot"):
+        boot_s = previous["boot"]["boot_s"]
+    else:
+        start = event.get("ec2StartResult") or {}
+        booted = start.get("previous_state") in ("stopped", "stopping") and start.get("requested_at")
+        boot_s = round(ready_at - start["requested_at"], 2) if booted else 0.0
+    return {"boot_s": boot_s}
+
+@instrumented("render_video")
 def lambda_handler(event, context):
+    """
+    Run render jobs on the render instance and wait for them to finish.
+
+    The job renders the comp and uploads the video (and the exported project,
+    when the template saves one) straight from the render host, so there is no
+    separate upload step. Outputs and the manifest are stored under the run's
+    prefix (see run_manifest.run_key).
+
+    With RENDER_QUEUE_URL set, every queued post is rendered during this boot
+    (see drain_queue), each from its own post JSON and under its own prefix,
+    spread over the instances in RENDER_INSTANCE_IDS by a RenderScheduler.
+    When the Lambda runs short of time the result's stop_reason is
+    "time_limit" and the state machine invokes it again; earlier renders in
+    the run are carried over from videoResult. Only the holder of the drain
+    lease (see drain_lease) drains; another execution's render_video returns
+    with stop_reason "other_drainer", leaving its jobs to the holder. Otherwise the post this run
+    stored (storeResult) is rendered, read back from the post store.
+
+    Environment Variables:
+      - INSTANCE_ID: The EC2 instance ID.
+      - RENDER_INSTANCE_IDS: Comma-separated render pool for queue mode
+        (defaults to INSTANCE_ID), with RENDER_INSTANCE_CONCURRENCY jobs per
+        instance, RENDER_PLACEMENT ("least_loaded" or "bin_pack") and
+        RENDER_MAX_ATTEMPTS attempts per job.
+      - TARGET_BUCKET: The S3 bucket holding the post data and outputs.
+      - RENDER_TIMEOUT: Maximum render job duration in seconds.
+      - UPLOAD_PART_SIZE_MB / UPLOAD_MAX_CONCURRENCY: Multipart upload tuning.
+      - RENDER_QUEUE_URL: Render queue; enables queue mode.
+      - RENDER_QUEUE_IDLE: Seconds without new jobs before queue mode stops.
+      - RENDER_JOB_BUDGET: Minimum Lambda seconds left to start another job.
+
+    Returns:
+        dict: "render_complete" with the runner's timings, the uploaded
+              artifacts and the manifest key(s) - in queue mode per post,
+              with the instance that rendered it, boot and amortized boot
+              time and readiness per instance - or an error. The invocation's
+              timing is added under "trace": instance boot, SSM registration
+              and the runner's own timings (aerender, transcode, uploads).
+    """
     instance_id = os.environ.get("INSTANCE_ID")
     if not instance_id:
         error_msg = "INSTANCE_ID env var not set."
         logger.error(error_msg)
         return {"error": error_msg}
-    
-    ec2 = boto3.client("ec2")
-    waited = 0
-    while waited < 300:
-        resp = ec2.describe_instances(InstanceIds=[instance_id])
-        state = resp["Reservations"][0]["Instances"][0]["State"]["Name"]
-        if state == "running":
-            logger.info("Instance %s is running.", instance_id)
-            break
-        else:
-            logger.info("Instance %s state is '%s'. Waiting...", instance_id, state)
-            time.sleep(10)
-            waited += 10
-    else:
-        error_msg = f"Instance {instance_id} not 'running' after 300s."
-        logger.error(error_msg)
-        return {"error": error_msg}
-    
-    ssm = boto3.client("ssm")
-    if not wait_for_ssm_registration(ssm, instance_id):
-        error_msg = f"Instance {instance_id} not registered with SSM after timeout."
-        logger.error(error_msg)
-        return {"error": error_msg}
-    
+
+    ssm = get_client("ssm")
+    ec2 = get_client("ec2")
+    bucket_name = os.environ.get("TARGET_BUCKET")
+
+    if not RENDER_QUEUE_URL:
+        with span("readiness", "wait"):
+            readiness = wait_until_ready(ec2, ssm, instance_id)
+        record("instance_running", readiness["instance_wait_s"] * 1000, "wait")
+        record("ssm_registration", readiness["ssm_wait_s"] * 1000, "wait")
+        if not readiness["ready"]:
+            logger.error(readiness["error"])
+            return {"error": readiness["error"], "readiness": readiness}
+        # The post this run stored, not the latest pointer: an overlapping
+        # execution may have moved that on since StoreData.
+        stored = event.get("storeResult") or {}
+        post_key = stored.get("s3_key") or next(iter(stored.get("post_keys") or []), None)
+        if not post_key:
+            error_msg = "No stored post in storeResult."
+            logger.error(error_msg)
+            return {"error": error_msg, "readiness": readiness}
+        try:
+            post = load_post(get_client("s3"), bucket_name, post_key)
+        except Exception as e:
+            logger.exception("Error reading stored post %s: %s", post_key, e)
+            return {"error": str(e), "readiness": readiness}
+        job = {"run_id": get_run_id(event), "post_key": post_key,
+               "image_key": post.get("image_key"), "title": post.get("title"),
+               "outputs": post.get("outputs")}
+        timeout = min(RENDER_TIMEOUT, remaining_seconds(context) - WAIT_MARGIN)
+        with span("render_jobs", "wait"):
+            result = run_render_job(ssm, instance_id, bucket_name, job, timeout)
+        result["readiness"] = readiness
+        if "error" not in result:
+            result["status"] = "render_complete"
+        return json.loads(json.dumps(result, default=default_serializer))
+
+    # One drainer at a time: slot counts are per RenderScheduler, so
+    # overlapping drainers would oversubscribe the instances.
+    previous = event.get("videoResult") or {}
+    lease_store = get_lease_store()
+    owner = get_run_id(event)
     try:
-        s3 = boto3.client("s3")
-        bucket_name = os.environ.get("TARGET_BUCKET")
-        key = "most_recent_post.json"
-        presigned_url = s3.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={"Bucket": bucket_name, "Key": key},
-            ExpiresIn=3600
-        )
-        logger.info("Generated presigned URL: %s", presigned_url)
+        leased = acquire_lease(lease_store, owner)
     except Exception as e:
-        logger.exception("Failed to generate presigned URL.")
-        return {"error": str(e)}
-    
-    ps_command = f'''
-$Env:PRESIGNED_URL = "{presigned_url}"
-aerender.exe -project "C:\\animeutopia\\anime_template.aep" -comp "standard-news-template" -output "C:\\animeutopia\\output\\anime_post.mp4"
-    '''
-    
-    try:
-        ssm_response = ssm.send_command(
-            InstanceIds=[instance_id],
-            DocumentName="AWS-RunPowerShellScript",
-            Parameters={"commands": [ps_command]},
+        logger.exception("Error taking the render queue drain lease: %s", e)
+        return {"error": f"Failed to take the render queue drain lease: {e}"}
+
+    def renew_lease():
+        try:
+            return acquire_lease(lease_store, owner)
+        except Exception as e:
+            logger.warning("Could not renew the render queue drain lease: %s", e)
+            return False
+
+    readiness = {}
+    ready_at = None
+    if not leased:
+        # This run's jobs are on the queue the other drainer is working
+        # through; it renders and notifies them.
+        renders, stop_reason = [], "other_drainer"
+    else:
+        # Jobs are placed on each instance as soon as it is ready rather
+        # than once the whole pool is, and an instance that never gets ready
+        # is left out instead of holding the others up.
+        pool = render_pool(instance_id)
+        scheduler = RenderScheduler(
+            pool, RENDER_INSTANCE_CONCURRENCY, RENDER_PLACEMENT, RENDER_MAX_ATTEMPTS
         )
-        logger.info("SSM command sent: %s", ssm_response)
-        
-        return json.loads(json.dumps(
-            {"status": "render_triggered", "ssm_command": ssm_response},
-            default=default_serializer
-        ))
-    except Exception as e:
-        logger.exception("Failed to send SSM command.")
-        return {"error": str(e)}
+        for i in pool:
+            scheduler.set_ping_status(i, "NotReady")
+        executor, pending, stop_readiness = start_readiness(ec2, ssm, pool)
+        try:
+            # The wait can outlast LEASE_TTL, so the lease is renewed on
+            # every pass, like drain_queue does between jobs.
+            lease_lost = False
+            with span("readiness", "wait"):
+                while pending and not scheduler.healthy_ids():
+                    collect_readiness(scheduler, pending, readiness, HEALTH_REFRESH)
+                    if not renew_lease():
+                        lease_lost = True
+                        break
+            if lease_lost:
+                logger.warning("Lost the render queue drain lease while waiting for the pool.")
+                renders, stop_reason = [], "lease_lost"
+            elif not scheduler.healthy_ids():
+                error_msg = readiness[pool[0]]["error"]
+                logger.error(error_msg)
+                return {"error": error_msg, "readiness": readiness}
+            else:
+                ready_at = time.time()
+                with span("render_jobs", "wait"):
+                    renders, stop_reason = drain_queue(
+                        ssm, get_client("sqs"), scheduler, bucket_name, context, pending, readiness,
+                        renew_lease
+                    )
+        finally:
+            # cancel_futures only drops waits that have not started; the
+            # event ends the running ones so no thread outlives the invocation.
+            stop_readiness.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            release_lease(lease_store, owner)
+        for i in pending.values():
+            readiness[i] = {"ready": False, "error": f"Instance {i} was still not ready when draining stopped."}
+    renders = previous.get("renders", []) + renders
+    succeeded = [r for r in renders if "error" not in r]
+    retried = [r for r in renders if r.get("outcome") == "retry"]
+
+    if ready_at is None:
+        boot = dict(previous.get("boot") or {"boot_s": 0.0})
+    else:
+        boot = boot_cost(event, ready_at, previous)
+        record("instance_boot", boot["boot_s"] * 1000, "wait")
+    boot["amortized_boot_s"] = round(boot["boot_s"] / len(succeeded), 2) if succeeded else None
+    result = {
+        "mode": "queue",
+        "renders": renders,
+        "rendered": len(succeeded),
+        "failed": len(renders) - len(succeeded) - len(retried),
+        "retried": len(retried),
+        "stop_reason": stop_reason,
+        "boot": boot,
+        "readiness": readiness,
+        "manifest_keys": [r["manifest_key"] for r in succeeded],
+        "manifest_key": succeeded[0]["manifest_key"] if succeeded else None,
+    }
+    logger.info("Rendered %d posts (%d failed), stopped on %s; boot %s.",
+                result["rendered"], result["failed"], stop_reason, boot)
+    if succeeded:
+        result["status"] = "render_complete"
+    elif renders:
+        result["error"] = "All queued render jobs failed."
+    else:
+        result["status"] = "queue_empty"
+    return json.loads(json.dumps(result, default=default_serializer))
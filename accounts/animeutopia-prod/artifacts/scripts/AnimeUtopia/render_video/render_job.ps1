@@ -0,0 +1,574 @@
+<#
+.SYNOPSIS
+    Render the anime post and upload its outputs in one pass.
+
+.DESCRIPTION
+    Sent to the render host by the render_video Lambda through SSM
+    (AWS-RunPowerShellScript), followed by a call to Invoke-RenderJob.
+
+    First stages everything the After Effects script needs - the post JSON
+    of every post in the job and their background images - into a local
+    bundle directory with a bundle.json manifest (see Invoke-BundleStage), so
+    nothing is fetched over the network once aerender runs.
+
+    The template is fingerprinted (SHA-256, size, modification time) and the
+    fingerprint passed to the After Effects script, which looks the comp and
+    its layers up through the template's sidecar index
+    (<template>.index.json, see template_index.jsx) and only scans the
+    project when the index was built for another version. A rebuilt index is
+    published to S3 for process_content's pre-render validation.
+
+    Then starts aerender and sleeps on events instead of polling: a
+    FileSystemWatcher on the output directory and the Exited events of
+    aerender and ffmpeg. aerender renders the comp once, as the master video;
+    the platform variants of the post's output preset matrix (-Variants, see
+    output_presets.py) are then transcoded from the master with ffmpeg,
+    concurrently. Each output is uploaded as soon as it is finalized - the
+    master once aerender has exited, a variant once its ffmpeg has exited,
+    any other artifact once nothing holds it open. Uploads run concurrently
+    as multipart uploads with a SHA-256 checksum, and a manifest of what was
+    uploaded (key, size, sha256, duration) is written next to them. The last
+    line written to stdout is
+
+        RENDER_JOB_RESULT {"status": ..., "timings": {...}, "bundle": {...}, "artifacts": {...}, "variants": {...}}
+
+    aerender's own output goes to aerender.log in the output directory so the
+    result line is never pushed out of the (size-limited) SSM command output.
+    For the same reason a failed upload or transcode reports only the tail of
+    its error log (see Get-LogTail); the full log stays in the output
+    directory.
+#>
+
+function Get-EpochMs {
+    [DateTimeOffset]::UtcNow.ToUnixTimeMilliseconds()
+}
+
+function Get-LogTail {
+    <#
+    Return the last MaxChars characters of a log file, or $null if there is
+    none. SSM keeps only the first 24000 characters of the command output, so
+    a whole ffmpeg or AWS CLI error log would truncate the result line.
+    #>
+    param([string]$Path, [int]$MaxChars = 2048)
+    $text = Get-Content -LiteralPath $Path -Raw -ErrorAction SilentlyContinue
+    if (-not $text) { return $null }
+    $text = $text.Trim()
+    if ($text.Length -le $MaxChars) { return $text }
+    return "..." + $text.Substring($text.Length - $MaxChars)
+}
+
+function Test-FileFinalized {
+    param([string]$Path)
+    if (-not (Test-Path -LiteralPath $Path)) { return $false }
+    try {
+        $stream = [System.IO.File]::Open($Path, 'Open', 'Read', 'None')
+        $stream.Close()
+        return $true
+    } catch {
+        return $false
+    }
+}
+
+function New-UploadConfig {
+    <#
+    Write a job-scoped AWS CLI config so that "aws s3 cp" uses multipart
+    uploads with the requested part size and concurrency, and adaptive retries.
+    #>
+    param([string]$Path, [string]$Region, [int]$PartSizeMB, [int]$MaxConcurrency)
+    $lines = @("[default]")
+    if ($Region) { $lines += "region = $Region" }
+    $lines += @(
+        "retry_mode = adaptive",
+        "max_attempts = 10",
+        "s3 =",
+        "  max_concurrent_requests = $MaxConcurrency",
+        "  multipart_threshold = ${PartSizeMB}MB",
+        "  multipart_chunksize = ${PartSizeMB}MB"
+    )
+    Set-Content -LiteralPath $Path -Value $lines -Encoding ASCII
+}
+
+function Expand-GzipFile {
+    param([string]$Path, [string]$Destination)
+    $source = [IO.File]::OpenRead($Path)
+    try {
+        $gzip = New-Object IO.Compression.GZipStream($source, [IO.Compression.CompressionMode]::Decompress)
+        $target = [IO.File]::Create($Destination)
+        try { $gzip.CopyTo($target) } finally { $target.Dispose(); $gzip.Dispose() }
+    } finally {
+        $source.Dispose()
+    }
+    Remove-Item -LiteralPath $Path -Force
+}
+
+function Invoke-BundleStage {
+    <#
+    Download the posts of a job and their assets from S3 into $Dir,
+    concurrently, and write $Dir\bundle.json listing them:
+
+        {"version": 1, "posts": [{"post_id", "post", "background"}],
+         "files": [{"key", "name", "size", "status"}], "stage_ms": ...}
+
+    Paths in the bundle are relative to $Dir. The After Effects script reads
+    the bundle through RENDER_BUNDLE_DIR. Posts stored gzip-compressed (keys
+    ending in .gz, see post_store.py) are decompressed as they are staged.
+    #>
+    param([string]$Bucket, [object[]]$Posts, [string]$Dir)
+    $start = Get-EpochMs
+    Remove-Item -LiteralPath $Dir -Recurse -Force -ErrorAction SilentlyContinue
+    New-Item -ItemType Directory -Force -Path $Dir | Out-Null
+
+    $entries = @()
+    $downloads = @()
+    foreach ($post in $Posts) {
+        $postId = $(if ($post.post_id) { $post.post_id } else { "post" })
+        $entry = [ordered]@{ post_id = $postId; post = "posts/$postId.json"; background = $null }
+        $downloads += [ordered]@{ key = $post.post_key; name = $entry.post; required = $true }
+        if ($post.image_key) {
+            $entry.background = "assets/$postId/backgroundimage_converted.jpg"
+            $downloads += [ordered]@{ key = $post.image_key; name = $entry.background; required = $false }
+        }
+        $entries += $entry
+    }
+
+    foreach ($download in $downloads) {
+        $path = Join-Path $Dir $download.name
+        New-Item -ItemType Directory -Force -Path (Split-Path -Parent $path) | Out-Null
+        $download.path = $path
+        $download.target = $(if ($download.key -like "*.gz") { "$path.gz" } else { $path })
+        $download.proc = Start-Process -FilePath "aws" -NoNewWindow -PassThru `
+            -ArgumentList @("s3", "cp", "s3://$Bucket/$($download.key)", "`"$($download.target)`"", "--only-show-errors")
+        $null = $download.proc.Handle
+    }
+    $files = @(foreach ($download in $downloads) {
+        $download.proc.WaitForExit()
+        $ok = $download.proc.ExitCode -eq 0 -and (Test-Path -LiteralPath $download.target)
+        if ($ok -and $download.target -ne $download.path) {
+            try {
+                Expand-GzipFile -Path $download.target -Destination $download.path
+            } catch {
+                $ok = $false
+            }
+        }
+        [ordered]@{
+            key      = $download.key
+            name     = $download.name
+            size     = $(if ($ok) { (Get-Item -LiteralPath $download.path).Length } else { $null })
+            required = $download.required
+            status   = $(if ($ok) { "staged" } else { "failed" })
+        }
+    })
+
+    $bundle = [ordered]@{
+        version  = 1
+        posts    = $entries
+        files    = $files
+        stage_ms = (Get-EpochMs) - $start
+    }
+    [System.IO.File]::WriteAllText((Join-Path $Dir "bundle.json"), ($bundle | ConvertTo-Json -Depth 5))
+    return $bundle
+}
+
+function Read-TemplateIndex {
+    param([string]$Path)
+    if (-not (Test-Path -LiteralPath $Path)) { return $null }
+    try {
+        return Get-Content -LiteralPath $Path -Raw -Encoding UTF8 | ConvertFrom-Json
+    } catch {
+        return $null
+    }
+}
+
+function Get-TemplateFingerprint {
+    <#
+    Fingerprint the template as SHA-256, size and modification time (ticks).
+    The hash is taken from the sidecar index while size and modification time
+    still match the ones it was built for, so the .aep is only hashed again
+    after it changed.
+    #>
+    param([string]$Project, [string]$IndexPath)
+    $item = Get-Item -LiteralPath $Project
+    $fingerprint = [ordered]@{
+        sha256   = $null
+        size     = [string]$item.Length
+        modified = [string]$item.LastWriteTimeUtc.Ticks
+        indexed  = $false
+    }
+    $index = Read-TemplateIndex $IndexPath
+    if ($index -and $index.template.sha256 -and $index.template.size -eq $fingerprint.size `
+            -and $index.template.modified -eq $fingerprint.modified) {
+        $fingerprint.sha256 = $index.template.sha256
+        $fingerprint.indexed = $true
+    } else {
+        $fingerprint.sha256 = (Get-FileHash -LiteralPath $Project -Algorithm SHA256).Hash.ToLowerInvariant()
+        $fingerprint.indexed = [bool]($index -and $index.template.sha256 -eq $fingerprint.sha256)
+    }
+    return $fingerprint
+}
+
+function Set-TemplateEnvironment {
+    param($Fingerprint, [string]$IndexPath)
+    $Env:RENDER_TEMPLATE_HASH = $Fingerprint.sha256
+    $Env:RENDER_TEMPLATE_SIZE = $Fingerprint.size
+    $Env:RENDER_TEMPLATE_MTIME = $Fingerprint.modified
+    $Env:RENDER_TEMPLATE_INDEX = $IndexPath
+}
+
+function Publish-TemplateIndex {
+    param([string]$IndexPath, [string]$Bucket, [string]$Key)
+    & aws s3 cp $IndexPath "s3://$Bucket/$Key" --only-show-errors --content-type "application/json"
+    return $LASTEXITCODE -eq 0
+}
+
+function Update-TemplateIndex {
+    <#
+    Offline indexer: build the sidecar index of a template with
+    index_template.jsx and publish it, unless the index is already current.
+    Run once per template version, e.g. after deploying a new .aep.
+    #>
+    param(
+        [string]$Project,
+        [string]$Bucket,
+        [string]$IndexKey,
+        # Path of index_template.jsx on this host.
+        [string]$IndexScript,
+        [string]$AfterFx = "AfterFX.exe",
+        [switch]$Force
+    )
+    $indexPath = [IO.Path]::ChangeExtension($Project, ".index.json")
+    $fingerprint = Get-TemplateFingerprint -Project $Project -IndexPath $indexPath
+    if ($fingerprint.indexed -and -not $Force) {
+        Write-Output "Template index for $($fingerprint.sha256) is current."
+    } else {
+        Set-TemplateEnvironment -Fingerprint $fingerprint -IndexPath $indexPath
+        $Env:RENDER_TEMPLATE_PATH = $Project
+        $proc = Start-Process -FilePath $AfterFx -NoNewWindow -PassThru -Wait `
+            -ArgumentList @("-noui", "-r", "`"$IndexScript`"")
+        $index = Read-TemplateIndex $indexPath
+        if (-not $index -or $index.template.sha256 -ne $fingerprint.sha256) {
+            throw "Indexing $Project failed (AfterFX exit code $($proc.ExitCode))."
+        }
+    }
+    if ($Bucket -and $IndexKey -and -not (Publish-TemplateIndex $indexPath $Bucket $IndexKey)) {
+        throw "Publishing the template index to s3://$Bucket/$IndexKey failed."
+    }
+}
+
+function Start-ArtifactUpload {
+    <#
+    Hash an artifact and start uploading it in the background. An object that
+    is already in S3 with the same SHA-256 (an earlier, interrupted attempt
+    of the same job) is not uploaded again.
+    #>
+    param([string]$Path, [string]$Bucket, [string]$Key, [string]$LogDir)
+    $start = Get-EpochMs
+    $sha256 = (Get-FileHash -LiteralPath $Path -Algorithm SHA256).Hash.ToLowerInvariant()
+    $upload = [ordered]@{
+        key     = $Key
+        size    = (Get-Item -LiteralPath $Path).Length
+        sha256  = $sha256
+        startMs = $start
+        proc    = $null
+        errLog  = $null
+        skipped = $false
+    }
+    $existing = & aws s3api head-object --bucket $Bucket --key $Key --query "Metadata.sha256" --output text 2>$null
+    if ($LASTEXITCODE -eq 0 -and $existing -eq $sha256) {
+        $upload.skipped = $true
+        return $upload
+    }
+    $upload.errLog = Join-Path $LogDir ("upload-" + [IO.Path]::GetFileName($Path) + ".err")
+    $upload.proc = Start-Process -FilePath "aws" -NoNewWindow -PassThru `
+        -RedirectStandardError $upload.errLog `
+        -ArgumentList @("s3", "cp", "`"$Path`"", "s3://$Bucket/$Key", "--only-show-errors",
+                        "--checksum-algorithm", "SHA256", "--metadata", "sha256=$sha256")
+    $null = $upload.proc.Handle
+    return $upload
+}
+
+function Complete-ArtifactUpload {
+    param($Upload)
+    if ($Upload.skipped) {
+        $status = "already_uploaded"
+    } else {
+        $Upload.proc.WaitForExit()
+        $status = $(if ($Upload.proc.ExitCode -eq 0) { "uploaded" } else { "failed" })
+    }
+    $result = [ordered]@{
+        key         = $Upload.key
+        size        = $Upload.size
+        sha256      = $Upload.sha256
+        duration_ms = (Get-EpochMs) - $Upload.startMs
+        status      = $status
+    }
+    if ($status -eq "failed") {
+        $result.error = Get-LogTail $Upload.errLog
+    }
+    return $result
+}
+
+function Start-VariantTranscode {
+    <#
+    Start transcoding the master into one variant in the background.
+    #>
+    param($Variant, [string]$FfmpegPath, [string]$LogDir)
+    $errLog = Join-Path $LogDir ("ffmpeg-" + $Variant.name + ".err")
+    $quoted = @($Variant.args | ForEach-Object { '"' + $_ + '"' })
+    $proc = Start-Process -FilePath $FfmpegPath -NoNewWindow -PassThru `
+        -RedirectStandardError $errLog -ArgumentList $quoted
+    $null = $proc.Handle
+    $proc.EnableRaisingEvents = $true
+    return $proc
+}
+
+function Invoke-RenderJob {
+    param(
+        [string]$Project,
+        [string]$Comp,
+        [string]$OutputDir,
+        [string]$Bucket,
+        # Output file name -> S3 key. $VideoName is the aerender output.
+        [hashtable]$Artifacts,
+        [string]$VideoName = "anime_post.mp4",
+        # Artifacts whose absence does not fail the job.
+        [string[]]$Optional = @(),
+        # Posts to stage: hashtables with post_id, post_key and image_key.
+        [object[]]$Posts = @(),
+        # Post of the bundle to render; the first one if empty.
+        [string]$PostId = "",
+        [long]$QueuedAtMs = 0,
+        [int]$TimeoutSeconds = 1800,
+        # Where the upload manifest is written in the bucket, if anywhere.
+        [string]$ManifestKey = "",
+        [string]$Region = "",
+        [int]$PartSizeMB = 16,
+        [int]$MaxConcurrency = 10,
+        # Where a rebuilt template index is published in the bucket, if anywhere.
+        [string]$TemplateIndexKey = "",
+        # Variants transcoded from the master: hashtables with name, file
+        # (a key of $Artifacts), width, height, fit and the ffmpeg args.
+        [object[]]$Variants = @(),
+        [string]$FfmpegPath = "ffmpeg.exe"
+    )
+
+    $jobStart = Get-EpochMs
+    $timings = [ordered]@{}
+    if ($QueuedAtMs -gt 0) { $timings.queue_ms = $jobStart - $QueuedAtMs }
+
+    New-Item -ItemType Directory -Force -Path $OutputDir | Out-Null
+    # Outputs left over from a previous run must not be mistaken for this one's.
+    foreach ($name in $Artifacts.Keys) {
+        Remove-Item -LiteralPath (Join-Path $OutputDir $name) -Force -ErrorAction SilentlyContinue
+    }
+
+    $bundleDir = Join-Path $OutputDir "bundle"
+    $bundle = Invoke-BundleStage -Bucket $Bucket -Posts $Posts -Dir $bundleDir
+    $timings.stage_ms = $bundle.stage_ms
+    $bundleReport = [ordered]@{ files = $bundle.files.Count; bytes = 0; stage_ms = $bundle.stage_ms }
+    foreach ($file in $bundle.files) {
+        if ($file.size) { $bundleReport.bytes += $file.size }
+    }
+    $missing = @($bundle.files | Where-Object { $_.required -and $_.status -ne "staged" })
+    if ($missing.Count -gt 0) {
+        $result = [ordered]@{
+            status       = "failed"
+            error        = "Could not stage " + (($missing | ForEach-Object { $_.key }) -join ", ")
+            exit_code    = $null
+            timings      = $timings
+            bundle       = $bundleReport
+            artifacts    = [ordered]@{}
+            manifest_key = $null
+        }
+        Write-Output ("RENDER_JOB_RESULT " + ($result | ConvertTo-Json -Compress -Depth 5))
+        exit 1
+    }
+    $Env:RENDER_BUNDLE_DIR = $bundleDir
+    $Env:RENDER_POST_ID = $PostId
+
+    $start = Get-EpochMs
+    $templateIndexPath = [IO.Path]::ChangeExtension($Project, ".index.json")
+    $template = Get-TemplateFingerprint -Project $Project -IndexPath $templateIndexPath
+    Set-TemplateEnvironment -Fingerprint $template -IndexPath $templateIndexPath
+    $timings.template_ms = (Get-EpochMs) - $start
+
+    $uploadConfig = Join-Path $OutputDir "aws-upload.config"
+    New-UploadConfig -Path $uploadConfig -Region $Region -PartSizeMB $PartSizeMB -MaxConcurrency $MaxConcurrency
+    $Env:AWS_CONFIG_FILE = $uploadConfig
+
+    $watcher = New-Object System.IO.FileSystemWatcher $OutputDir
+    $watcher.NotifyFilter = [System.IO.NotifyFilters]'FileName, LastWrite, Size'
+    $sourceIds = @()
+    foreach ($eventName in "Created", "Changed", "Renamed") {
+        $id = "renderjob-$eventName"
+        Register-ObjectEvent -InputObject $watcher -EventName $eventName -SourceIdentifier $id | Out-Null
+        $sourceIds += $id
+    }
+    $watcher.EnableRaisingEvents = $true
+
+    $videoPath = Join-Path $OutputDir $VideoName
+    $renderStart = Get-EpochMs
+    $proc = Start-Process -FilePath "aerender.exe" -NoNewWindow -PassThru `
+        -RedirectStandardOutput (Join-Path $OutputDir "aerender.log") `
+        -ArgumentList @("-project", "`"$Project`"", "-comp", "`"$Comp`"", "-output", "`"$videoPath`"")
+    # Caching the handle keeps ExitCode available after the process exits.
+    $null = $proc.Handle
+    $proc.EnableRaisingEvents = $true
+    Register-ObjectEvent -InputObject $proc -EventName Exited -SourceIdentifier "renderjob-Exited" | Out-Null
+    $sourceIds += "renderjob-Exited"
+
+    $inflight = [ordered]@{}
+    $uploads = [ordered]@{}
+    # Output file -> its variant and ffmpeg process, once started.
+    $variantFiles = @{}
+    foreach ($variant in $Variants) { $variantFiles[$variant.file] = $variant }
+    $transcodes = [ordered]@{}
+    $renderEnd = $null
+    $transcodeEnd = $null
+    $timedOut = $false
+    $deadline = (Get-Date).AddSeconds($TimeoutSeconds)
+    try {
+        while ($true) {
+            $exited = $proc.HasExited
+            if ($exited -and -not $renderEnd) {
+                $renderEnd = Get-EpochMs
+                # One render pass: every variant is derived from the master.
+                if ($proc.ExitCode -eq 0 -and (Test-Path -LiteralPath $videoPath)) {
+                    foreach ($variant in $Variants) {
+                        $transcodes[$variant.file] = Start-VariantTranscode $variant $FfmpegPath $OutputDir
+                        $id = "renderjob-variant-" + $variant.name
+                        Register-ObjectEvent -InputObject $transcodes[$variant.file] -EventName Exited `
+                            -SourceIdentifier $id | Out-Null
+                        $sourceIds += $id
+                    }
+                }
+            }
+            $transcoding = @($transcodes.Values | Where-Object { -not $_.HasExited }).Count -gt 0
+            if ($exited -and -not $transcoding -and -not $transcodeEnd) { $transcodeEnd = Get-EpochMs }
+
+            foreach ($name in @($Artifacts.Keys | Where-Object { -not $inflight.Contains($_) })) {
+                $path = Join-Path $OutputDir $name
+                if ($name -eq $VideoName) {
+                    $ready = $exited -and (Test-Path -LiteralPath $path)
+                } elseif ($variantFiles.ContainsKey($name)) {
+                    $transcode = $transcodes[$name]
+                    $ready = $transcode -and $transcode.HasExited -and $transcode.ExitCode -eq 0 `
+                        -and (Test-Path -LiteralPath $path)
+                } else {
+                    $ready = Test-FileFinalized $path
+                }
+                if ($ready) {
+                    # Uploads run in the background, so an artifact finished
+                    # early uploads while aerender is still working.
+                    $inflight[$name] = Start-ArtifactUpload -Path $path -Bucket $Bucket `
+                        -Key $Artifacts[$name] -LogDir $OutputDir
+                }
+            }
+
+            if ($exited -and -not $transcoding) {
+                # Nothing is written after aerender and ffmpeg exit.
+                foreach ($name in @($Artifacts.Keys | Where-Object { -not $inflight.Contains($_) })) {
+                    $uploads[$name] = [ordered]@{ key = $Artifacts[$name]; status = "missing" }
+                }
+                break
+            }
+            if ((Get-Date) -gt $deadline) {
+                Stop-Process -Id $proc.Id -Force -ErrorAction SilentlyContinue
+                foreach ($transcode in $transcodes.Values) {
+                    Stop-Process -Id $transcode.Id -Force -ErrorAction SilentlyContinue
+                }
+                $timedOut = $true
+                if (-not $renderEnd) { $renderEnd = Get-EpochMs }
+                break
+            }
+
+            # Sleep until the output directory changes or aerender or an
+            # ffmpeg exits. The timeout only guards against a missed event.
+            Wait-Event -Timeout 5 | Out-Null
+            Get-Event | Where-Object { $sourceIds -contains $_.SourceIdentifier } | Remove-Event
+        }
+    } finally {
+        foreach ($id in $sourceIds) { Unregister-Event -SourceIdentifier $id -ErrorAction SilentlyContinue }
+        $watcher.Dispose()
+    }
+    foreach ($name in $inflight.Keys) {
+        $uploads[$name] = Complete-ArtifactUpload $inflight[$name]
+    }
+    # Manifest entries of variants say which variant they are.
+    $variantReport = [ordered]@{}
+    foreach ($variant in $Variants) {
+        $transcode = $transcodes[$variant.file]
+        $upload = $uploads[$variant.file]
+        if ($upload) {
+            $upload.variant = $variant.name
+            $upload.width = $variant.width
+            $upload.height = $variant.height
+            $upload.fit = $variant.fit
+        }
+        $variantReport[$variant.name] = [ordered]@{
+            key       = $Artifacts[$variant.file]
+            exit_code = $(if ($transcode -and $transcode.HasExited) { $transcode.ExitCode } else { $null })
+            status    = $(if ($upload) { $upload.status } else { "missing" })
+        }
+        if ($transcode -and $transcode.HasExited -and $transcode.ExitCode -ne 0) {
+            $variantReport[$variant.name].error = Get-LogTail (Join-Path $OutputDir ("ffmpeg-" + $variant.name + ".err"))
+        }
+    }
+
+    # Without a current index the After Effects script scanned the project and
+    # wrote a fresh one; publish it.
+    $templateIndex = $(if ($template.indexed) { "hit" } else { "scanned" })
+    if (-not $template.indexed) {
+        $rebuilt = Read-TemplateIndex $templateIndexPath
+        if ($rebuilt -and $rebuilt.template.sha256 -eq $template.sha256) {
+            $templateIndex = "rebuilt"
+            if ($TemplateIndexKey -and -not (Publish-TemplateIndex $templateIndexPath $Bucket $TemplateIndexKey)) {
+                $templateIndex = "rebuilt_unpublished"
+            }
+        }
+    }
+
+    $jobEnd = Get-EpochMs
+    $timings.render_ms = $renderEnd - $renderStart
+    if ($transcodes.Count -gt 0 -and $transcodeEnd) { $timings.transcode_ms = $transcodeEnd - $renderEnd }
+    $timings.upload_after_render_ms = $jobEnd - $(if ($transcodeEnd) { $transcodeEnd } else { $renderEnd })
+    $timings.total_ms = $jobEnd - $jobStart
+
+    $failed = @($uploads.Keys | Where-Object {
+        $status = $uploads[$_].status
+        ($status -eq "failed") -or ($status -eq "missing" -and $Optional -notcontains $_)
+    })
+    if ($timedOut) {
+        $status = "timed_out"
+    } elseif ($proc.ExitCode -ne 0 -or $failed.Count -gt 0) {
+        $status = "failed"
+    } else {
+        $status = "succeeded"
+    }
+
+    $manifest = [ordered]@{
+        bucket    = $Bucket
+        status    = $status
+        artifacts = @($uploads.Values | Where-Object { $_.status -ne "missing" })
+        timings   = $timings
+    }
+    if ($ManifestKey) {
+        $manifestPath = Join-Path $OutputDir "manifest.json"
+        # WriteAllText writes UTF-8 without the BOM Set-Content would add.
+        [System.IO.File]::WriteAllText($manifestPath, ($manifest | ConvertTo-Json -Depth 5))
+        & aws s3 cp $manifestPath "s3://$Bucket/$ManifestKey" --only-show-errors --content-type "application/json"
+        if ($LASTEXITCODE -ne 0) { $status = "failed" }
+    }
+
+    $result = [ordered]@{
+        status       = $status
+        exit_code    = $(if ($timedOut) { $null } else { $proc.ExitCode })
+        timings      = $timings
+        bundle       = $bundleReport
+        template     = [ordered]@{ sha256 = $template.sha256; index = $templateIndex }
+        artifacts    = $uploads
+        variants     = $variantReport
+        manifest_key = $(if ($ManifestKey) { $ManifestKey } else { $null })
+    }
+    Write-Output ("RENDER_JOB_RESULT " + ($result | ConvertTo-Json -Compress -Depth 5))
+    if ($status -ne "succeeded") { exit 1 }
+}
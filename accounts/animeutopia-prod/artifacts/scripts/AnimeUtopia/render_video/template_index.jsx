@@ -0,0 +1,168 @@
+// Template index: a sidecar JSON file next to the .aep recording, per comp,
+// its project item index and ID, size, duration and frame rate, and per
+// layer its index, ID, kind, source size and (for text) the paragraph box
+// and font size. Built once per template version - by index_template.jsx or
+// by the render script after a fallback scan - and keyed by the template
+// fingerprint the render job runner passes in:
+//
+//   RENDER_TEMPLATE_HASH / RENDER_TEMPLATE_SIZE / RENDER_TEMPLATE_MTIME
+//   RENDER_TEMPLATE_INDEX   path of the sidecar file
+//
+// Requires json2.jsx and logMessage().
+
+var TEMPLATE_INDEX_VERSION = 1;
+
+function templateFingerprint() {
+    return {
+        sha256: $.getenv("RENDER_TEMPLATE_HASH") || null,
+        size: $.getenv("RENDER_TEMPLATE_SIZE") || null,
+        modified: $.getenv("RENDER_TEMPLATE_MTIME") || null
+    };
+}
+
+function layerKind(layer) {
+    if (layer instanceof TextLayer) {
+        return "text";
+    }
+    if (layer instanceof ShapeLayer) {
+        return "shape";
+    }
+    if (layer instanceof CameraLayer) {
+        return "camera";
+    }
+    if (layer instanceof LightLayer) {
+        return "light";
+    }
+    if (layer.source instanceof CompItem) {
+        return "precomp";
+    }
+    if (layer.source instanceof FootageItem) {
+        return "footage";
+    }
+    return "other";
+}
+
+function indexLayer(layer) {
+    var entry = {
+        index: layer.index,
+        id: layer.id !== undefined ? layer.id : null,
+        kind: layerKind(layer),
+        enabled: layer.enabled,
+        width: null,
+        height: null
+    };
+    if (layer.source && layer.source.width) {
+        entry.width = layer.source.width;
+        entry.height = layer.source.height;
+    }
+    if (entry.kind === "text") {
+        var doc = layer.property("Source Text").value;
+        entry.font_size = doc.fontSize;
+        entry.box = doc.boxText ? [doc.boxTextSize[0], doc.boxTextSize[1]] : null;
+        var rect = layer.sourceRectAtTime(0, false);
+        entry.width = rect.width;
+        entry.height = rect.height;
+    }
+    return entry;
+}
+
+function buildTemplateIndex(project) {
+    var comps = {};
+    for (var i = 1; i <= project.numItems; i++) {
+        var item = project.item(i);
+        if (!(item instanceof CompItem) || comps[item.name]) {
+            continue;
+        }
+        var layers = {};
+        for (var j = 1; j <= item.numLayers; j++) {
+            var layer = item.layer(j);
+            if (!layers[layer.name]) {
+                layers[layer.name] = indexLayer(layer);
+            }
+        }
+        comps[item.name] = {
+            index: i,
+            id: item.id,
+            width: item.width,
+            height: item.height,
+            duration: item.duration,
+            frame_rate: item.frameRate,
+            layers: layers
+        };
+    }
+    return {
+        version: TEMPLATE_INDEX_VERSION,
+        template: templateFingerprint(),
+        project: project.file ? project.file.fsName : null,
+        indexed_at: new Date().toISOString(),
+        comps: comps
+    };
+}
+
+function writeTemplateIndex(path, index) {
+    var f = new File(path);
+    f.encoding = "UTF-8";
+    if (!f.open("w")) {
+        logMessage("WARN", "Cannot write template index: " + path);
+        return false;
+    }
+    f.write(JSON.stringify(index, null, 2));
+    f.close();
+    logMessage("INFO", "Template index written: " + path);
+    return true;
+}
+
+// Return the sidecar index if it was built for the current template, else null.
+function loadTemplateIndex() {
+    var path = $.getenv("RENDER_TEMPLATE_INDEX");
+    var hash = $.getenv("RENDER_TEMPLATE_HASH");
+    if (!path || !hash) {
+        return null;
+    }
+    var f = new File(path);
+    if (!f.exists) {
+        return null;
+    }
+    f.encoding = "UTF-8";
+    if (!f.open("r")) {
+        return null;
+    }
+    var raw = f.read();
+    f.close();
+    try {
+        var index = JSON.parse(raw);
+    } catch (ex) {
+        logMessage("WARN", "Unreadable template index " + path + ": " + ex.message);
+        return null;
+    }
+    if (index.version !== TEMPLATE_INDEX_VERSION || !index.template || index.template.sha256 !== hash) {
+        logMessage("INFO", "Template index is stale; the template has changed.");
+        return null;
+    }
+    return index;
+}
+
+// Look up a comp through the index, checking that the item at the recorded
+// position is still that comp. Returns null if the index cannot be used.
+function indexedComp(index, name) {
+    var entry = index && index.comps[name];
+    if (!entry || entry.index > app.project.numItems) {
+        return null;
+    }
+    var item = app.project.item(entry.index);
+    if (item instanceof CompItem && item.name === name) {
+        return item;
+    }
+    return null;
+}
+
+function indexedLayer(comp, index, name) {
+    var entry = index && index.comps[comp.name] && index.comps[comp.name].layers[name];
+    if (entry && entry.index <= comp.numLayers) {
+        var layer = comp.layer(entry.index);
+        if (layer.name === name) {
+            return layer;
+        }
+    }
+    return comp.layer(name);
+}
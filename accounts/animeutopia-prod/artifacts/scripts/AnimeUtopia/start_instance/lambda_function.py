@@ -1,25 +1,43 @@
 import os
+import time
 import logging
-import boto3
+
+from instrumentation import instrumented, span
+from lifecycle import (
+    apply_transition, decide, get_lifecycle_store, learn_arrival_profile,
+    policy_from_env, record_activity, take_snapshot
+)
+from render_queue import RENDER_QUEUE_URL
+from render_scheduler import render_pool
+from runtime import get_client
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+@instrumented("start_instance")
 def lambda_handler(event, context):
     """
     Lambda function to start an EC2 instance.
 
-    This function retrieves the EC2 instance ID and AWS region from the environment variables,
-    creates an EC2 client using boto3, and attempts to start the specified instance.
+    Invoked by the workflow when a new post arrived, it records the arrival in
+    the lifecycle store (which the warm-up profile is learned from) and starts
+    the instance. Invoked by the scheduled lifecycle check
+    ({"lifecycle_tick": true}), it starts the instance only if the lifecycle
+    policy asks for it: a render_video is draining the render queue, or
+    arrivals are expected within RENDER_WARMUP_LEAD seconds. The other instances of the render pool
+    (RENDER_INSTANCE_IDS) are started along with it.
 
     Args:
-        event (dict): AWS Lambda event data (not used in this function).
+        event (dict): AWS Lambda event data; "lifecycle_tick" marks the
+                      scheduled check.
         context (object): AWS Lambda context object (provides runtime information).
 
     Returns:
         dict: A dictionary containing the status of the start operation, the instance ID,
-              and the response from the start_instances call or an error message.
+              the state it was started from, when the start was requested (epoch seconds),
+              the lifecycle decision and the response from the start_instances call or an
+              error message, with the invocation's timing under "trace".
     """
     instance_id = os.environ.get("EC2_INSTANCE_ID")
     region = os.environ.get("AWS_REGION", "us-east-2")
@@ -29,14 +47,52 @@ def lambda_handler(event, context):
         logger.error(error_msg)
         return {"status": "error", "error": error_msg}
 
-    ec2 = boto3.client("ec2", region_name=region)
+    ec2 = get_client("ec2", region)
+    tick = bool(event.get("lifecycle_tick"))
+    policy = policy_from_env()
+    store = get_lifecycle_store()
 
     try:
-        response = ec2.start_instances(InstanceIds=[instance_id])
+        now = time.time()
+        if tick:
+            with span("lifecycle_state", "io"):
+                state = store.load()
+            with span("lifecycle_snapshot", "network"):
+                snapshot = take_snapshot(ec2, get_client("sqs", region), instance_id, RENDER_QUEUE_URL)
+            decision = decide(state, snapshot, now, policy, learn_arrival_profile(state.get("arrivals")))
+            logger.info("Lifecycle check for %s: %s", instance_id, decision)
+            if decision.action != "start":
+                return {
+                    "status": "no_action",
+                    "instance_id": instance_id,
+                    "decision": decision._asdict(),
+                }
+        else:
+            decision = None
+            # Recorded before the start, so a scheduled check that read the
+            # state earlier loses its conditional write instead of releasing
+            # the instance this run is about to use.
+            with span("lifecycle_state", "io"):
+                store.update(lambda state: record_activity(state or {}, now, arrival=True))
+
+        requested_at = time.time()
+        with span("start_instances", "network"):
+            response = ec2.start_instances(InstanceIds=render_pool(instance_id))
         logger.info("Starting instance %s: %s", instance_id, response)
+        previous = next(
+            (i.get("PreviousState", {}) for i in response.get("StartingInstances", [])
+             if i.get("InstanceId") == instance_id),
+            {}
+        )
+        if previous.get("Name") == "stopped":
+            with span("lifecycle_state", "io"):
+                store.update(lambda state: apply_transition(state or {}, "start", requested_at, policy))
         return {
             "status": "instance_started",
             "instance_id": instance_id,
+            "previous_state": previous.get("Name"),
+            "requested_at": requested_at,
+            "decision": decision._asdict() if decision else None,
             "response": response,
         }
     except Exception as e:
@@ -1,25 +1,45 @@
 import os
+import time
 import logging
-import boto3
+
+from instrumentation import instrumented, span
+from lifecycle import (
+    apply_transition, decide, get_lifecycle_store, learn_arrival_profile,
+    policy_from_env, record_activity, release_instance, take_snapshot
+)
+from render_queue import RENDER_QUEUE_URL
+from render_scheduler import render_pool
+from runtime import get_client
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+@instrumented("stop_instance")
 def lambda_handler(event, context):
     """
-    Lambda function to stop an EC2 instance.
+    Lambda function to stop an EC2 instance once it has gone idle.
 
-    This function retrieves the EC2 instance ID and AWS region from the environment
-    variables, creates an EC2 client using boto3, and attempts to stop the specified instance.
+    Invoked by the workflow after rendering, it records the render as the
+    instance's latest activity; invoked by the scheduled lifecycle check
+    ({"lifecycle_tick": true}), it only observes. Either way the instance is
+    stopped (or hibernated, with RENDER_HIBERNATE) only when the lifecycle
+    policy says so: no render_video is draining the render queue, it has
+    been idle for RENDER_IDLE_TTL seconds and no arrivals are expected within
+    RENDER_WARMUP_LEAD seconds. Otherwise it is kept warm for the next post.
+    The other instances of the render pool (RENDER_INSTANCE_IDS) are
+    released along with it.
 
     Args:
-        event (dict): AWS Lambda event data (not used in this function).
+        event (dict): AWS Lambda event data; "lifecycle_tick" marks the
+                      scheduled check.
         context (object): AWS Lambda context object (provides runtime information).
 
     Returns:
-        dict: A dictionary containing the status of the stop operation, the instance ID,
-              and the response from the stop_instances call or an error message.
+        dict: A dictionary containing the status of the stop operation ("instance_stopped",
+              "instance_hibernated" or "kept_warm"), the instance ID, the lifecycle decision,
+              the cost ledger and the response from the stop_instances call or an error message,
+              with the invocation's timing under "trace".
     """
     instance_id = os.environ.get("EC2_INSTANCE_ID")
     region = os.environ.get("AWS_REGION", "us-east-2")
@@ -29,14 +49,58 @@ def lambda_handler(event, context):
         logger.error(error_msg)
         return {"status": "error", "error": error_msg}
 
-    ec2 = boto3.client("ec2", region_name=region)
+    ec2 = get_client("ec2", region)
+    tick = bool(event.get("lifecycle_tick"))
+    policy = policy_from_env()
+    store = get_lifecycle_store()
 
     try:
-        response = ec2.stop_instances(InstanceIds=[instance_id])
-        logger.info("Stopping instance %s: %s", instance_id, response)
+        now = time.time()
+        with span("lifecycle_snapshot", "network"):
+            snapshot = take_snapshot(ec2, get_client("sqs", region), instance_id, RENDER_QUEUE_URL)
+        outcome = {}
+
+        def mutate(state):
+            # Decided on the state as written, so a StartEC2 that wrote since
+            # this check first read it makes the write conflict and the
+            # decision be taken again on its activity.
+            state = state or {}
+            if not tick:
+                state = record_activity(state, now)
+            decision = decide(state, snapshot, now, policy, learn_arrival_profile(state.get("arrivals")))
+            if decision.action in ("stop", "hibernate"):
+                # Recorded before the release, which only the winning writer makes.
+                state = apply_transition(state, decision.action, now, policy)
+            outcome.update(decision=decision, state=state)
+            if tick and decision.action not in ("stop", "hibernate"):
+                return None
+            return state
+
+        with span("lifecycle_state", "io"):
+            store.update(mutate)
+        decision, state = outcome["decision"], outcome["state"]
+        logger.info("Lifecycle check for %s: %s", instance_id, decision)
+
+        if decision.action not in ("stop", "hibernate"):
+            return {
+                "status": "kept_warm",
+                "instance_id": instance_id,
+                "decision": decision._asdict(),
+                "ledger": state.get("ledger"),
+            }
+
+        with span("stop_instances", "network"):
+            action, response = release_instance(ec2, render_pool(instance_id), decision.action == "hibernate")
+        logger.info("Stopping instance %s (%s): %s", instance_id, action, response)
+        if action != decision.action:
+            # Hibernation was not supported; the instances were stopped.
+            with span("lifecycle_state", "io"):
+                state = store.update(lambda state: dict(state or {}, hibernated=False))
         return {
-            "status": "instance_stopped",
+            "status": "instance_hibernated" if action == "hibernate" else "instance_stopped",
             "instance_id": instance_id,
+            "decision": decision._asdict(),
+            "ledger": state["ledger"],
             "response": response,
         }
     except Exception as e:
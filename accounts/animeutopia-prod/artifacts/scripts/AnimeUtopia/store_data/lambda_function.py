@@ -1,43 +1,113 @@
-import json
 import os
 import logging
-import boto3
+
+from feed_state import commit_checkpoint, get_state_store
+from instrumentation import instrumented, span
+from post_store import store_posts
+from render_queue import RENDER_QUEUE_URL, enqueue_jobs
+from run_manifest import get_run_id, post_id_for
+from runtime import get_client
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 BUCKET_NAME = os.environ.get("BUCKET_NAME", "your-s3-bucket")
 
-s3 = boto3.client("s3")
+
+def commit_feed_checkpoint(event):
+    """
+    Commit fetch_rss's checkpoint from the event, logging rather than failing
+    on errors: the posts are stored either way, and uncommitted entries are
+    only emitted again once their pending period has passed.
+    """
+    checkpoint = (event.get("rssData") or {}).get("checkpoint")
+    if not checkpoint:
+        return
+    try:
+        with span("feed_state", "io"):
+            commit_checkpoint(get_state_store(), checkpoint)
+        logger.info("Marked %d feed entries as seen.", len(checkpoint.get("guids") or []))
+    except Exception as e:
+        logger.exception("Failed to commit the feed checkpoint: %s", e)
 
 
+@instrumented("store_data")
 def lambda_handler(event, context):
     """
-    Store the processed post data in S3 as a JSON file.
+    Store the processed post data in S3 as JSON files and queue them for
+    rendering.
+
+    Every post is written to the post store (see post_store.py) under its own
+    date-partitioned, run-scoped key and recorded in its day and title
+    indexes; the store's latest pointer is moved to the first post, which is
+    what single-post rendering renders. When RENDER_QUEUE_URL is set, a
+    render job is queued for every post.
+
+    Once the posts are stored (or process_content rejected all of them),
+    fetch_rss's checkpoint is committed: the batch's entries are marked seen
+    and not emitted again (see feed_state.py).
 
     Args:
-        event (dict): Event data containing a 'post' key with post details.
+        event (dict): Event data containing a 'post' key with post details,
+                      or the processed batch under processedContent.posts.
         context (object): Lambda context object.
 
     Returns:
-        dict: Dictionary indicating storage status and S3 key used.
+        dict: Dictionary indicating storage status, the S3 keys used (the
+              first post's under "s3_key"), the number of queued render
+              jobs and the invocation's timing under "trace".
     """
-    post = event.get("post")
-    if not post:
-        post = event.get("processedContent", {}).get("post", {})
+    processed = event.get("processedContent", {})
+    posts = processed.get("posts")
+    if not posts:
+        post = event.get("post") or processed.get("post", {})
+        posts = [post] if post else []
 
-    if not post:
+    if not posts:
+        if processed.get("rejected"):
+            # Every post was handled; none is worth fetching again.
+            commit_feed_checkpoint(event)
         error_msg = "No 'post' data found in event."
         logger.error(error_msg)
         return {"status": "error", "error": error_msg}
 
-    json_data = json.dumps(post, indent=4)
-    s3_key = "most_recent_post.json"
-
+    run_id = get_run_id(event)
     try:
-        s3.put_object(Bucket=BUCKET_NAME, Key=s3_key, Body=json_data)
-        logger.info("Post data stored in S3 bucket '%s' with key '%s'.", BUCKET_NAME, s3_key)
-        return {"status": "stored", "s3_key": s3_key}
+        with span("post_store", "network"):
+            entries = store_posts(
+                get_client("s3"), BUCKET_NAME, [(post_id_for(post), post) for post in posts], run_id
+            )
+        logger.info("Stored %d posts (%d bytes) in S3 bucket '%s'.",
+                    len(entries), sum(e["bytes"] for e in entries), BUCKET_NAME)
     except Exception as e:
         logger.exception("Failed to store post data in S3: %s", e)
         return {"status": "error", "error": str(e)}
+
+    jobs = [
+        {
+            "run_id": run_id,
+            "post_id": entry["post_id"],
+            "post_key": entry["key"],
+            "image_key": post.get("image_key"),
+            "title": post.get("title"),
+            "outputs": post.get("outputs"),
+        }
+        for entry, post in zip(entries, posts)
+    ]
+    queued = 0
+    if RENDER_QUEUE_URL:
+        try:
+            with span("enqueue", "network"):
+                queued = enqueue_jobs(get_client("sqs"), RENDER_QUEUE_URL, jobs)
+            logger.info("Queued %d render jobs.", queued)
+        except Exception as e:
+            logger.exception("Failed to queue render jobs: %s", e)
+            return {"status": "error", "error": str(e)}
+
+    commit_feed_checkpoint(event)
+    return {
+        "status": "stored",
+        "s3_key": jobs[0]["post_key"],
+        "post_keys": [job["post_key"] for job in jobs],
+        "queued": queued,
+    }
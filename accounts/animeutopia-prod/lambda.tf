@@ -37,7 +37,10 @@ resource "aws_iam_policy" "ec2_control_policy" {
           "ec2:StartInstances",
           "ec2:StopInstances"
         ],
-        Resource : "arn:aws:ec2:${var.aws_region}:${data.aws_caller_identity.current.account_id}:instance/${var.ec2_instance_id}"
+        Resource : [
+          for id in local.render_instance_ids :
+          "arn:aws:ec2:${var.aws_region}:${data.aws_caller_identity.current.account_id}:instance/${id}"
+        ]
       }
     ]
   })
@@ -133,45 +136,151 @@ resource "aws_iam_role_policy_attachment" "attach_sns_publish_policy" {
   policy_arn = aws_iam_policy.sns_publish_policy.arn
 }
 
+resource "aws_iam_policy" "sqs_render_queue_policy" {
+  name        = "anime_sqs_render_queue_policy"
+  description = "Policy to allow Lambda functions to enqueue and consume render jobs"
+  policy = jsonencode({
+    Version   : "2012-10-17",
+    Statement : [
+      {
+        Effect   : "Allow",
+        Action   : [
+          "sqs:SendMessage",
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:ChangeMessageVisibility",
+          "sqs:GetQueueAttributes"
+        ],
+        Resource : aws_sqs_queue.render_queue.arn
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "attach_sqs_render_queue_policy" {
+  role       = aws_iam_role.lambda_role.name
+  policy_arn = aws_iam_policy.sqs_render_queue_policy.arn
+}
+
 data "aws_caller_identity" "current" {}
 
+#############################
+# Shared Lambda Layer
+#############################
+data "archive_file" "common_layer" {
+  type        = "zip"
+  source_dir  = "${path.module}/artifacts/scripts/AnimeUtopia/common"
+  output_path = "${path.module}/artifacts/scripts/AnimeUtopia/common/common_layer.zip"
+  excludes    = ["common_layer.zip"]
+}
+
+resource "aws_lambda_layer_version" "common" {
+  layer_name          = "animeutopia_common"
+  filename            = data.archive_file.common_layer.output_path
+  source_code_hash    = data.archive_file.common_layer.output_base64sha256
+  compatible_runtimes = ["python3.9"]
+}
+
+#############################
+# Handler Packages
+#############################
+# Each handler is packaged from its source directory with its
+# requirements.txt installed for the Lambda runtime (python3.9, x86_64), so
+# what is deployed is the code in the tree. The build is redone when a
+# source file changes or the build directory is missing (e.g. on a fresh
+# runner).
+resource "null_resource" "handler_build" {
+  for_each = local.handlers
+
+  triggers = {
+    source = sha1(join("", [
+      for f in sort(fileset("${local.handler_src_root}/${each.key}", "**")) :
+      filesha1("${local.handler_src_root}/${each.key}/${f}")
+      if length(regexall("(^|/)__pycache__/|\\.zip$", f)) == 0
+    ]))
+    built = fileexists("${local.handler_build_root}/${each.key}/lambda_function.py")
+  }
+
+  provisioner "local-exec" {
+    interpreter = ["bash", "-c"]
+    command     = <<-EOT
+      set -euo pipefail
+      build="${local.handler_build_root}/${each.key}"
+      rm -rf "$build" && mkdir -p "$build"
+      cp -R "${local.handler_src_root}/${each.key}/." "$build/"
+      rm -f "$build"/*.zip
+      find "$build" -name __pycache__ -prune -exec rm -rf {} +
+      pip install --quiet --target "$build" --requirement "$build/requirements.txt" \
+        --platform manylinux2014_x86_64 --implementation cp --python-version 3.9 --only-binary=:all:
+    EOT
+  }
+}
+
+data "archive_file" "handler" {
+  for_each = local.handlers
+
+  type        = "zip"
+  source_dir  = "${local.handler_build_root}/${each.key}"
+  output_path = "${local.handler_build_root}/${each.key}.zip"
+  depends_on  = [null_resource.handler_build]
+}
+
 #############################
 # Lambda Functions
 #############################
 resource "aws_lambda_function" "fetch_rss" {
   function_name      = "fetch_rss"
-  filename           = "${path.module}/artifacts/scripts/AnimeUtopia/fetch_rss/fetch_rss.zip"
-  source_code_hash   = filebase64sha256("${path.module}/artifacts/scripts/AnimeUtopia/fetch_rss/fetch_rss.zip")
+  filename           = data.archive_file.handler["fetch_rss"].output_path
+  source_code_hash   = data.archive_file.handler["fetch_rss"].output_base64sha256
   handler            = "lambda_function.lambda_handler"
   runtime            = "python3.9"
   role               = aws_iam_role.lambda_role.arn
   timeout            = 10
+
+  environment {
+    variables = {
+      FEED_STATE_BUCKET = aws_s3_bucket.media_bucket.bucket
+      FEED_STATE_KEY    = "state/fetch_rss.json"
+      FEED_MAX_POSTS    = "5"
+    }
+  }
+
+  layers = [aws_lambda_layer_version.common.arn]
 }
 
 resource "aws_lambda_function" "process_content" {
   function_name      = "process_content"
-  filename           = "${path.module}/artifacts/scripts/AnimeUtopia/process_content/process_content.zip"
-  source_code_hash   = filebase64sha256("${path.module}/artifacts/scripts/AnimeUtopia/process_content/process_content.zip")
+  filename           = data.archive_file.handler["process_content"].output_path
+  source_code_hash   = data.archive_file.handler["process_content"].output_base64sha256
   handler            = "lambda_function.lambda_handler"
   runtime            = "python3.9"
   role               = aws_iam_role.lambda_role.arn
-  timeout            = 10
+  timeout            = 60
+  memory_size        = 1024
 
   environment {
     variables = {
-      IMAGE_MAGICK_EXE = "/opt/bin/magick"
+      IMAGE_BACKEND           = "pillow"
+      IMAGE_MAGICK_EXE        = "/opt/bin/magick"
+      ANILIST_CACHE_BUCKET    = aws_s3_bucket.media_bucket.bucket
+      ASSET_BUCKET            = aws_s3_bucket.media_bucket.bucket
+      TEMPLATE_INDEX_BUCKET   = aws_s3_bucket.media_bucket.bucket
+      TEMPLATE_INDEX_KEY      = "templates/anime_template/index.json"
+      COVER_WORKERS           = "4"
+      PAYLOAD_LOG_SAMPLE_RATE = "0.01"
     }
   }
 
   layers = [
-    "arn:aws:lambda:us-east-2:481665084477:layer:imagick-layer:1"
+    "arn:aws:lambda:us-east-2:481665084477:layer:imagick-layer:1",
+    aws_lambda_layer_version.common.arn
   ]
 }
 
 resource "aws_lambda_function" "store_data" {
   function_name      = "store_data"
-  filename           = "${path.module}/artifacts/scripts/AnimeUtopia/store_data/store_data.zip"
-  source_code_hash   = filebase64sha256("${path.module}/artifacts/scripts/AnimeUtopia/store_data/store_data.zip")
+  filename           = data.archive_file.handler["store_data"].output_path
+  source_code_hash   = data.archive_file.handler["store_data"].output_base64sha256
   handler            = "lambda_function.lambda_handler"
   runtime            = "python3.9"
   role               = aws_iam_role.lambda_role.arn
@@ -179,81 +288,106 @@ resource "aws_lambda_function" "store_data" {
 
   environment {
     variables = {
-      BUCKET_NAME = aws_s3_bucket.media_bucket.bucket
+      BUCKET_NAME         = aws_s3_bucket.media_bucket.bucket
+      RENDER_QUEUE_URL    = aws_sqs_queue.render_queue.url
+      POST_STORE_PREFIX   = "posts/"
+      POST_STORE_COMPRESS = "gzip"
+      FEED_STATE_BUCKET   = aws_s3_bucket.media_bucket.bucket
+      FEED_STATE_KEY      = "state/fetch_rss.json"
     }
   }
+
+  layers = [aws_lambda_layer_version.common.arn]
 }
 
 resource "aws_lambda_function" "render_video" {
   function_name      = "render_video"
-  filename           = "${path.module}/artifacts/scripts/AnimeUtopia/render_video/render_video.zip"
-  source_code_hash   = filebase64sha256("${path.module}/artifacts/scripts/AnimeUtopia/render_video/render_video.zip")
+  filename           = data.archive_file.handler["render_video"].output_path
+  source_code_hash   = data.archive_file.handler["render_video"].output_base64sha256
   handler            = "lambda_function.lambda_handler"
   runtime            = "python3.9"
   role               = aws_iam_role.lambda_role.arn
-  timeout            = 180
+  timeout            = 900
 
   environment {
     variables = {
-      INSTANCE_ID   = var.ec2_instance_id
-      TARGET_BUCKET = var.s3_bucket_name
+      INSTANCE_ID            = var.ec2_instance_id
+      TARGET_BUCKET          = var.s3_bucket_name
+      RENDER_TIMEOUT         = "840"
+      UPLOAD_PART_SIZE_MB    = "16"
+      UPLOAD_MAX_CONCURRENCY = "10"
+      RENDER_QUEUE_URL       = aws_sqs_queue.render_queue.url
+      RENDER_QUEUE_IDLE      = "60"
+      RENDER_INSTANCE_IDS    = join(",", local.render_instance_ids)
+      RENDER_PLACEMENT       = "least_loaded"
+      DRAIN_LEASE_BUCKET     = aws_s3_bucket.media_bucket.bucket
+      DRAIN_LEASE_KEY        = "state/render_drainer.json"
+      TEMPLATE_INDEX_KEY     = "templates/anime_template/index.json"
+      RENDER_OUTPUTS         = "reels_9x16,feed_1x1,youtube_16x9"
     }
   }
-}
 
-resource "aws_lambda_function" "save_video" {
-  function_name      = "save_video"
-  filename           = "${path.module}/artifacts/scripts/AnimeUtopia/save_video/save_video.zip"
-  source_code_hash   = filebase64sha256("${path.module}/artifacts/scripts/AnimeUtopia/save_video/save_video.zip")
-  handler            = "lambda_function.lambda_handler"
-  runtime            = "python3.9"
-  role               = aws_iam_role.lambda_role.arn
-  timeout            = 180
-
-  environment {
-    variables = {
-      INSTANCE_ID   = var.ec2_instance_id,
-      TARGET_BUCKET = var.s3_bucket_name
-    }
-  }
+  layers = [aws_lambda_layer_version.common.arn]
 }
 
 resource "aws_lambda_function" "start_instance" {
   function_name      = "start_instance"
-  filename           = "${path.module}/artifacts/scripts/AnimeUtopia/start_instance/start_instance.zip"
-  source_code_hash   = filebase64sha256("${path.module}/artifacts/scripts/AnimeUtopia/start_instance/start_instance.zip")
+  filename           = data.archive_file.handler["start_instance"].output_path
+  source_code_hash   = data.archive_file.handler["start_instance"].output_base64sha256
   handler            = "lambda_function.lambda_handler"
   runtime            = "python3.9"
   role               = aws_iam_role.lambda_role.arn
-  timeout            = 10
+  timeout            = 30
 
   environment {
     variables = {
-      EC2_INSTANCE_ID = var.ec2_instance_id
+      EC2_INSTANCE_ID        = var.ec2_instance_id
+      RENDER_INSTANCE_IDS    = join(",", local.render_instance_ids)
+      RENDER_QUEUE_URL       = aws_sqs_queue.render_queue.url
+      LIFECYCLE_STATE_BUCKET = aws_s3_bucket.media_bucket.bucket
+      DRAIN_LEASE_BUCKET     = aws_s3_bucket.media_bucket.bucket
+      DRAIN_LEASE_KEY        = "state/render_drainer.json"
+      RENDER_IDLE_TTL        = "900"
+      RENDER_HIBERNATE       = "false"
+      RENDER_WARMUP_LEAD     = "0"
+      RENDER_HOURLY_COST     = "0"
     }
   }
+
+  layers = [aws_lambda_layer_version.common.arn]
 }
 
 resource "aws_lambda_function" "stop_instance" {
   function_name      = "stop_instance"
-  filename           = "${path.module}/artifacts/scripts/AnimeUtopia/stop_instance/stop_instance.zip"
-  source_code_hash   = filebase64sha256("${path.module}/artifacts/scripts/AnimeUtopia/stop_instance/stop_instance.zip")
+  filename           = data.archive_file.handler["stop_instance"].output_path
+  source_code_hash   = data.archive_file.handler["stop_instance"].output_base64sha256
   handler            = "lambda_function.lambda_handler"
   runtime            = "python3.9"
   role               = aws_iam_role.lambda_role.arn
-  timeout            = 10
+  timeout            = 30
 
   environment {
     variables = {
-      EC2_INSTANCE_ID = var.ec2_instance_id
+      EC2_INSTANCE_ID        = var.ec2_instance_id
+      RENDER_INSTANCE_IDS    = join(",", local.render_instance_ids)
+      RENDER_QUEUE_URL       = aws_sqs_queue.render_queue.url
+      LIFECYCLE_STATE_BUCKET = aws_s3_bucket.media_bucket.bucket
+      DRAIN_LEASE_BUCKET     = aws_s3_bucket.media_bucket.bucket
+      DRAIN_LEASE_KEY        = "state/render_drainer.json"
+      RENDER_IDLE_TTL        = "900"
+      RENDER_HIBERNATE       = "false"
+      RENDER_WARMUP_LEAD     = "0"
+      RENDER_HOURLY_COST     = "0"
     }
   }
+
+  layers = [aws_lambda_layer_version.common.arn]
 }
 
 resource "aws_lambda_function" "notify_post" {
   function_name      = "notify_post"
-  filename           = "${path.module}/artifacts/scripts/AnimeUtopia/notify_post/notify_post.zip"
-  source_code_hash   = filebase64sha256("${path.module}/artifacts/scripts/AnimeUtopia/notify_post/notify_post.zip")
+  filename           = data.archive_file.handler["notify_post"].output_path
+  source_code_hash   = data.archive_file.handler["notify_post"].output_base64sha256
   handler            = "lambda_function.lambda_handler"
   runtime            = "python3.9"
   role               = aws_iam_role.lambda_role.arn
@@ -265,4 +399,6 @@ resource "aws_lambda_function" "notify_post" {
       TARGET_BUCKET = var.s3_bucket_name
     }
   }
+
+  layers = [aws_lambda_layer_version.common.arn]
 }
@@ -4,4 +4,20 @@
 
 locals {
   project = "animeutopia"
+
+  # The primary render instance first, then any additional pool instances.
+  render_instance_ids = distinct(concat([var.ec2_instance_id], var.render_instance_ids))
+
+  # Lambda handlers packaged from their source directories (see lambda.tf).
+  handler_src_root   = "${path.module}/artifacts/scripts/AnimeUtopia"
+  handler_build_root = "${path.module}/.build"
+  handlers = toset([
+    "fetch_rss",
+    "process_content",
+    "store_data",
+    "render_video",
+    "start_instance",
+    "stop_instance",
+    "notify_post",
+  ])
 }
\ No newline at end of file
@@ -35,7 +35,6 @@ resource "aws_iam_policy" "step_functions_policy" {
           aws_lambda_function.process_content.arn,
           aws_lambda_function.store_data.arn,
           aws_lambda_function.render_video.arn,
-          aws_lambda_function.save_video.arn,
           aws_lambda_function.start_instance.arn,
           aws_lambda_function.stop_instance.arn,
           aws_lambda_function.notify_post.arn
@@ -62,7 +61,6 @@ resource "aws_sfn_state_machine" "anime_workflow" {
     process_content_arn = aws_lambda_function.process_content.arn,
     store_data_arn      = aws_lambda_function.store_data.arn,
     render_video_arn    = aws_lambda_function.render_video.arn,
-    save_video_arn      = aws_lambda_function.save_video.arn,
     start_instance_arn  = aws_lambda_function.start_instance.arn,
     stop_instance_arn   = aws_lambda_function.stop_instance.arn,
     notify_post_arn     = aws_lambda_function.notify_post.arn
@@ -112,4 +110,39 @@ resource "aws_cloudwatch_event_target" "state_machine_target" {
   target_id = "StepFunctionStateMachine"
   arn       = aws_sfn_state_machine.anime_workflow.arn
   role_arn  = aws_iam_role.eventbridge_role.arn
-}
\ No newline at end of file
+}
+resource "aws_cloudwatch_event_rule" "render_lifecycle_tick" {
+  name                = "render_instance_lifecycle_tick"
+  description         = "Periodic warm-pool check that starts or releases the render instance"
+  schedule_expression = "rate(5 minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "lifecycle_start_target" {
+  rule      = aws_cloudwatch_event_rule.render_lifecycle_tick.name
+  target_id = "LifecycleStartInstance"
+  arn       = aws_lambda_function.start_instance.arn
+  input     = jsonencode({ lifecycle_tick = true })
+}
+
+resource "aws_cloudwatch_event_target" "lifecycle_stop_target" {
+  rule      = aws_cloudwatch_event_rule.render_lifecycle_tick.name
+  target_id = "LifecycleStopInstance"
+  arn       = aws_lambda_function.stop_instance.arn
+  input     = jsonencode({ lifecycle_tick = true })
+}
+
+resource "aws_lambda_permission" "lifecycle_start_permission" {
+  statement_id  = "AllowLifecycleTickStart"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.start_instance.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.render_lifecycle_tick.arn
+}
+
+resource "aws_lambda_permission" "lifecycle_stop_permission" {
+  statement_id  = "AllowLifecycleTickStop"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.stop_instance.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.render_lifecycle_tick.arn
+}
@@ -0,0 +1,25 @@
+################################################################################
+## SQS
+################################################################################
+
+#############################
+# Render Queue
+#############################
+resource "aws_sqs_queue" "render_queue_dlq" {
+  name                      = "anime_render_queue_dlq"
+  message_retention_seconds = 1209600
+}
+
+# One message per stored post. render_video drains it while the render
+# instance is up; the visibility timeout covers the longest render job.
+resource "aws_sqs_queue" "render_queue" {
+  name                       = "anime_render_queue"
+  visibility_timeout_seconds = 900
+  message_retention_seconds  = 86400
+  receive_wait_time_seconds  = 20
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.render_queue_dlq.arn
+    maxReceiveCount     = 3
+  })
+}
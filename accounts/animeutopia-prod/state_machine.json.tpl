@@ -1,7 +1,16 @@
 {
   "Comment": "State machine for automating anime post workflow",
-  "StartAt": "FetchRSS",
+  "StartAt": "InitRun",
   "States": {
+    "InitRun": {
+      "Type": "Pass",
+      "Parameters": {
+        "run_id.$": "$$.Execution.Name",
+        "started_at.$": "$$.Execution.StartTime"
+      },
+      "ResultPath": "$.run",
+      "Next": "FetchRSS"
+    },
     "FetchRSS": {
       "Type": "Task",
       "Resource": "${fetch_rss_arn}",
@@ -41,13 +50,26 @@
       "Type": "Task",
       "Resource": "${render_video_arn}",
       "ResultPath": "$.videoResult",
-      "Next": "SaveVideo"
+      "Next": "CheckRenderQueue"
     },
-    "SaveVideo": {
-      "Type": "Task",
-      "Resource": "${save_video_arn}",
-      "ResultPath": "$.saveVideoResult",
-      "Next": "StopEC2"
+    "CheckRenderQueue": {
+      "Type": "Choice",
+      "Choices": [
+        {
+          "And": [
+            {
+              "Variable": "$.videoResult.stop_reason",
+              "IsPresent": true
+            },
+            {
+              "Variable": "$.videoResult.stop_reason",
+              "StringEquals": "time_limit"
+            }
+          ],
+          "Next": "RenderVideo"
+        }
+      ],
+      "Default": "StopEC2"
     },
     "StopEC2": {
       "Type": "Task",
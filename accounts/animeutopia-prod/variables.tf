@@ -30,6 +30,12 @@ variable "ec2_instance_id" {
   type        = string
 }
 
+variable "render_instance_ids" {
+  description = "Additional render instances (IDs) that queued render jobs are spread across."
+  type        = list(string)
+  default     = []
+}
+
 variable "terraform_backend_bucket" {
   description = "The S3 bucket used to store Terraform state."
   type        = string